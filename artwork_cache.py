@@ -0,0 +1,312 @@
+"""
+Artwork Cache
+Caché de carátulas de iTunes con cliente HTTP compartido
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_controller import parse_retry_after
+
+
+ITUNES_SEARCH_URL = "https://itunes.apple.com/search"
+
+
+def create_http_session(pool_size: int = 10) -> requests.Session:
+    """
+    Crea una sesión HTTP con conexiones keep-alive reutilizables
+
+    Args:
+        pool_size: Conexiones máximas por host
+
+    Returns:
+        Sesión de requests lista para compartir entre hilos
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({'User-Agent': 'youtube-music-downloader'})
+    return session
+
+
+class ArtworkCache:
+    """
+    Caché de carátulas direccionada por contenido
+
+    Las imágenes se guardan una sola vez en disco con su hash SHA-256 como
+    nombre. Un índice SQLite relaciona artista/canción, artista/álbum y URL de
+    la carátula con ese hash, de modo que las canciones de un mismo álbum
+    reutilizan la imagen sin volver a descargarla. Delante hay un LRU en memoria
+    y las búsquedas sin resultado también se recuerdan durante un tiempo.
+    """
+
+    def __init__(self, cache_dir: Path, session: Optional[requests.Session] = None,
+                 memory_items: int = 128, negative_ttl_days: float = 7, timeout: float = 5):
+        """
+        Inicializa la caché
+
+        Args:
+            cache_dir: Carpeta donde se guardan imágenes e índice
+            session: Sesión HTTP compartida (se crea una si no se pasa)
+            memory_items: Número de imágenes a mantener en memoria
+            negative_ttl_days: Días que se recuerda una búsqueda sin carátula
+            timeout: Timeout de las peticiones HTTP (segundos)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.session = session or create_http_session()
+        self.memory_items = memory_items
+        self.negative_ttl = negative_ttl_days * 86400
+        self.timeout = timeout
+        self.search_url = ITUNES_SEARCH_URL
+        # Control de tasa compartido con YouTube (AdaptiveController, opcional)
+        self.controller = None
+
+        self._memory = OrderedDict()
+        self._lock = threading.RLock()
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'negative_hits': 0,
+            'bytes_saved': 0,
+            'requests_saved': 0,
+        }
+
+        self._conn = sqlite3.connect(str(self.cache_dir / "index.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS artwork_keys (
+                key TEXT PRIMARY KEY,
+                sha256 TEXT,
+                created REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # Índice y almacenamiento
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _key(kind: str, *parts: str) -> str:
+        return kind + ":" + "|".join(p.strip().lower() for p in parts)
+
+    def _lookup_key(self, key: str):
+        """
+        Consulta el índice
+
+        Returns:
+            None si no hay entrada, "" si es un resultado negativo vigente, o el hash
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256, created FROM artwork_keys WHERE key = ?", (key,)
+            ).fetchone()
+
+        if not row:
+            return None
+
+        sha, created = row
+        if sha is None:
+            if time.time() - created > self.negative_ttl:
+                return None
+            return ""
+        return sha
+
+    def _store_keys(self, keys, sha: Optional[str]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO artwork_keys VALUES (?, ?, ?)",
+                [(key, sha, now) for key in keys]
+            )
+            self._conn.commit()
+
+    def _image_path(self, sha: str) -> Path:
+        return self.cache_dir / sha[:2] / f"{sha}.jpg"
+
+    def _read_image(self, sha: str) -> Optional[bytes]:
+        """Lee una imagen desde memoria o disco"""
+        with self._lock:
+            if sha in self._memory:
+                self._memory.move_to_end(sha)
+                return self._memory[sha]
+
+        path = self._image_path(sha)
+        if not path.exists():
+            return None
+
+        data = path.read_bytes()
+        self._remember(sha, data)
+        return data
+
+    def _write_image(self, data: bytes) -> str:
+        """Guarda una imagen en disco y devuelve su hash"""
+        sha = hashlib.sha256(data).hexdigest()
+        path = self._image_path(sha)
+
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            tmp.replace(path)
+
+        self._remember(sha, data)
+        return sha
+
+    def _remember(self, sha: str, data: bytes):
+        """Agrega una imagen al LRU en memoria"""
+        with self._lock:
+            self._memory[sha] = data
+            self._memory.move_to_end(sha)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _store_miss(self, song_key: str):
+        """Recuerda que una canción no tiene carátula (resultado negativo)"""
+        self._store_keys([song_key], None)
+        with self._lock:
+            self.stats['misses'] += 1
+
+    def _hit(self, data: bytes, requests_saved: int):
+        with self._lock:
+            self.stats['hits'] += 1
+            self.stats['bytes_saved'] += len(data)
+            self.stats['requests_saved'] += requests_saved
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def _request(self, url: str, params: Optional[Dict] = None) -> Optional[requests.Response]:
+        """
+        Petición GET pasando por el control de tasa (si hay uno)
+
+        Los 429/403 y Retry-After se comunican al controlador como bloqueos;
+        los timeouts, como errores normales.
+
+        Returns:
+            Respuesta, o None si hubo un error de red
+        """
+        if self.controller is None:
+            try:
+                return self.session.get(url, params=params, timeout=self.timeout)
+            except Exception:
+                return None
+
+        try:
+            with self.controller.request():
+                response = self.session.get(url, params=params, timeout=self.timeout)
+        except Exception:
+            self.controller.record_result(False)
+            return None
+
+        if response.status_code in (429, 403):
+            self.controller.record_throttle(parse_retry_after(response.headers.get('Retry-After')))
+        else:
+            self.controller.record_result(response.status_code < 500)
+        return response
+
+    def get_album_art(self, artist: str, song: str) -> Optional[bytes]:
+        """
+        Obtiene la carátula de una canción (caché o iTunes API)
+
+        Args:
+            artist: Nombre del artista
+            song: Nombre de la canción
+
+        Returns:
+            Bytes de la imagen o None
+        """
+        song_key = self._key("song", artist, song)
+
+        # 1. Canción ya resuelta: no hace falta ni la búsqueda en iTunes
+        sha = self._lookup_key(song_key)
+        if sha == "":
+            with self._lock:
+                self.stats['negative_hits'] += 1
+                self.stats['requests_saved'] += 1
+            return None
+        if sha:
+            data = self._read_image(sha)
+            if data:
+                self._hit(data, requests_saved=2)
+                return data
+
+        # 2. Buscar en iTunes
+        response = self._request(
+            self.search_url,
+            params={'term': f"{artist} {song}", 'entity': 'song', 'limit': 1}
+        )
+        if response is None or response.status_code != 200:
+            # Error de red o bloqueo: no se guarda resultado negativo
+            return None
+        
+        try:
+            data = response.json()
+        except ValueError:
+            return None
+
+        if not data.get('resultCount'):
+            self._store_miss(song_key)
+            return None
+
+        result = data['results'][0]
+        artwork_url = result.get('artworkUrl100', '')
+        if not artwork_url:
+            self._store_miss(song_key)
+            return None
+
+        # Obtener versión de alta resolución
+        artwork_url = artwork_url.replace('100x100', '600x600')
+
+        keys = [song_key, self._key("url", artwork_url)]
+        if result.get('collectionName'):
+            keys.append(self._key("album", artist, result['collectionName']))
+
+        # 3. Mismo álbum o misma URL ya descargados
+        for key in keys[1:]:
+            sha = self._lookup_key(key)
+            if sha:
+                image = self._read_image(sha)
+                if image:
+                    self._store_keys(keys, sha)
+                    self._hit(image, requests_saved=1)
+                    return image
+
+        # 4. Descargar la imagen
+        with self._lock:
+            self.stats['misses'] += 1
+
+        img_response = self._request(artwork_url)
+        if img_response is None or img_response.status_code != 200:
+            return None
+
+        image = img_response.content
+        sha = self._write_image(image)
+        self._store_keys(keys, sha)
+        return image
+
+    def get_stats(self) -> Dict:
+        """Estadísticas de uso de la caché"""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses'] + stats['negative_hits']
+        stats['hit_rate'] = ((stats['hits'] + stats['negative_hits']) / lookups) if lookups else 0.0
+        return stats
+
+    def close(self):
+        """Cierra el índice y la sesión HTTP"""
+        with self._lock:
+            self._conn.close()
+        self.session.close()
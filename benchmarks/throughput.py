@@ -0,0 +1,343 @@
+"""
+Benchmark de rendimiento de extremo a extremo sin red
+
+Sustituye YouTube, Spotify e iTunes por dobles locales:
+    - FakeYoutubeDL: búsquedas y descargas servidas desde un archivo de audio
+      local, con latencia y ancho de banda configurables
+    - Servidor HTTP local que imita la búsqueda y las carátulas de iTunes
+    - Listas sintéticas de canciones (100 / 1.000 / 10.000)
+
+Ejecuta download_batch (secuencial o pipeline) o
+MusicDownloaderApp._download_with_progress y emite JSON con canciones/min,
+percentiles de latencia por etapa y pico de memoria (RSS), para seguir
+regresiones entre versiones.
+
+Uso:
+    python benchmarks/throughput.py --sizes 100 1000 --mode pipeline
+    python benchmarks/throughput.py --sizes 100 --mode sequential --driver app --output bench.json
+"""
+
+import argparse
+import contextlib
+import http.server
+import io
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import ydl_pool
+from youtube_downloader import YouTubeAudioDownloader
+
+
+# ----------------------------------------------------------------------
+# Dobles locales
+# ----------------------------------------------------------------------
+
+def make_mp3_fixture(path: Path, seconds: int = 200):
+    """
+    Escribe un MP3 válido (tramas MPEG-1 Layer III de silencio a 128 kbps)
+
+    No necesita FFmpeg y mutagen puede etiquetarlo como un archivo real.
+    """
+    header = bytes([0xFF, 0xFB, 0x90, 0x64])
+    frame = header + bytes(417 - len(header))
+    frames = int(seconds * 44100 / 1152)
+    path.write_bytes(frame * frames)
+
+
+class FakeYoutubeDL:
+    """Sustituto de yt_dlp.YoutubeDL que sirve un archivo local"""
+
+    search_latency = 0.2
+    download_latency = 0.3
+    bandwidth = 5 * 1024 * 1024  # bytes/s
+    fixture: Path = None
+    raw_fixture: Path = None
+
+    def __init__(self, params=None):
+        self.params = params or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def close(self):
+        pass
+
+    def extract_info(self, url, download=False):
+        time.sleep(self.search_latency)
+        query = url.split(':', 1)[1]
+        count = int(url[len('ytsearch'):url.index(':')] or 1)
+        return {'entries': [
+            {
+                'id': f"{abs(hash((query, i))) % 10**11:011d}",
+                'title': f"{query} ({i})" if i else query.replace(' audio oficial', ''),
+                'url': f"https://www.youtube.com/watch?v={i}",
+                'duration': 200 + i,
+                'channel': 'Fake Channel',
+            }
+            for i in range(count)
+        ]}
+
+    def download(self, urls):
+        home = Path(self.params.get('paths', {}).get('home', '.'))
+        postprocessors = self.params.get('postprocessors')
+
+        if postprocessors:
+            # La "conversión" en el mismo hilo se simula copiando con la extensión final
+            source = self.fixture
+            ext = postprocessors[0]['preferredcodec']
+        else:
+            source = self.raw_fixture or self.fixture
+            ext = source.suffix.lstrip('.')
+
+        size = source.stat().st_size
+        time.sleep(self.download_latency + size / self.bandwidth)
+
+        for hook in self.params.get('progress_hooks', []):
+            hook({'status': 'downloading', 'downloaded_bytes': size, 'total_bytes': size})
+
+        shutil.copyfile(source, home / f"video.{ext}")
+        return 0
+
+
+class FakeItunesHandler(http.server.BaseHTTPRequestHandler):
+    """Imita la búsqueda de iTunes y sirve carátulas de 600x600"""
+
+    latency = 0.05
+    albums_per_artist = 3
+    artwork = b'\xff\xd8\xff\xe0' + bytes(60 * 1024)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        url = urlparse(self.path)
+
+        if url.path == '/search':
+            term = parse_qs(url.query).get('term', [''])[0]
+            album = f"Album {abs(hash(term)) % self.albums_per_artist}"
+            artist = term.split(' ')[0]
+            body = json.dumps({
+                'resultCount': 1,
+                'results': [{
+                    'collectionName': album,
+                    'artworkUrl100': f"http://{self.headers['Host']}/art/{artist}/{album}/100x100bb.jpg",
+                }]
+            }).encode()
+            content_type = 'application/json'
+        else:
+            body = self.artwork
+            content_type = 'image/jpeg'
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextlib.contextmanager
+def fake_itunes_server():
+    """Arranca el servidor iTunes local y devuelve la URL de búsqueda"""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakeItunesHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/search"
+    finally:
+        server.shutdown()
+
+
+# ----------------------------------------------------------------------
+# Medición
+# ----------------------------------------------------------------------
+
+STAGE_METHODS = {
+    'search': '_search_youtube',
+    'download': '_download_audio',
+    'download_raw': '_download_raw',
+    'artwork': '_get_album_art',
+    'tag': '_add_metadata',
+}
+
+
+def instrument(downloader, samples):
+    """Envuelve los métodos de cada etapa para medir su latencia"""
+    lock = threading.Lock()
+
+    for stage, method_name in STAGE_METHODS.items():
+        original = getattr(downloader, method_name)
+
+        def timed(*args, _original=original, _stage=stage, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _original(*args, **kwargs)
+            finally:
+                with lock:
+                    samples.setdefault(_stage, []).append(time.perf_counter() - start)
+
+        setattr(downloader, method_name, timed)
+
+
+def percentiles(values):
+    """p50/p90/p99 en milisegundos"""
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {'count': len(values), 'p50_ms': pct(50), 'p90_ms': pct(90), 'p99_ms': pct(99)}
+
+
+def synthetic_songs(count: int, artists: int = 200):
+    """Lista sintética de tuplas (track_id, artista, canción)"""
+    return [
+        (f"track{i:06d}", f"Artist{i % artists:03d}", f"Song {i:06d}")
+        for i in range(count)
+    ]
+
+
+# ----------------------------------------------------------------------
+# Ejecución
+# ----------------------------------------------------------------------
+
+def run_once(size: int, args, search_url: str) -> dict:
+    """Ejecuta un lote de `size` canciones en una carpeta de trabajo limpia"""
+    workdir = Path(tempfile.mkdtemp(prefix="ymd-bench-"))
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+
+    try:
+        # Con delays a 0 el control de tasa no limita (salvo --rate en el pipeline)
+        min_delay, max_delay = (0.5, 3.0) if args.keep_delays else (0, 0)
+        downloader = YouTubeAudioDownloader("music", min_delay=min_delay, max_delay=max_delay,
+                                            audio_format=args.format)
+        downloader.artwork_cache.search_url = search_url
+
+        samples = {}
+        instrument(downloader, samples)
+        songs = synthetic_songs(size)
+
+        pipeline_config = {
+            'requests_per_second': args.rate,
+            'decouple_transcode': args.real_transcode,
+        }
+        if args.workers:
+            pipeline_config['workers'] = {
+                'search': args.workers, 'download': args.workers, 'artwork': args.workers
+            }
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if args.driver == 'app':
+                from main_app import MusicDownloaderApp
+
+                app = MusicDownloaderApp()
+                app.output_dir = "music"
+                app.audio_format = args.format
+                app.delay_config = (min_delay, max_delay, 10)
+                app.download_mode = args.mode
+                app.pipeline_config = pipeline_config
+                app.ui.clear = lambda: None
+                app._create_downloader = lambda: downloader
+                app._download_with_progress(songs)
+                downloaded = sum(1 for s in samples.get('tag', []))
+            else:
+                results = downloader.download_batch(
+                    songs, pause_every=10 ** 9, mode=args.mode, pipeline_config=pipeline_config
+                )
+                downloaded = sum(1 for r in results.values() if r['success'])
+        elapsed = time.perf_counter() - start
+
+        return {
+            'songs': size,
+            'downloaded': downloaded,
+            'elapsed_s': elapsed,
+            'songs_per_min': size / elapsed * 60 if elapsed else None,
+            'stages': {stage: percentiles(values) for stage, values in samples.items()},
+            'search_cache': downloader.search_cache.get_stats() if downloader.search_cache else None,
+            'artwork_cache': downloader.artwork_cache.get_stats(),
+        }
+    finally:
+        os.chdir(previous_cwd)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline de YouTubeAudioDownloader")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                        help="Tamaños de lista a medir")
+    parser.add_argument('--mode', choices=['sequential', 'pipeline'], default='pipeline')
+    parser.add_argument('--driver', choices=['batch', 'app'], default='batch',
+                        help="download_batch o MusicDownloaderApp._download_with_progress")
+    parser.add_argument('--format', choices=['mp3', 'opus', 'm4a'], default='mp3')
+    parser.add_argument('--workers', type=int, help="Workers de red por etapa (pipeline)")
+    parser.add_argument('--rate', type=float, default=0, help="Peticiones/s globales (0 = sin límite)")
+    parser.add_argument('--search-latency', type=float, default=0.2, help="Latencia de búsqueda (s)")
+    parser.add_argument('--download-latency', type=float, default=0.3, help="Latencia inicial de descarga (s)")
+    parser.add_argument('--bandwidth-mbps', type=float, default=40, help="Ancho de banda simulado (Mbit/s)")
+    parser.add_argument('--itunes-latency', type=float, default=0.05, help="Latencia de iTunes (s)")
+    parser.add_argument('--real-transcode', action='store_true',
+                        help="Convertir con FFmpeg real en procesos aparte (requiere ffmpeg)")
+    parser.add_argument('--keep-delays', action='store_true', help="Usar el control de tasa del preset por defecto (0.5-3.0s)")
+    parser.add_argument('--keep-workdir', action='store_true', help="No borrar la carpeta temporal")
+    parser.add_argument('--output', help="Archivo JSON de salida (por defecto, stdout)")
+    args = parser.parse_args()
+
+    fixtures = Path(tempfile.mkdtemp(prefix="ymd-fixtures-"))
+    FakeYoutubeDL.fixture = fixtures / "fixture.mp3"
+    make_mp3_fixture(FakeYoutubeDL.fixture)
+    FakeYoutubeDL.raw_fixture = FakeYoutubeDL.fixture
+    FakeYoutubeDL.search_latency = args.search_latency
+    FakeYoutubeDL.download_latency = args.download_latency
+    FakeYoutubeDL.bandwidth = args.bandwidth_mbps * 1024 * 1024 / 8
+    FakeItunesHandler.latency = args.itunes_latency
+
+    # Todas las instancias de yt-dlp salen del pool: basta con sustituir la clase ahí
+    ydl_pool.yt_dlp.YoutubeDL = FakeYoutubeDL
+
+    report = {
+        'mode': args.mode,
+        'driver': args.driver,
+        'format': args.format,
+        'config': {k: v for k, v in vars(args).items() if k not in ('sizes', 'output')},
+        'runs': [],
+    }
+
+    try:
+        with fake_itunes_server() as search_url:
+            for size in args.sizes:
+                report['runs'].append(run_once(size, args, search_url))
+    finally:
+        shutil.rmtree(fixtures, ignore_errors=True)
+
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    report['peak_rss_mb'] = maxrss / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding='utf-8')
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: coste de CPU por canción según el formato de salida
+
+Compara lo que hace FFmpegExtractAudio en cada modo sobre un archivo local:
+    - mp3:  recodificación a MP3 320 kbps (libmp3lame)
+    - opus: remux de Opus/WebM a Ogg sin recodificar (-c:a copy)
+    - m4a:  copia de AAC a M4A sin recodificar (-c:a copy)
+
+Sin archivo de entrada se generan muestras sintéticas de la duración indicada
+(equivalentes a los streams de YouTube: Opus 160 kbps en WebM y AAC 128 kbps).
+
+Uso:
+    python benchmarks/transcode_modes.py --duration 210 --runs 5
+    python benchmarks/transcode_modes.py --input cancion.webm --ffmpeg /ruta/ffmpeg
+"""
+
+import argparse
+import json
+import resource
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+
+def _run(cmd):
+    """Ejecuta FFmpeg y devuelve (segundos de CPU, segundos de reloj)"""
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wall = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return cpu, wall
+
+
+def _make_sources(ffmpeg: str, workdir: Path, duration: int):
+    """Genera fuentes sintéticas con los códecs que entrega YouTube"""
+    webm = workdir / "source.webm"
+    m4a = workdir / "source.m4a"
+    tone = ['-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+            '-f', 'lavfi', '-i', f'anoisesrc=duration={duration}:amplitude=0.1',
+            '-filter_complex', 'amix=inputs=2', '-ac', '2', '-ar', '48000']
+    subprocess.run([ffmpeg, '-y', *tone, '-c:a', 'libopus', '-b:a', '160k', str(webm)],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    subprocess.run([ffmpeg, '-y', *tone, '-c:a', 'aac', '-b:a', '128k', str(m4a)],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return webm, m4a
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU y tiempo por canción según formato de salida")
+    parser.add_argument('--ffmpeg', default=shutil.which('ffmpeg') or 'ffmpeg', help="Ejecutable de FFmpeg")
+    parser.add_argument('--input', help="Archivo Opus/WebM real (opcional)")
+    parser.add_argument('--duration', type=int, default=210, help="Duración de la muestra sintética (s)")
+    parser.add_argument('--runs', type=int, default=3, help="Repeticiones por modo")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        webm, m4a = _make_sources(args.ffmpeg, workdir, args.duration)
+        if args.input:
+            webm = Path(args.input)
+
+        modes = {
+            'mp3': [args.ffmpeg, '-y', '-i', str(webm), '-vn', '-c:a', 'libmp3lame', '-b:a', '320k',
+                    str(workdir / 'out.mp3')],
+            'opus': [args.ffmpeg, '-y', '-i', str(webm), '-vn', '-c:a', 'copy',
+                     str(workdir / 'out.opus')],
+            'm4a': [args.ffmpeg, '-y', '-i', str(m4a), '-vn', '-c:a', 'copy',
+                    str(workdir / 'out.m4a')],
+        }
+
+        report = {'duration_s': args.duration, 'runs': args.runs, 'modes': {}}
+        for mode, cmd in modes.items():
+            samples = [_run(cmd) for _ in range(args.runs)]
+            report['modes'][mode] = {
+                'cpu_s_per_track': statistics.mean(cpu for cpu, _ in samples),
+                'wall_s_per_track': statistics.mean(wall for _, wall in samples),
+            }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark: coste por canción de crear YoutubeDL frente a reutilizarlo
+
+Mide solo la sobrecarga de yt-dlp (construcción de la instancia, carga de
+extractores y procesado de opciones), sin tráfico de red. Con --online se
+hacen además búsquedas reales para ver el efecto sobre el tiempo total.
+
+Uso:
+    python benchmarks/ydl_overhead.py --songs 200
+    python benchmarks/ydl_overhead.py --songs 20 --online
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import yt_dlp
+
+from ydl_pool import YoutubeDLPool
+
+
+SEARCH_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'extract_flat': True,
+    'force_generic_extractor': False,
+}
+
+DOWNLOAD_OPTS = {
+    'format': 'bestaudio/best',
+    'postprocessors': [{
+        'key': 'FFmpegExtractAudio',
+        'preferredcodec': 'mp3',
+        'preferredquality': '320',
+    }],
+    'outtmpl': '%(title)s.%(ext)s',
+    'quiet': True,
+    'no_warnings': True,
+    'ignoreerrors': True,
+}
+
+QUERIES = [
+    "Daft Punk - Get Lucky audio oficial",
+    "The Weeknd - Blinding Lights audio oficial",
+    "Billie Eilish - Bad Guy audio oficial",
+    "Arctic Monkeys - Do I Wanna Know audio oficial",
+    "Tame Impala - The Less I Know The Better audio oficial",
+]
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _summary(samples):
+    return {
+        'mean_ms': statistics.mean(samples) * 1000,
+        'p50_ms': _percentile(samples, 50) * 1000,
+        'p95_ms': _percentile(samples, 95) * 1000,
+    }
+
+
+def per_call(songs: int, online: bool):
+    """Comportamiento anterior: dos YoutubeDL nuevos por canción"""
+    samples = []
+    for i in range(songs):
+        start = time.perf_counter()
+        with yt_dlp.YoutubeDL(SEARCH_OPTS) as ydl:
+            if online:
+                ydl.extract_info(f"ytsearch5:{QUERIES[i % len(QUERIES)]}", download=False)
+        with yt_dlp.YoutubeDL(dict(DOWNLOAD_OPTS, outtmpl=f"/tmp/bench/{i}/%(title)s.%(ext)s")):
+            pass
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def pooled(songs: int, online: bool):
+    """Comportamiento nuevo: instancias del pool reutilizadas"""
+    pool = YoutubeDLPool({'search': SEARCH_OPTS, 'download': DOWNLOAD_OPTS})
+    samples = []
+    for i in range(songs):
+        start = time.perf_counter()
+        ydl = pool.get('search')
+        if online:
+            ydl.extract_info(f"ytsearch5:{QUERIES[i % len(QUERIES)]}", download=False)
+        pool.get_downloader(Path(f"/tmp/bench/{i}"))
+        samples.append(time.perf_counter() - start)
+    pool.close()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sobrecarga de YoutubeDL por canción")
+    parser.add_argument('--songs', type=int, default=200, help="Canciones simuladas")
+    parser.add_argument('--online', action='store_true', help="Incluir búsquedas reales en YouTube")
+    args = parser.parse_args()
+
+    before = per_call(args.songs, args.online)
+    after = pooled(args.songs, args.online)
+
+    report = {
+        'songs': args.songs,
+        'online': args.online,
+        'yt_dlp_version': yt_dlp.version.__version__,
+        'per_call': _summary(before),
+        'pooled': _summary(after),
+    }
+    report['saved_per_song_ms'] = report['per_call']['mean_ms'] - report['pooled']['mean_ms']
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
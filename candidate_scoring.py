@@ -0,0 +1,184 @@
+"""
+Candidate Scoring
+Puntuación de los resultados de búsqueda de YouTube para elegir la versión correcta
+"""
+
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set
+
+# Duración aceptable cuando no se conoce la de Spotify (segundos)
+MIN_DURATION = 30
+MAX_DURATION = 600
+
+# Diferencia de duración con Spotify que aún puntúa (segundos)
+DURATION_EXACT = 3
+DURATION_CLOSE = 30
+
+# Palabras sin valor para comparar títulos
+STOPWORDS = {'the', 'a', 'an', 'el', 'la', 'los', 'las', 'de', 'del', 'y', 'and', 'feat', 'ft'}
+
+# Marcas de versión de estudio en el título
+AUDIO_PATTERN = re.compile(r'\b(?:official audio|audio oficial|audio)\b')
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas sin acentos ni signos, para comparar títulos"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def tokenize(text: str) -> Set[str]:
+    """Palabras significativas de un texto normalizado"""
+    return {token for token in normalize_text(text).split() if token not in STOPWORDS}
+
+
+class CandidateScorer:
+    """
+    Ordena los candidatos de una búsqueda por lo probable que sea la versión buscada
+
+    Cada candidato suma o resta puntos por:
+    - duración: cercanía a la duración de Spotify (o rango razonable si no se conoce)
+    - canal: canales "Artista - Topic" (audio de estudio), VEVO, verificados o
+      con el nombre del artista
+    - título: proporción de palabras del artista y la canción presentes
+    - penalizaciones: términos de versiones alternativas (remix, live, cover...)
+      que no forman parte del nombre buscado, buscados con una sola expresión
+      regular compilada al crear el objeto
+    """
+
+    # Pesos de cada componente
+    DURATION_WEIGHT = 30
+    DURATION_MISMATCH = -40
+    TOPIC_BONUS = 20
+    VEVO_BONUS = 15
+    ARTIST_CHANNEL_BONUS = 15
+    VERIFIED_BONUS = 5
+    SONG_WEIGHT = 30
+    ARTIST_WEIGHT = 10
+    AUDIO_BONUS = 5
+    PENALTY = -25
+
+    def __init__(self, blocked_keywords: Iterable[str]):
+        """
+        Args:
+            blocked_keywords: Términos que indican otra versión de la canción
+        """
+        terms = sorted({normalize_text(k) for k in blocked_keywords if k.strip()}, key=len, reverse=True)
+        alternatives = '|'.join(re.escape(term).replace(r'\ ', r'\s+') for term in terms)
+        # Plurales incluidos ("covers", "hours"); límites de palabra para no penalizar "Oliver" por "live"
+        self.penalty_pattern = re.compile(rf'\b(?:{alternatives})s?\b') if terms else None
+
+    def _penalty_terms(self, text: str) -> Set[str]:
+        if not self.penalty_pattern:
+            return set()
+        return {re.sub(r'\s+', ' ', m.group(0)) for m in self.penalty_pattern.finditer(text)}
+
+    def _duration_score(self, duration: Optional[float], expected: Optional[float]) -> float:
+        if not duration:
+            return 0.0
+
+        if expected is None:
+            return 0.0 if MIN_DURATION <= duration <= MAX_DURATION else self.DURATION_MISMATCH
+
+        diff = abs(duration - expected)
+        if diff <= DURATION_EXACT:
+            return self.DURATION_WEIGHT
+        if diff <= DURATION_CLOSE:
+            return self.DURATION_WEIGHT * (1 - (diff - DURATION_EXACT) / (DURATION_CLOSE - DURATION_EXACT))
+        # Más allá del margen: otra versión (video con intro, extendida, fragmento...)
+        return max(self.DURATION_MISMATCH, -(diff - DURATION_CLOSE) / 3)
+
+    def score(self, candidate: Dict, artist: str, song: str,
+              expected_duration: Optional[float] = None) -> Dict[str, float]:
+        """
+        Puntúa un candidato
+
+        Args:
+            candidate: Video (title, channel, duration y opcionalmente channel_verified)
+            artist: Artista buscado
+            song: Canción buscada
+            expected_duration: Duración en Spotify (segundos), si se conoce
+
+        Returns:
+            Puntos por componente (duration, channel, title, penalty) y total
+        """
+        title = normalize_text(candidate.get('title', ''))
+        channel = normalize_text(candidate.get('channel', ''))
+        title_tokens = set(title.split())
+        channel_tokens = set(channel.split())
+        artist_tokens = tokenize(artist)
+        song_tokens = tokenize(song)
+
+        channel_score = 0.0
+        if channel.endswith(' topic'):
+            channel_score += self.TOPIC_BONUS
+        if 'vevo' in channel:
+            channel_score += self.VEVO_BONUS
+        if artist_tokens and artist_tokens <= channel_tokens:
+            channel_score += self.ARTIST_CHANNEL_BONUS
+        if candidate.get('channel_verified'):
+            channel_score += self.VERIFIED_BONUS
+
+        title_score = 0.0
+        if song_tokens:
+            title_score += self.SONG_WEIGHT * len(song_tokens & title_tokens) / len(song_tokens)
+        if artist_tokens:
+            found = artist_tokens & (title_tokens | channel_tokens)
+            title_score += self.ARTIST_WEIGHT * len(found) / len(artist_tokens)
+        if AUDIO_PATTERN.search(title):
+            title_score += self.AUDIO_BONUS
+
+        # Un término del propio nombre ("Live Forever", "Acoustic Session") no penaliza
+        wanted = self._penalty_terms(normalize_text(f"{artist} {song}"))
+        penalties = self._penalty_terms(title) - wanted
+
+        scores = {
+            'duration': self._duration_score(candidate.get('duration'), expected_duration),
+            'channel': channel_score,
+            'title': title_score,
+            'penalty': self.PENALTY * len(penalties),
+        }
+        scores['total'] = sum(scores.values())
+        return scores
+
+    def rank(self, candidates: List[Dict], artist: str, song: str,
+             expected_duration: Optional[float] = None) -> List[Dict]:
+        """
+        Puntúa todos los candidatos y los ordena de mejor a peor
+
+        Cada candidato devuelto es una copia con 'score' (total) y
+        'score_detail' (puntos por componente). A igualdad de puntos se
+        respeta el orden de YouTube.
+
+        Returns:
+            Lista ordenada de candidatos
+        """
+        ranked = []
+        for candidate in candidates:
+            scores = self.score(candidate, artist, song, expected_duration)
+            total = scores.pop('total')
+            ranked.append({
+                **candidate,
+                'score': round(total, 1),
+                'score_detail': {name: round(value, 1) for name, value in scores.items()},
+            })
+
+        ranked.sort(key=lambda c: c['score'], reverse=True)
+        return ranked
+
+
+def format_ranking(query: str, ranked: List[Dict], expected_duration: Optional[float] = None) -> List[str]:
+    """Líneas de registro con la puntuación de cada candidato (el primero es el elegido)"""
+    expected = f"{expected_duration:.0f}s" if expected_duration else "?"
+    lines = [f"{query} (duración esperada: {expected})"]
+    for position, candidate in enumerate(ranked):
+        detail = ' '.join(f"{name}={value:+g}" for name, value in candidate['score_detail'].items())
+        marker = '*' if position == 0 else ' '
+        lines.append(
+            f" {marker} {candidate['score']:+6.1f}  {candidate['id']}  {candidate.get('duration') or '?'}s  "
+            f"[{candidate.get('channel', '')}] {candidate.get('title', '')}  ({detail})"
+        )
+    return lines
@@ -0,0 +1,429 @@
+"""
+YouTube Music Downloader - Línea de comandos
+Ejecución desatendida (cron, scripts, varios trabajos a la vez) sin menús
+
+Uso:
+    python cli.py songs canciones.txt --workers 4 --json
+    python cli.py playlist https://open.spotify.com/playlist/... --format opus
+    python cli.py sync --mode sequential --output-dir /srv/music
+    python cli.py sync --metrics-textfile /var/lib/node_exporter/ymd.prom
+    python cli.py playlist https://open.spotify.com/playlist/... --dry-run --plan-output plan.csv
+
+Códigos de salida:
+    0  Todo correcto (descargadas o ya existentes)
+    1  Alguna canción falló
+    2  Argumentos inválidos
+    3  No se pudo leer el origen (archivo, Spotify)
+    4  Error inesperado (Spotify, base de datos...)
+    130 Interrumpido por el usuario
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from download_planner import DownloadPlanner
+from job_journal import JobJournal
+from metrics import MetricsExporter
+from tracing import PROFILE_MODES, RunProfiler, write_run_report
+from youtube_downloader import AUDIO_FORMATS, YouTubeAudioDownloader
+
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2
+EXIT_SOURCE_ERROR = 3
+EXIT_ERROR = 4
+EXIT_INTERRUPTED = 130
+
+
+class SourceError(Exception):
+    """No se pudo obtener la lista de canciones"""
+
+
+def read_songs_file(path: Path) -> List[Tuple]:
+    """
+    Lee una lista de canciones desde un archivo de texto
+
+    Formatos aceptados por línea (se ignoran líneas vacías y las que empiezan por #):
+        Artista - Canción
+        track_id<TAB>Artista<TAB>Canción
+
+    Args:
+        path: Ruta del archivo
+
+    Returns:
+        Lista de tuplas (artista, canción) o (track_id, artista, canción)
+    """
+    try:
+        lines = Path(path).read_text(encoding='utf-8').splitlines()
+    except OSError as e:
+        raise SourceError(f"No se pudo leer {path}: {e}")
+
+    songs = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        fields = line.split('\t')
+        if len(fields) == 3:
+            songs.append(tuple(field.strip() for field in fields))
+        elif ' - ' in line:
+            artist, song = line.split(' - ', 1)
+            songs.append((artist.strip(), song.strip()))
+        else:
+            raise SourceError(f"{path}:{number}: formato inválido (usa 'Artista - Canción')")
+
+    return songs
+
+
+def _connect_spotify():
+    """Conecta con Spotify sin abrir el navegador"""
+    from spotify_integration import SpotifyPlaylistExtractor
+
+    try:
+        return SpotifyPlaylistExtractor(open_browser=False)
+    except Exception as e:
+        raise SourceError(f"No se pudo conectar con Spotify: {e}")
+
+
+def _merge_history(downloader: YouTubeAudioDownloader, playlist_id: str, results: Dict[str, Dict]):
+    """Añade al historial de la playlist las canciones descargadas o ya existentes"""
+    downloader._merge_download_history(
+        playlist_id, [result.get('track_id') for result in results.values() if result['success']]
+    )
+
+
+def _run_batch(downloader: YouTubeAudioDownloader, songs: List[Tuple], args) -> Dict[str, Dict]:
+    """Descarga un lote con la configuración de la línea de comandos"""
+    if not songs:
+        return {}
+
+    if args.dry_run:
+        # Solo clasificar: los planes de varias playlists se acumulan en args.plan
+        plan = DownloadPlanner(downloader, args.mode).plan(songs)
+        if args.plan is None:
+            args.plan = plan
+        else:
+            args.plan.extend(plan)
+        return {}
+
+    pipeline_config = None
+    if args.mode == "pipeline":
+        workers = {}
+        if args.workers:
+            workers['download'] = args.workers
+        if args.search_workers:
+            workers['search'] = args.search_workers
+        pipeline_config = {'workers': workers or None, 'requests_per_second': args.rate}
+
+    return downloader.download_batch(
+        songs,
+        pause_every=args.pause_every,
+        mode=args.mode,
+        pipeline_config=pipeline_config
+    )
+
+
+# ----------------------------------------------------------------------
+# Subcomandos
+# ----------------------------------------------------------------------
+
+def cmd_songs(args, downloader: YouTubeAudioDownloader) -> Dict:
+    """Descarga las canciones de un archivo de texto"""
+    songs = read_songs_file(args.file)
+    results = _run_batch(downloader, songs, args)
+    return {'results': results, 'playlists': []}
+
+
+def cmd_playlist(args, downloader: YouTubeAudioDownloader) -> Dict:
+    """Descarga una o varias playlists de Spotify"""
+    extractor = _connect_spotify()
+    results = {}
+    playlists = []
+
+    for playlist_input in args.urls:
+        playlist_id = extractor._extract_playlist_id(playlist_input)
+        tracks, _ = downloader._get_playlist_tracks(extractor, playlist_id)
+        if not tracks:
+            raise SourceError(f"No se encontraron canciones en la playlist {playlist_id}")
+
+        playlist_results = _run_batch(downloader, tracks, args)
+        if not args.dry_run:
+            _merge_history(downloader, playlist_id, playlist_results)
+
+        results.update(playlist_results)
+        playlists.append({'id': playlist_id, 'tracks': len(tracks)})
+
+    return {'results': results, 'playlists': playlists}
+
+
+def cmd_sync(args, downloader: YouTubeAudioDownloader) -> Dict:
+    """Descarga las canciones nuevas de todas las playlists del historial"""
+    history = downloader.download_history
+    playlist_ids = args.playlists or list(history.keys())
+    if not playlist_ids:
+        return {'results': {}, 'playlists': []}
+
+    extractor = _connect_spotify()
+    results = {}
+    playlists = []
+
+    for playlist_id in playlist_ids:
+        # Si el snapshot_id no cambió se usa el listado guardado (una sola llamada)
+        tracks, changed = downloader._get_playlist_tracks(extractor, playlist_id)
+        if not tracks:
+            playlists.append({'id': playlist_id, 'tracks': 0, 'new': 0, 'error': "Sin canciones"})
+            continue
+
+        new_tracks = downloader._get_new_tracks(playlist_id, tracks)
+        playlist_results = _run_batch(downloader, new_tracks, args)
+        if not args.dry_run:
+            _merge_history(downloader, playlist_id, playlist_results)
+
+        results.update(playlist_results)
+        playlists.append({'id': playlist_id, 'tracks': len(tracks), 'new': len(new_tracks),
+                          'changed': changed})
+
+    return {'results': results, 'playlists': playlists}
+
+
+def cmd_resume(args, downloader: YouTubeAudioDownloader) -> Dict:
+    """Reanuda un lote interrumpido desde la última etapa registrada"""
+    if args.batch_id:
+        batch = downloader.state.get_batch(args.batch_id)
+        if batch is None:
+            raise SourceError(f"No existe el lote {args.batch_id}")
+    else:
+        unfinished = downloader.state.unfinished_batches()
+        if not unfinished:
+            return {'results': {}, 'playlists': []}
+        batch = unfinished[0]
+
+    if args.dry_run:
+        # Sin abrir el diario: el lote sigue pendiente
+        pending = JobJournal.resume(downloader.state, batch['batch_id']).pending_songs()
+        _run_batch(downloader, pending, args)
+        return {'results': {}, 'playlists': [], 'batch_id': batch['batch_id']}
+
+    journal = downloader.begin_journal(batch_id=batch['batch_id'])
+    pending = journal.pending_songs()
+    results = _run_batch(downloader, pending, args)
+    # Incluye las canciones que se terminaron antes del corte
+    finished = journal.finished_track_ids()
+    downloader.end_journal()
+
+    playlists = []
+    if batch['playlist_id']:
+        downloader._merge_download_history(batch['playlist_id'], finished)
+        playlists.append({'id': batch['playlist_id'], 'tracks': len(pending)})
+
+    return {'results': results, 'playlists': playlists, 'batch_id': batch['batch_id']}
+
+
+COMMANDS = {
+    'songs': cmd_songs,
+    'playlist': cmd_playlist,
+    'sync': cmd_sync,
+    'resume': cmd_resume,
+}
+
+
+# ----------------------------------------------------------------------
+# Entrada
+# ----------------------------------------------------------------------
+
+def build_parser() -> argparse.ArgumentParser:
+    """Crea el parser de argumentos"""
+    parser = argparse.ArgumentParser(
+        prog="cli.py",
+        description="YouTube Music Downloader sin interfaz interactiva"
+    )
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--output-dir', default="music", help="Carpeta de la biblioteca (por defecto: music)")
+    common.add_argument('--format', choices=list(AUDIO_FORMATS), default="mp3", help="Formato de salida")
+    common.add_argument('--mode', choices=['sequential', 'pipeline'], default="pipeline",
+                        help="Modo de descarga (por defecto: pipeline)")
+    common.add_argument('--workers', type=int, help="Workers de descarga (modo pipeline)")
+    common.add_argument('--search-workers', type=int, help="Workers de búsqueda (modo pipeline)")
+    common.add_argument('--rate', type=float, default=1.0,
+                        help="Peticiones por segundo máximas a YouTube/iTunes (modo pipeline, adaptativo)")
+    common.add_argument('--min-delay', type=float, default=1.5, help="Delay mínimo: fija la tasa máxima (modo secuencial)")
+    common.add_argument('--max-delay', type=float, default=4.0, help="Delay máximo: fija la tasa mínima (modo secuencial)")
+    common.add_argument('--pause-every', type=int, default=20, help="Canciones sin errores antes de acelerar (modo secuencial)")
+    common.add_argument('--staging-dir',
+                        help="Carpeta de trabajo para las descargas en curso, p.ej. /dev/shm/ymd "
+                             "(por defecto: <output-dir>/.staging)")
+    common.add_argument('--metrics-textfile',
+                        help="Archivo .prom para el textfile collector de node_exporter")
+    common.add_argument('--metrics-json', help="Archivo JSON con las métricas de la ejecución")
+    common.add_argument('--metrics-port', type=int,
+                        help="Servir /metrics (Prometheus) y /metrics.json en 127.0.0.1:PUERTO")
+    common.add_argument('--metrics-interval', type=float, default=15.0,
+                        help="Segundos entre escrituras de los archivos de métricas")
+    common.add_argument('--profile', choices=PROFILE_MODES,
+                        help="Perfilar la ejecución (cprofile: hilo principal; sample: todos los hilos)")
+    common.add_argument('--trace-dir', type=Path,
+                        help="Carpeta del informe de tiempos por etapa (por defecto: data/traces)")
+    common.add_argument('--no-cache', action='store_true', help="No usar la caché de búsquedas")
+    common.add_argument('--dry-run', action='store_true',
+                        help="No descargar: clasificar las canciones y estimar tamaño y tiempo")
+    common.add_argument('--plan-output', type=Path,
+                        help="Exportar el plan de --dry-run (.json o .csv con una fila por canción)")
+    common.add_argument('--json', action='store_true', help="Imprimir el resultado en JSON por stdout")
+    common.add_argument('--quiet', action='store_true', help="No mostrar el progreso")
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    songs = subparsers.add_parser('songs', parents=[common], help="Descargar canciones de un archivo de texto")
+    songs.add_argument('file', type=Path, help="Archivo con una canción por línea ('Artista - Canción')")
+
+    playlist = subparsers.add_parser('playlist', parents=[common], help="Descargar playlists de Spotify")
+    playlist.add_argument('urls', nargs='+', help="URLs o IDs de playlists de Spotify")
+
+    sync = subparsers.add_parser('sync', parents=[common], help="Actualizar las playlists del historial")
+    sync.add_argument('playlists', nargs='*', help="IDs concretos (por defecto, todo el historial)")
+
+    resume = subparsers.add_parser('resume', parents=[common], help="Reanudar un lote interrumpido")
+    resume.add_argument('batch_id', nargs='?', help="ID del lote (por defecto, el último sin terminar)")
+
+    return parser
+
+
+def build_report(command: str, outcome: Dict, elapsed: float,
+                 metrics: Optional[Dict] = None) -> Dict:
+    """Resumen serializable de la ejecución"""
+    results = list(outcome['results'].values())
+    skipped = sum(1 for r in results if r['success'] and r['message'] == "Ya existe")
+    downloaded = sum(1 for r in results if r['success']) - skipped
+
+    report = {
+        'command': command,
+        'total': len(results),
+        'downloaded': downloaded,
+        'skipped': skipped,
+        'failed': sum(1 for r in results if not r['success']),
+        'fallback': metrics.get('fallback_successes', 0) if metrics else 0,
+        'elapsed_seconds': round(elapsed, 2),
+        'playlists': outcome['playlists'],
+        'results': results,
+    }
+    if outcome.get('batch_id'):
+        report['batch_id'] = outcome['batch_id']
+    if metrics:
+        report['metrics'] = metrics
+    return report
+
+
+def print_error_report(args, error: str, exit_code: int):
+    """Con --json, imprime en stdout el resultado de una ejecución que no terminó"""
+    if args.json:
+        print(json.dumps({'command': args.command, 'error': error, 'exit_code': exit_code},
+                         ensure_ascii=False))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Punto de entrada de la línea de comandos"""
+    parser = build_parser()
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit as e:
+        return EXIT_USAGE if e.code else EXIT_OK
+    args.plan = None
+
+    # Nunca esperar entrada: cualquier input() (p.ej. autorización de Spotify) falla de inmediato
+    sys.stdin = open(os.devnull)
+
+    if args.quiet:
+        progress = open(os.devnull, 'w', encoding='utf-8')
+    else:
+        # Con --json, stdout queda reservado para el resultado
+        progress = sys.stderr if args.json else sys.stdout
+
+    start = time.time()
+    downloader = None
+
+    try:
+        with contextlib.redirect_stdout(progress):
+            downloader = YouTubeAudioDownloader(
+                output_dir=args.output_dir,
+                min_delay=args.min_delay,
+                max_delay=args.max_delay,
+                use_search_cache=not args.no_cache,
+                audio_format=args.format,
+                staging_dir=args.staging_dir
+            )
+            exporter = MetricsExporter(
+                downloader.metrics,
+                textfile=args.metrics_textfile,
+                json_file=args.metrics_json,
+                port=args.metrics_port,
+                interval=args.metrics_interval
+            )
+            profiler = RunProfiler(args.profile) if args.profile else None
+            with exporter, (profiler or contextlib.nullcontext()):
+                if args.metrics_port is not None:
+                    print(f"📈 Métricas en http://127.0.0.1:{exporter.port}/metrics")
+                outcome = COMMANDS[args.command](args, downloader)
+
+            if args.plan:
+                print()
+                for line in args.plan.format_lines():
+                    print(line)
+                if args.plan_output:
+                    print(f"📄 Plan: {args.plan.write(args.plan_output)}")
+
+            trace_paths = None
+            if downloader.tracer.summary():
+                print("\n⏱️  Tiempo por etapa:")
+                for line in downloader.tracer.format_summary():
+                    print(f"  {line}")
+                trace_paths = write_run_report(
+                    downloader.tracer, args.trace_dir or downloader.data_dir / "traces", profiler
+                )
+                print(f"📄 Informe: {trace_paths['summary']}")
+
+    except SourceError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        print_error_report(args, str(e), EXIT_SOURCE_ERROR)
+        return EXIT_SOURCE_ERROR
+
+    except KeyboardInterrupt:
+        print("\n👋 Interrumpido por el usuario", file=sys.stderr)
+        print_error_report(args, "Interrumpido por el usuario", EXIT_INTERRUPTED)
+        return EXIT_INTERRUPTED
+
+    except Exception as e:
+        # Distinto de EXIT_FAILURES: quien lanza el CLI sabe que no llegó a terminar
+        traceback.print_exc(file=sys.stderr)
+        print(f"❌ Error inesperado: {e}", file=sys.stderr)
+        print_error_report(args, f"{type(e).__name__}: {e}", EXIT_ERROR)
+        return EXIT_ERROR
+
+    report = build_report(args.command, outcome, time.time() - start, downloader.metrics.to_dict())
+    if trace_paths:
+        report['trace'] = {name: str(path) for name, path in trace_paths.items()}
+    if args.dry_run:
+        report['plan'] = args.plan.to_dict(include_items=False) if args.plan else None
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    elif not args.quiet and not args.dry_run:
+        print(f"\n✅ {report['downloaded']} descargadas | ⏭️ {report['skipped']} ya existían | "
+              f"❌ {report['failed']} fallidas | ⏱️ {report['elapsed_seconds']:.0f}s")
+        if report['fallback']:
+            print(f"↪️  {report['fallback']} descargadas con un video alternativo")
+
+    return EXIT_FAILURES if report['failed'] else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
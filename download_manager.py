@@ -6,29 +6,65 @@ import os
 import sys
 import time
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Iterable, Iterator, List, Tuple, Optional
 from datetime import datetime, timedelta
 
 
 class DownloadStats:
     """Estadísticas de descarga en tiempo real"""
     
-    def __init__(self, total_songs: int):
-        self.total_songs = total_songs
+    def __init__(self, total_songs: Optional[int] = None, concurrent: bool = False):
+        """
+        Args:
+            total_songs: Total de canciones (None si se van descubriendo, ver count_songs)
+            concurrent: Si varias canciones se procesan a la vez (modo pipeline)
+        """
+        self.total_songs = total_songs or 0
+        # False mientras el listado siga creciendo (total parcial)
+        self.total_known = total_songs is not None
         self.downloaded = 0
         self.failed = 0
         self.skipped = 0
         self.start_time = time.time()
         self.current_song_start = None
         self.song_times = []
+        # En modo pipeline varias canciones se procesan a la vez
+        self.concurrent = concurrent
+        # Estadísticas del grupo de conversión a MP3 (solo en modo pipeline)
+        self.transcode_stats = None
         
+    def count_songs(self, songs: Iterable) -> Iterator:
+        """
+        Recorre un iterador de canciones sumándolas al total
+        
+        El total crece a medida que el productor entrega canciones y se da
+        por definitivo cuando el iterador se agota.
+        """
+        for song in songs:
+            self.total_songs += 1
+            yield song
+        self.total_known = True
+    
+    def get_total_label(self) -> str:
+        """Total para mostrar ("120+" mientras el listado sigue creciendo)"""
+        return f"{self.total_songs}" if self.total_known else f"{self.total_songs}+"
+    
     def start_song(self):
         """Marca el inicio de descarga de una canción"""
         self.current_song_start = time.time()
     
-    def finish_song(self, success: bool, skipped: bool = False):
-        """Marca el fin de descarga de una canción"""
-        if self.current_song_start:
+    def finish_song(self, success: bool, skipped: bool = False, elapsed: Optional[float] = None):
+        """
+        Marca el fin de descarga de una canción
+        
+        Args:
+            success: Si la descarga fue exitosa
+            skipped: Si la canción se omitió (ya existía)
+            elapsed: Duración medida por el llamador (modo pipeline)
+        """
+        if elapsed is not None:
+            self.song_times.append(elapsed)
+        elif self.current_song_start:
             elapsed = time.time() - self.current_song_start
             self.song_times.append(elapsed)
         
@@ -48,10 +84,15 @@ class DownloadStats:
     def get_eta(self) -> str:
         """Calcula el tiempo estimado restante"""
         remaining = self.total_songs - (self.downloaded + self.failed + self.skipped)
-        if remaining <= 0 or not self.song_times:
+        if remaining <= 0 or not self.song_times or not self.total_known:
             return "Calculando..."
         
-        avg_time = self.get_average_time()
+        if self.concurrent:
+            # Las canciones se solapan: usar el ritmo real de finalización
+            completed = self.downloaded + self.failed + self.skipped
+            avg_time = (time.time() - self.start_time) / completed
+        else:
+            avg_time = self.get_average_time()
         eta_seconds = avg_time * remaining
         
         return str(timedelta(seconds=int(eta_seconds)))
@@ -135,7 +176,7 @@ class ConsoleUI:
         """Imprime estadísticas en tiempo real"""
         print(f"\n{ConsoleUI.BOLD}📊 ESTADÍSTICAS EN TIEMPO REAL{ConsoleUI.RESET}")
         print(f"{'─' * 60}")
-        print(f"🎵 Total:          {stats.total_songs} canciones")
+        print(f"🎵 Total:          {stats.get_total_label()} canciones")
         print(f"✅ Descargadas:    {stats.downloaded}")
         print(f"⏭️  Ya existían:    {stats.skipped}")
         print(f"❌ Fallidas:       {stats.failed}")
@@ -143,6 +184,10 @@ class ConsoleUI:
         print(f"⏳ ETA:            {stats.get_eta()}")
         print(f"🚀 Velocidad:      {stats.get_download_speed()}")
         print(f"📶 Descarga:       {download_speed}")
+        if stats.transcode_stats:
+            t = stats.transcode_stats
+            print(f"🎛️  Conversión:     {t['queue_depth']} en cola | "
+                  f"{t['encoded']} convertidas | {t['avg_encode_time']:.1f}s media")
         print(f"\n{stats.get_progress_bar()}\n")
     
     @staticmethod
@@ -205,6 +250,7 @@ def create_main_menu():
         "📋 Descargar múltiples playlists de Spotify",
         "⛔ Ver/Gestionar lista negra",
         "⚙️  Configurar delays de seguridad",
+        "🚀 Configurar modo de descarga (secuencial/pipeline)",
         "📁 Ver carpeta de descargas",
         "❌ Salir"
     ]
@@ -226,6 +272,9 @@ def show_delay_config():
     print(f"  {ConsoleUI.CYAN}4.{ConsoleUI.RESET} Muy seguro  (200+ canciones)    → 2.0-5.0s")
     print(f"  {ConsoleUI.CYAN}5.{ConsoleUI.RESET} Personalizado")
     print(f"  {ConsoleUI.CYAN}6.{ConsoleUI.RESET} Volver al menú principal\n")
+    print(f"{ConsoleUI.YELLOW}💡 Los delays son los límites del control de tasa adaptativo: el mínimo fija{ConsoleUI.RESET}")
+    print(f"{ConsoleUI.YELLOW}   la velocidad máxima y el máximo la mínima. Si YouTube responde con 429/403{ConsoleUI.RESET}")
+    print(f"{ConsoleUI.YELLOW}   se frena al momento y solo acelera mientras no haya errores.{ConsoleUI.RESET}\n")
     
     choice = input(f"{ConsoleUI.BOLD}👉 Selecciona: {ConsoleUI.RESET}")
     
@@ -242,7 +291,7 @@ def show_delay_config():
         try:
             min_d = float(ui.input_text("Delay mínimo (segundos)"))
             max_d = float(ui.input_text("Delay máximo (segundos)"))
-            pause = int(ui.input_text("Pausa larga cada X canciones"))
+            pause = int(ui.input_text("Canciones sin errores antes de acelerar"))
             return (min_d, max_d, pause)
         except ValueError:
             ui.print_error("Valores inválidos, usando configuración por defecto")
@@ -251,6 +300,65 @@ def show_delay_config():
         return None
 
 
+def show_pipeline_config(current_mode: str = "sequential"):
+    """
+    Muestra y permite configurar el modo de descarga
+    
+    Returns:
+        Tupla (modo, workers por etapa, peticiones por segundo) o None
+    """
+    ui = ConsoleUI()
+    
+    ui.clear()
+    ui.print_header("🚀 MODO DE DESCARGA")
+    
+    print(f"{ConsoleUI.BOLD}Modo actual:{ConsoleUI.RESET} {current_mode}\n")
+    print(f"  {ConsoleUI.CYAN}1.{ConsoleUI.RESET} Secuencial  (una canción tras otra, delays humanos)")
+    print(f"  {ConsoleUI.CYAN}2.{ConsoleUI.RESET} Pipeline    (búsqueda, descarga, carátula y metadatos en paralelo)")
+    print(f"  {ConsoleUI.CYAN}3.{ConsoleUI.RESET} Pipeline personalizado")
+    print(f"  {ConsoleUI.CYAN}4.{ConsoleUI.RESET} Volver al menú principal\n")
+    
+    choice = input(f"{ConsoleUI.BOLD}👉 Selecciona: {ConsoleUI.RESET}")
+    
+    if choice == '1':
+        return ("sequential", None, None)
+    elif choice == '2':
+        return ("pipeline", None, 1.0)
+    elif choice == '3':
+        try:
+            workers = {
+                'search': int(ui.input_text("Workers de búsqueda")),
+                'download': int(ui.input_text("Workers de descarga")),
+                'artwork': int(ui.input_text("Workers de carátulas")),
+                'tag': int(ui.input_text("Workers de metadatos")),
+            }
+            rate = float(ui.input_text("Peticiones por segundo (global)"))
+            return ("pipeline", workers, rate)
+        except ValueError:
+            ui.print_error("Valores inválidos, usando configuración por defecto")
+            return ("pipeline", None, 1.0)
+    else:
+        return None
+
+
+def show_format_config(current_format: str = "mp3"):
+    """
+    Muestra y permite elegir el formato de salida
+    
+    Returns:
+        "mp3", "opus", "m4a" o None para mantener el actual
+    """
+    print(f"\n{ConsoleUI.BOLD}🎧 Formato de salida (actual: {current_format}):{ConsoleUI.RESET}\n")
+    print(f"  {ConsoleUI.CYAN}1.{ConsoleUI.RESET} MP3 320 kbps  (recodifica con FFmpeg, máxima compatibilidad)")
+    print(f"  {ConsoleUI.CYAN}2.{ConsoleUI.RESET} Opus original (sin recodificar, mínimo uso de CPU)")
+    print(f"  {ConsoleUI.CYAN}3.{ConsoleUI.RESET} M4A original  (sin recodificar, AAC)")
+    print(f"  {ConsoleUI.CYAN}4.{ConsoleUI.RESET} Mantener actual\n")
+    
+    choice = input(f"{ConsoleUI.BOLD}👉 Selecciona: {ConsoleUI.RESET}")
+    
+    return {'1': 'mp3', '2': 'opus', '3': 'm4a'}.get(choice)
+
+
 # Ejemplo de uso
 if __name__ == "__main__":
     ui = ConsoleUI()
@@ -0,0 +1,443 @@
+"""
+Download Pipeline
+Motor de descarga por etapas concurrentes (búsqueda, descarga, carátula y metadatos)
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from retry_engine import DelayedQueue, classify_error
+from transcoder import TranscodePool
+
+
+# Workers por etapa: la red (búsqueda/descarga/carátula) se solapa con FFmpeg y disco
+DEFAULT_WORKERS = {
+    'search': 2,
+    'download': 3,
+    'artwork': 2,
+    'tag': 1,
+}
+
+# Estado del diario de trabajos al entrar en cada etapa
+STAGE_JOB_STATES = {
+    'search': 'searching',
+    'download': 'downloading',
+    'transcode': 'transcoding',
+}
+
+# Etapas que hacen peticiones remotas (comparten el control de tasa y concurrencia)
+NETWORK_STAGES = ('search', 'download', 'artwork')
+
+# Etapa desde la que se reintenta un fallo (una conversión fallida vuelve a descargar)
+RETRY_FROM = {'transcode': 'download'}
+
+_STOP = object()
+
+
+class SongJob:
+    """Estado de una canción mientras recorre las etapas del pipeline"""
+
+    def __init__(self, index: int, track_id: Optional[str], artist: str, song: str):
+        self.index = index
+        self.track_id = track_id
+        self.artist = artist
+        self.song = song
+        self.output_path = None
+        self.video_info = None
+        self.fallback = False
+        self.retries = 0
+        self.error_class = None
+        self.raw_path = None
+        self.transcode_future = None
+        self.artwork = None
+        self.success = False
+        self.message = ""
+        self.start_time = time.time()
+        self.elapsed = 0.0
+        self.queued_at = None
+
+    def finish(self, success: bool, message: str):
+        """Marca la canción como terminada"""
+        self.success = success
+        self.message = message
+        self.elapsed = time.time() - self.start_time
+
+    def to_result(self) -> Dict:
+        """Convierte el trabajo en el diccionario de resultado"""
+        return {
+            'index': self.index,
+            'track_id': self.track_id,
+            'artist': self.artist,
+            'song': self.song,
+            'success': self.success,
+            'message': self.message,
+            'fallback': self.fallback,
+            'retries': self.retries,
+            'elapsed': self.elapsed,
+        }
+
+
+class DownloadPipeline:
+    """
+    Ejecuta las etapas de YouTubeAudioDownloader.download_song en paralelo
+
+    Cada etapa tiene su propio grupo de workers y se comunica con la siguiente
+    mediante colas acotadas, así la red, FFmpeg y el disco trabajan a la vez.
+    """
+
+    STAGES = ('search', 'download', 'artwork', 'tag')
+
+    def __init__(self, downloader, workers: Optional[Dict[str, int]] = None,
+                 requests_per_second: float = 1.0, queue_size: int = 8,
+                 decouple_transcode: bool = True, transcode_workers: Optional[int] = None):
+        """
+        Inicializa el pipeline
+
+        Args:
+            downloader: Instancia de YouTubeAudioDownloader
+            workers: Workers por etapa (se combinan con DEFAULT_WORKERS)
+            requests_per_second: Tasa global máxima de peticiones a YouTube/iTunes; el
+                                 control adaptativo la reduce si el servidor frena
+                                 (0 = sin límite)
+            queue_size: Tamaño máximo de cada cola entre etapas
+            decouple_transcode: En modo MP3, convertir en un grupo de procesos aparte
+            transcode_workers: Procesos de conversión (por defecto, número de CPUs)
+        """
+        self.downloader = downloader
+        self.workers = dict(DEFAULT_WORKERS)
+
+        # La conversión a MP3 solo se separa cuando hay que recodificar
+        self.decouple_transcode = decouple_transcode and downloader.audio_format == 'mp3'
+        self.transcode_workers = transcode_workers or os.cpu_count() or 1
+        self.transcoder = None
+
+        if self.decouple_transcode:
+            self.stages = ('search', 'download', 'transcode', 'artwork', 'tag')
+            self.workers['transcode'] = self.transcode_workers
+        else:
+            self.stages = self.STAGES
+
+        if workers:
+            self.workers.update({k: max(1, int(v)) for k, v in workers.items() if k in self.workers})
+
+        # El control de tasa del descargador arranca en la tasa y concurrencia
+        # configuradas, que son también los máximos a los que vuelve tras frenar
+        network_workers = sum(self.workers[stage] for stage in NETWORK_STAGES)
+        self.controller = downloader.controller
+        self.controller.configure(
+            rate=requests_per_second, max_rate=requests_per_second,
+            min_rate=requests_per_second / 8,
+            concurrency=network_workers, max_concurrency=network_workers
+        )
+        self.requests_per_second = requests_per_second
+        self.queue_size = queue_size
+
+        self._handlers = {
+            'search': self._stage_search,
+            'download': self._stage_download,
+            'transcode': self._stage_transcode,
+            'artwork': self._stage_artwork,
+            'tag': self._stage_tag,
+        }
+        self._cancelled = threading.Event()
+        self._retries = None
+
+    def describe(self) -> str:
+        """Descripción corta de la configuración"""
+        workers = " | ".join(f"{stage}: {self.workers[stage]}" for stage in self.stages)
+        rate = f"hasta {self.requests_per_second} req/s" if self.requests_per_second else "sin límite de tasa"
+        return f"{workers} | {rate} (adaptativo)"
+
+    # ------------------------------------------------------------------
+    # Etapas
+    # ------------------------------------------------------------------
+
+    def _stage_search(self, job: SongJob) -> bool:
+        """Comprobaciones previas y búsqueda en YouTube"""
+        d = self.downloader
+
+        job.output_path, skip = d._prepare_song(job.artist, job.song, job.track_id)
+        if skip:
+            job.finish(*skip)
+            return False
+
+        query = d._build_query(job.artist, job.song)
+
+        # El índice global y los aciertos de caché no generan peticiones a YouTube
+        d._clear_error()
+        job.video_info = d._lookup_video(query, job.track_id)
+        if not job.video_info:
+            job.video_info = d._search_youtube(query, track_id=job.track_id, use_cache=False,
+                                               artist=job.artist, song=job.song)
+
+        if not job.video_info:
+            d._fail_search(job)
+            return False
+
+        return True
+
+    def _stage_download(self, job: SongJob) -> bool:
+        """Descarga del audio (y conversión si no está separada)"""
+        d = self.downloader
+
+        if self.decouple_transcode:
+            # Descargar el stream original y entregar la conversión a otro proceso
+            def download(video):
+                return d._download_raw(video, job.output_path)
+        else:
+            def download(video):
+                return d._download_audio(video, job.output_path)
+
+        # Si falla el video elegido se prueban las alternativas guardadas de la búsqueda
+        downloaded, result = d._download_with_fallback(
+            job.artist, job.song, job.track_id, job.video_info, download
+        )
+
+        if not downloaded:
+            d._fail_download(job)
+            return False
+
+        job.fallback = downloaded['id'] != job.video_info['id']
+        job.video_info = downloaded
+        if self.decouple_transcode:
+            job.raw_path = result
+            job.transcode_future = self.transcoder.submit(job.raw_path, job.output_path)
+
+        return True
+
+    def _stage_transcode(self, job: SongJob) -> bool:
+        """Espera a que termine la conversión a MP3 de la canción"""
+        d = self.downloader
+
+        try:
+            result = job.transcode_future.result()
+        except Exception as e:
+            result = {'ok': False, 'error': str(e)}
+        finally:
+            self._release_staging(job)
+
+        if result.get('seconds') is not None:
+            d._record_stage('transcode', result['seconds'])
+
+        if not result['ok']:
+            job.error_class = classify_error(result['error'])
+            job.finish(False, f"Error al convertir a MP3: {result['error']}")
+            return False
+
+        return True
+
+    def _release_staging(self, job: SongJob):
+        """Libera la carpeta de trabajo de una descarga sin convertir (si la tiene)"""
+        if job.raw_path is None:
+            return
+
+        if job.transcode_future is not None:
+            # No borrar el origen mientras FFmpeg lo está leyendo
+            try:
+                job.transcode_future.result()
+            except Exception:
+                pass
+
+        self.downloader.staging.release(job.raw_path.parent)
+        job.raw_path = None
+
+    def _stage_artwork(self, job: SongJob) -> bool:
+        """Búsqueda de la carátula en iTunes"""
+        job.artwork = self.downloader._get_album_art(job.artist, job.song)
+        return True
+
+    def _stage_tag(self, job: SongJob) -> bool:
+        """Escritura de metadatos en el archivo final"""
+        self.downloader._add_metadata(
+            job.output_path, job.artist, job.song,
+            artwork=job.artwork, fetch_artwork=False, track_id=job.track_id
+        )
+        self.downloader._record_download(
+            job.artist, job.song, job.track_id, job.output_path, job.video_info
+        )
+        self.downloader._journal_mark(job.artist, job.song, 'tagged')
+        job.finish(True, "Descargado exitosamente (alternativa)" if job.fallback else "Descargado exitosamente")
+        return False
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+
+    def _worker(self, stage: str, in_queue: queue.Queue, out_queue: Optional[queue.Queue],
+                results: queue.Queue):
+        """Bucle de un worker: toma trabajos de su cola y los pasa a la siguiente etapa"""
+        handler = self._handlers[stage]
+
+        while True:
+            job = in_queue.get()
+            if job is _STOP:
+                break
+
+            if self._cancelled.is_set():
+                self._release_staging(job)
+                job.finish(False, "Cancelado")
+                results.put(job)
+                continue
+
+            job_state = STAGE_JOB_STATES.get(stage)
+            if job_state:
+                self.downloader._journal_mark(job.artist, job.song, job_state)
+
+            tracer = self.downloader.tracer
+            with tracer.bind(f"{job.artist} - {job.song}"):
+                # Tiempo en la cola de la etapa: muestra qué etapa hace de cuello de botella
+                if job.queued_at is not None:
+                    tracer.record(f"queue_{stage}", time.perf_counter() - job.queued_at)
+
+                try:
+                    advance = handler(job)
+                except Exception as e:
+                    job.error_class = classify_error(e)
+                    job.finish(False, f"Error inesperado en etapa {stage}: {e}")
+                    advance = False
+
+            # Los fallos transitorios esperan en la cola diferida sin ocupar al worker
+            if not advance and not job.success:
+                delay = self.downloader._retry_delay(job)
+                if delay is not None:
+                    self._retries.put((RETRY_FROM.get(stage, stage), job), delay)
+                    continue
+
+            if advance and out_queue is not None:
+                job.queued_at = time.perf_counter()
+                out_queue.put(job)
+            else:
+                results.put(job)
+
+    def _dispatch_retries(self, queues: Dict[str, queue.Queue]):
+        """Devuelve cada reintento vencido a la cola de su etapa"""
+        while True:
+            item = self._retries.get()
+            if item is None:
+                break
+
+            stage, job = item
+            job.queued_at = time.perf_counter()
+            queues[stage].put(job)
+
+    def _feed(self, songs: Iterable[Tuple], first_queue: queue.Queue, results: queue.Queue):
+        """Introduce las canciones en la primera etapa"""
+        count = 0
+
+        for song_data in songs:
+            if self._cancelled.is_set():
+                break
+
+            if len(song_data) == 3:
+                track_id, artist, song = song_data
+            else:
+                track_id = None
+                artist, song = song_data
+
+            count += 1
+            job = SongJob(count, track_id, artist, song)
+            job.queued_at = time.perf_counter()
+            first_queue.put(job)
+
+        # Avisar al consumidor de cuántos resultados debe esperar
+        results.put(('__fed__', count))
+
+    def run(self, songs: Iterable[Tuple]) -> Iterator[Dict]:
+        """
+        Descarga las canciones y devuelve los resultados según terminan
+
+        Args:
+            songs: Tuplas (track_id, artista, canción) o (artista, canción)
+
+        Yields:
+            Diccionario con index, track_id, artist, song, success, message, fallback,
+            retries y elapsed
+        """
+        self._cancelled.clear()
+        started = time.time()
+        counters = self.downloader._run_counters()
+
+        if self.decouple_transcode:
+            self.transcoder = TranscodePool(max_workers=self.transcode_workers)
+            self.downloader.metrics.add_collector('transcode', self.transcoder.get_stats)
+
+        queues = {stage: queue.Queue(maxsize=self.queue_size) for stage in self.stages}
+        results = queue.Queue()
+        threads = []
+
+        self._retries = DelayedQueue()
+        dispatcher = threading.Thread(
+            target=self._dispatch_retries, args=(queues,), name="pipeline-retries", daemon=True
+        )
+        dispatcher.start()
+
+        for i, stage in enumerate(self.stages):
+            next_queue = queues[self.stages[i + 1]] if i + 1 < len(self.stages) else None
+            for n in range(self.workers[stage]):
+                t = threading.Thread(
+                    target=self._worker,
+                    args=(stage, queues[stage], next_queue, results),
+                    name=f"pipeline-{stage}-{n}",
+                    daemon=True
+                )
+                t.start()
+                threads.append(t)
+
+        feeder = threading.Thread(
+            target=self._feed, args=(songs, queues[self.stages[0]], results),
+            name="pipeline-feeder", daemon=True
+        )
+        feeder.start()
+
+        expected = None
+        received = 0
+
+        try:
+            while expected is None or received < expected:
+                item = results.get()
+
+                if isinstance(item, tuple) and item[0] == '__fed__':
+                    expected = item[1]
+                    continue
+
+                received += 1
+
+                # Las canciones canceladas siguen pendientes en el diario
+                if item.message != "Cancelado":
+                    self.downloader._finish_song(item)
+                yield item.to_result()
+        finally:
+            # Si el consumidor sale antes de tiempo, vaciar las etapas sin procesar
+            if expected is None or received < expected:
+                self._cancelled.set()
+
+            feeder.join()
+
+            # Los reintentos pendientes (solo si se canceló) quedan en el diario como "retrying"
+            self._retries.close()
+            dispatcher.join()
+
+            # Detener las etapas en orden para que cada una vacíe su cola antes
+            for stage in self.stages:
+                stage_threads = [t for t in threads if t.name.startswith(f"pipeline-{stage}-")]
+                for _ in stage_threads:
+                    queues[stage].put(_STOP)
+                for t in stage_threads:
+                    t.join()
+
+            # Las instancias de yt-dlp de los workers terminados ya no se usarán
+            self.downloader.ydl_pool.close()
+
+            if self.transcoder:
+                self.transcoder.shutdown()
+
+            self.downloader._record_run('pipeline', counters, time.time() - started)
+
+    def get_transcode_stats(self) -> Optional[Dict]:
+        """Cola y tiempos de conversión (None si la conversión no está separada)"""
+        if not self.transcoder:
+            return None
+        return self.transcoder.get_stats()
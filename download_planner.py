@@ -0,0 +1,311 @@
+"""
+Download Planner
+Plan de un lote sin descargar nada: qué canciones hay que procesar y cuánto ocupará y tardará
+"""
+
+import csv
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Clasificación de cada canción, en el orden en que se comprueba
+ON_DISK = 'on_disk'          # ya está en la biblioteca
+BLACKLISTED = 'blacklisted'  # bloqueada en la lista negra
+IN_HISTORY = 'in_history'    # descargada en otra ejecución pero el archivo ya no está
+CACHED = 'cached'            # búsqueda en caché: solo falta descargar
+SEARCH = 'search'            # hay que buscarla en YouTube y descargarla
+
+PLAN_CATEGORIES = (ON_DISK, BLACKLISTED, IN_HISTORY, CACHED, SEARCH)
+
+CATEGORY_LABELS = {
+    ON_DISK: "📁 Ya en disco",
+    BLACKLISTED: "⛔ En lista negra",
+    IN_HISTORY: "🕘 En historial (falta el archivo)",
+    CACHED: "💾 Búsqueda en caché",
+    SEARCH: "🔍 Hay que buscar",
+}
+
+# Duración supuesta cuando no se conoce la de Spotify ni la de la caché (segundos)
+DEFAULT_DURATION = 210
+
+# Bitrate nominal por formato, si la biblioteca aún no tiene archivos con los que medirlo
+NOMINAL_KBPS = {'mp3': 320, 'opus': 160, 'm4a': 128}
+
+# Archivos de la biblioteca necesarios para fiarse de su bitrate medio
+MIN_LIBRARY_SAMPLES = 5
+
+# Segundos por canción sin historial de ejecuciones (descarga completa y búsqueda)
+DEFAULT_SONG_SECONDS = {'sequential': 20.0, 'pipeline': 8.0}
+DEFAULT_SEARCH_SECONDS = 3.0
+
+# Ejecuciones recientes que se promedian para estimar el tiempo
+HISTORY_RUNS = 20
+
+
+def format_bytes(count: float) -> str:
+    """Tamaño legible (KB, MB, GB)"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if count < 1024 or unit == 'GB':
+            return f"{count:.0f} {unit}" if unit == 'B' else f"{count:.1f} {unit}"
+        count /= 1024
+
+
+def format_duration(seconds: float) -> str:
+    """Duración legible (h, min, s)"""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours} h {minutes} min"
+    if minutes:
+        return f"{minutes} min {seconds} s"
+    return f"{seconds} s"
+
+
+class DownloadPlan:
+    """
+    Resultado de planificar un lote
+
+    Guarda la clasificación de cada canción y calcula el total de bytes y el
+    tiempo estimado a partir del rendimiento (segundos por canción y por
+    búsqueda) que le pasa el planificador.
+    """
+
+    def __init__(self, mode: str, audio_format: str, throughput: Dict):
+        """
+        Args:
+            mode: "sequential" o "pipeline"
+            audio_format: Formato de salida
+            throughput: song_seconds, search_seconds, bytes_per_second y basis
+        """
+        self.mode = mode
+        self.audio_format = audio_format
+        self.throughput = throughput
+        self.items: List[Dict] = []
+        self.created_at = datetime.now()
+
+    def extend(self, other: 'DownloadPlan'):
+        """Añade las canciones de otro plan (p.ej. varias playlists)"""
+        self.items.extend(other.items)
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(PLAN_CATEGORIES, 0)
+        for item in self.items:
+            counts[item['category']] += 1
+        return counts
+
+    @property
+    def to_download(self) -> int:
+        """Canciones que se van a descargar"""
+        return sum(1 for item in self.items if item['download'])
+
+    @property
+    def to_search(self) -> int:
+        """Canciones que necesitan una búsqueda en YouTube"""
+        return sum(1 for item in self.items if item['search'])
+
+    @property
+    def bytes_total(self) -> int:
+        return sum(item['bytes'] for item in self.items if item['download'])
+
+    @property
+    def seconds_total(self) -> float:
+        """
+        Tiempo estimado del lote
+
+        En modo secuencial cada búsqueda evitada ahorra su tiempo; en el
+        pipeline las búsquedas se solapan con las descargas y el ritmo lo
+        marcan las canciones descargadas.
+        """
+        song_seconds = self.throughput['song_seconds']
+        if self.mode == 'pipeline':
+            return self.to_download * song_seconds
+
+        search_seconds = self.throughput['search_seconds']
+        download_seconds = max(0.0, song_seconds - search_seconds)
+        return self.to_download * download_seconds + self.to_search * search_seconds
+
+    def to_dict(self, include_items: bool = True) -> Dict:
+        """Plan serializable (resumen y, opcionalmente, cada canción)"""
+        data = {
+            'created_at': self.created_at.isoformat(),
+            'mode': self.mode,
+            'audio_format': self.audio_format,
+            'total': len(self.items),
+            'counts': self.counts,
+            'to_download': self.to_download,
+            'to_search': self.to_search,
+            'bytes_estimate': self.bytes_total,
+            'seconds_estimate': round(self.seconds_total, 1),
+            'throughput': self.throughput,
+        }
+        if include_items:
+            data['items'] = self.items
+        return data
+
+    def format_lines(self) -> List[str]:
+        """Resumen de texto del plan"""
+        lines = [f"🗂️  Plan de {len(self.items)} canciones ({self.mode}, {self.audio_format})"]
+        for category, count in self.counts.items():
+            if count:
+                lines.append(f"  {CATEGORY_LABELS[category]}: {count}")
+
+        finish = self.created_at + timedelta(seconds=self.seconds_total)
+        lines.append(f"  ⬇️  A descargar: {self.to_download} ({self.to_search} con búsqueda)")
+        lines.append(f"  💽 Tamaño estimado: {format_bytes(self.bytes_total)}")
+        lines.append(f"  ⏱️  Tiempo estimado: {format_duration(self.seconds_total)} "
+                     f"(terminaría hacia las {finish:%H:%M}; {self.throughput['basis']})")
+        return lines
+
+    def write(self, path: Path) -> Path:
+        """
+        Exporta el plan: CSV con una fila por canción si la extensión es .csv,
+        y si no JSON con el resumen y todas las canciones
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        if path.suffix.lower() == '.csv':
+            fields = ['category', 'track_id', 'artist', 'song', 'duration', 'bytes', 'search', 'download']
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(self.items)
+        else:
+            path.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2), encoding='utf-8')
+        return path
+
+
+class DownloadPlanner:
+    """
+    Clasifica las canciones de un lote sin tocar la red ni el disco por canción
+
+    Al crearse carga de una vez todo lo que consulta download_song: índice de
+    la biblioteca, lista negra, índice de track_ids, historial de playlists y
+    las claves de la caché de búsquedas. Después cada canción se resuelve con
+    búsquedas en diccionarios y conjuntos, así que un lote de 10.000
+    canciones se planifica en segundos.
+    """
+
+    def __init__(self, downloader, mode: str = 'sequential'):
+        """
+        Args:
+            downloader: YouTubeAudioDownloader con el que se va a descargar
+            mode: "sequential" o "pipeline" (cambia la estimación de tiempo)
+        """
+        self.downloader = downloader
+        self.mode = mode
+
+        downloader.library.ensure_loaded()
+        self.history_ids = {
+            track_id
+            for data in downloader.download_history.values()
+            for track_id in data.get('track_ids', [])
+        }
+        self.cache_index = downloader.search_cache.load_index() if downloader.search_cache else {}
+        self.bytes_per_second, self.mean_duration = self._audio_rates()
+        self.throughput = self._throughput()
+
+    def _audio_rates(self) -> Tuple[float, float]:
+        """Bytes por segundo de audio y duración media, medidos en la biblioteca si se puede"""
+        stats = self.downloader.library.audio_stats(self.downloader.output_ext)
+        if stats['files'] >= MIN_LIBRARY_SAMPLES and stats['seconds'] > 0:
+            return stats['bytes'] / stats['seconds'], stats['seconds'] / stats['files']
+        return NOMINAL_KBPS.get(self.downloader.audio_format, 192) * 1000 / 8, DEFAULT_DURATION
+
+    def _throughput(self) -> Dict:
+        """Segundos por canción descargada y por búsqueda según las últimas ejecuciones"""
+        runs = [
+            run for run in self.downloader.state.recent_runs(self.mode, HISTORY_RUNS)
+            if run['audio_format'] == self.downloader.audio_format
+        ]
+        downloaded = sum(run['downloaded'] for run in runs)
+        searches = sum(run['searches'] for run in runs)
+
+        if not downloaded:
+            return {
+                'song_seconds': DEFAULT_SONG_SECONDS.get(self.mode, DEFAULT_SONG_SECONDS['sequential']),
+                'search_seconds': DEFAULT_SEARCH_SECONDS,
+                'bytes_per_second': round(self.bytes_per_second),
+                'basis': "valores por defecto, sin ejecuciones anteriores",
+            }
+
+        return {
+            'song_seconds': sum(run['elapsed'] for run in runs) / downloaded,
+            'search_seconds': (sum(run['search_seconds'] for run in runs) / searches
+                               if searches else DEFAULT_SEARCH_SECONDS),
+            'bytes_per_second': round(self.bytes_per_second),
+            'basis': f"ritmo de las últimas {len(runs)} ejecuciones",
+        }
+
+    def _cached_duration(self, query: str, track_id: Optional[str]) -> Tuple[bool, Optional[float]]:
+        """(hay búsqueda en caché, duración del video elegido)"""
+        cache = self.downloader.search_cache
+        if not cache:
+            return False, None
+        for key in cache._keys(query, track_id):
+            if key in self.cache_index:
+                return True, self.cache_index[key]
+        return False, None
+
+    def classify(self, artist: str, song: str, track_id: Optional[str] = None) -> Dict:
+        """
+        Clasifica una canción con las mismas comprobaciones que download_song
+
+        Returns:
+            Diccionario con category, duration, bytes, search y download
+        """
+        d = self.downloader
+        output_path = d._get_output_path(artist, song)
+        cached, cached_duration = self._cached_duration(d._build_query(artist, song), track_id)
+        entry = d.track_index.get(track_id) if track_id else None
+        resolved = bool(entry and entry['video_id'])
+
+        if d._is_in_library(output_path, track_id):
+            category = ON_DISK
+        elif d.failures.is_blocked(artist, song, track_id):
+            category = BLACKLISTED
+        elif entry or (track_id and track_id in self.history_ids):
+            category = IN_HISTORY
+        elif cached:
+            category = CACHED
+        else:
+            category = SEARCH
+
+        download = category not in (ON_DISK, BLACKLISTED)
+        duration = d.track_durations.get(track_id) if track_id else None
+        duration = duration or cached_duration or self.mean_duration
+
+        return {
+            'category': category,
+            'track_id': track_id,
+            'artist': artist,
+            'song': song,
+            'duration': round(duration),
+            'bytes': round(duration * self.bytes_per_second) if download else 0,
+            # El índice de track_ids y la caché evitan la búsqueda (ver _lookup_video)
+            'search': download and not (resolved or cached),
+            'download': download,
+        }
+
+    def plan(self, songs: Iterable[Tuple]) -> DownloadPlan:
+        """
+        Planifica un lote
+
+        Args:
+            songs: Tuplas (track_id, artista, canción) o (artista, canción)
+
+        Returns:
+            Plan con la clasificación de cada canción y las estimaciones
+        """
+        plan = DownloadPlan(self.mode, self.downloader.audio_format, self.throughput)
+        for song_data in songs:
+            if len(song_data) == 3:
+                track_id, artist, song = song_data
+            else:
+                track_id = None
+                artist, song = song_data
+            plan.items.append(self.classify(artist, song, track_id))
+        return plan
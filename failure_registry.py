@@ -0,0 +1,241 @@
+"""
+Failure Registry
+Registro de canciones fallidas por track_id con bloqueo temporal
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from candidate_scoring import normalize_text
+from state_store import StateStore
+
+# Fallos permanentes seguidos antes de bloquear una canción
+BLOCK_THRESHOLD = 3
+
+# Días que una canción queda bloqueada (se duplica con cada fallo tras el bloqueo)
+BLOCK_COOLDOWN_DAYS = 7
+MAX_COOLDOWN_DAYS = 90
+
+
+class FailureRegistry:
+    """
+    Fallos por canción, identificados por track_id de Spotify
+
+    Si la canción no tiene track_id (listas de texto) se usa el par
+    artista/canción normalizado; así un cambio de nombre en Spotify no crea
+    un registro nuevo y "Artista - Canción" y "artista - cancion" son la
+    misma canción. Los registros se cargan una vez en memoria con índices
+    por track_id y por nombre (consultas O(1)) y cada cambio se escribe en
+    la tabla failures de StateStore.
+
+    Una canción bloqueada se vuelve a intentar sola cuando termina su
+    enfriamiento; si vuelve a fallar, el siguiente bloqueo dura el doble.
+    """
+
+    def __init__(self, state: StateStore, threshold: int = BLOCK_THRESHOLD,
+                 cooldown_days: float = BLOCK_COOLDOWN_DAYS, max_cooldown_days: float = MAX_COOLDOWN_DAYS):
+        """
+        Args:
+            state: Almacén de estado (tabla failures)
+            threshold: Fallos antes de bloquear la canción
+            cooldown_days: Duración del primer bloqueo (0 = bloqueo permanente)
+            max_cooldown_days: Duración máxima de un bloqueo
+        """
+        self.state = state
+        self.threshold = threshold
+        self.cooldown = timedelta(days=cooldown_days) if cooldown_days else None
+        self.max_cooldown = timedelta(days=max_cooldown_days)
+
+        self._lock = threading.RLock()
+        self._entries: Dict[str, Dict] = {}
+        self._by_track: Dict[str, str] = {}
+        self._by_name: Dict[str, str] = {}
+
+        for key, entry in state.load_failures().items():
+            self._index(key, entry)
+
+    @staticmethod
+    def name_key(artist: str, song: str) -> str:
+        """Clave por nombre: artista y canción normalizados"""
+        return f"{normalize_text(artist)} - {normalize_text(song)}"
+
+    def _index(self, key: str, entry: Dict):
+        self._entries[key] = entry
+        if entry.get('track_id'):
+            self._by_track[entry['track_id']] = key
+        self._by_name[self.name_key(entry.get('artist', ''), entry.get('song', ''))] = key
+
+    def _unindex(self, key: str) -> Optional[Dict]:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        if self._by_track.get(entry.get('track_id')) == key:
+            del self._by_track[entry['track_id']]
+        name = self.name_key(entry.get('artist', ''), entry.get('song', ''))
+        if self._by_name.get(name) == key:
+            del self._by_name[name]
+        return entry
+
+    def _find_key(self, artist: str, song: str, track_id: Optional[str]) -> Optional[str]:
+        if track_id and track_id in self._by_track:
+            return self._by_track[track_id]
+        key = self._by_name.get(self.name_key(artist, song))
+        # Mismo nombre pero otro track_id: es otra canción (p.ej. otra versión)
+        if key and track_id and self._entries[key].get('track_id') not in (None, track_id):
+            return None
+        return key
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, artist: str, song: str, track_id: Optional[str] = None) -> Optional[Dict]:
+        """Registro de fallos de una canción (copia) o None"""
+        with self._lock:
+            key = self._find_key(artist, song, track_id)
+            return dict(self._entries[key]) if key else None
+
+    def blocked_until(self, entry: Dict) -> Optional[datetime]:
+        """
+        Fin del bloqueo de un registro
+
+        Returns:
+            Fecha a partir de la cual se reintenta, datetime.max si el bloqueo
+            es permanente, o None si no está bloqueado
+        """
+        if not entry.get('blacklisted'):
+            return None
+        if self.cooldown is None or not entry.get('last_attempt'):
+            return datetime.max
+
+        extra = max(0, entry.get('attempts', 0) - self.threshold)
+        cooldown = min(self.max_cooldown, self.cooldown * 2 ** min(extra, 16))
+        return datetime.fromisoformat(entry['last_attempt']) + cooldown
+
+    def is_blocked(self, artist: str, song: str, track_id: Optional[str] = None) -> bool:
+        """True si la canción está bloqueada y su enfriamiento no ha terminado"""
+        with self._lock:
+            key = self._find_key(artist, song, track_id)
+            if key is None:
+                return False
+            until = self.blocked_until(self._entries[key])
+        return until is not None and datetime.now() < until
+
+    def entries(self) -> Dict[str, Dict]:
+        """Copia de todos los registros por clave"""
+        with self._lock:
+            return {key: dict(entry) for key, entry in self._entries.items()}
+
+    def split(self) -> Tuple[Dict[str, Dict], Dict[str, Dict], Dict[str, Dict]]:
+        """
+        Registros separados por estado
+
+        Returns:
+            Tupla (bloqueados, con enfriamiento vencido, con intentos pendientes)
+        """
+        blocked, expired, pending = {}, {}, {}
+        now = datetime.now()
+        for key, entry in self.entries().items():
+            until = self.blocked_until(entry)
+            if until is None:
+                pending[key] = entry
+            elif now < until:
+                blocked[key] = entry
+            else:
+                expired[key] = entry
+        return blocked, expired, pending
+
+    # ------------------------------------------------------------------
+    # Cambios
+    # ------------------------------------------------------------------
+
+    def record(self, artist: str, song: str, reason: str, track_id: Optional[str] = None) -> Dict:
+        """
+        Registra un fallo permanente de una canción
+
+        Args:
+            artist: Nombre del artista
+            song: Título de la canción
+            reason: Motivo del fallo
+            track_id: ID de Spotify (opcional)
+
+        Returns:
+            Registro actualizado (copia); 'blacklisted' indica si quedó bloqueada
+        """
+        now = datetime.now().isoformat()
+        with self._lock:
+            key = self._find_key(artist, song, track_id)
+            entry = self._unindex(key) if key else None
+            if entry is None:
+                key = f"track:{track_id}" if track_id else f"name:{self.name_key(artist, song)}"
+                entry = {'attempts': 0}
+
+            # Nombre y track_id más recientes (Spotify puede renombrar la canción)
+            entry.update(artist=artist, song=song, last_error=reason, last_attempt=now)
+            entry['attempts'] += 1
+            if track_id:
+                entry['track_id'] = track_id
+            if entry['attempts'] >= self.threshold:
+                entry['blacklisted'] = True
+
+            self._index(key, entry)
+            self.state.upsert_failure(key, entry)
+            return dict(entry)
+
+    def forget(self, artist: str, song: str, track_id: Optional[str] = None) -> bool:
+        """Elimina el registro de una canción (p.ej. tras descargarla bien)"""
+        with self._lock:
+            key = self._find_key(artist, song, track_id)
+            if key is None:
+                return False
+            self._unindex(key)
+            self.state.delete_failure(key)
+            return True
+
+    def remove(self, keys: Optional[Iterable[str]] = None) -> int:
+        """
+        Elimina registros en bloque
+
+        Args:
+            keys: Claves a eliminar (None = todos)
+
+        Returns:
+            Registros eliminados
+        """
+        with self._lock:
+            if keys is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._by_track.clear()
+                self._by_name.clear()
+                self.state.replace_failures({})
+                return removed
+
+            removed = [key for key in keys if self._unindex(key) is not None]
+            self.state.delete_failures(removed)
+            return len(removed)
+
+    def reset(self, keys: Optional[Iterable[str]] = None) -> int:
+        """
+        Pone a cero los intentos y desbloquea registros en bloque
+
+        Args:
+            keys: Claves a resetear (None = todos)
+
+        Returns:
+            Registros reseteados
+        """
+        with self._lock:
+            keys = list(self._entries) if keys is None else [k for k in keys if k in self._entries]
+            for key in keys:
+                entry = self._entries[key]
+                entry['attempts'] = 0
+                entry.pop('blacklisted', None)
+            self.state.upsert_failures({key: self._entries[key] for key in keys})
+            return len(keys)
+
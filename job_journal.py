@@ -0,0 +1,104 @@
+"""
+Job Journal
+Diario persistente de cada lote de descargas para poder reanudarlo
+"""
+
+import secrets
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from state_store import StateStore
+
+
+# Estados por los que pasa cada canción de un lote
+JOB_STATES = ('queued', 'searching', 'downloading', 'transcoding', 'retrying', 'tagged', 'done', 'failed')
+
+# Estados que no hay que repetir al reanudar ("tagged" ya tiene el archivo en la biblioteca)
+FINISHED_STATES = ('tagged', 'done', 'failed')
+
+# Estados de las canciones que quedaron en la biblioteca (descargadas o ya existentes)
+LIBRARY_STATES = ('tagged', 'done')
+
+
+class JobJournal:
+    """
+    Diario de un lote de descargas
+
+    Cada canción se registra al entrar en el lote y su estado se guarda en
+    cuanto termina cada etapa, así que si el proceso muere a mitad se sabe
+    exactamente qué canciones faltan. El lote queda como "running" hasta que
+    se cierra con finish().
+    """
+
+    def __init__(self, state: StateStore, batch_id: str):
+        """
+        Args:
+            state: Almacén de estado donde se guarda el diario
+            batch_id: Identificador del lote
+        """
+        self.state = state
+        self.batch_id = batch_id
+
+    @classmethod
+    def start(cls, state: StateStore, playlist_id: Optional[str] = None,
+              update_mode: bool = False) -> 'JobJournal':
+        """Crea el diario de un lote nuevo"""
+        batch_id = f"{datetime.now():%Y%m%d-%H%M%S}-{secrets.token_hex(3)}"
+        state.create_batch(batch_id, playlist_id, update_mode)
+        return cls(state, batch_id)
+
+    @classmethod
+    def resume(cls, state: StateStore, batch_id: str) -> Optional['JobJournal']:
+        """Abre el diario de un lote existente (None si no existe)"""
+        if state.get_batch(batch_id) is None:
+            return None
+        return cls(state, batch_id)
+
+    @staticmethod
+    def _key(artist: str, song: str) -> str:
+        return f"{artist} - {song}"
+
+    @property
+    def info(self) -> Dict:
+        """Datos del lote (playlist_id, update_mode, recuento por estado...)"""
+        return self.state.get_batch(self.batch_id)
+
+    def add(self, position: int, song_data: Tuple):
+        """Registra una canción del lote como "queued" """
+        self.add_many([song_data], start=position)
+
+    def add_many(self, songs: Iterable[Tuple], start: int = 1):
+        """Registra varias canciones en una sola transacción"""
+        jobs = []
+        for position, song_data in enumerate(songs, start):
+            if len(song_data) == 3:
+                track_id, artist, song = song_data
+            else:
+                track_id = None
+                artist, song = song_data
+            jobs.append((self._key(artist, song), position, track_id, artist, song))
+
+        self.state.add_batch_jobs(self.batch_id, jobs)
+
+    def mark(self, artist: str, song: str, state: str, message: Optional[str] = None):
+        """Guarda el nuevo estado de una canción"""
+        self.state.set_job_state(self.batch_id, self._key(artist, song), state, message)
+
+    def pending_songs(self) -> List[Tuple[str, str, str]]:
+        """Canciones que faltan por terminar, en el orden original"""
+        return [
+            (job['track_id'], job['artist'], job['song'])
+            for job in self.state.load_batch_jobs(self.batch_id)
+            if job['state'] not in FINISHED_STATES
+        ]
+
+    def finished_track_ids(self) -> List[str]:
+        """track_ids de las canciones del lote que quedaron en la biblioteca, en el orden original"""
+        return [
+            job['track_id'] for job in self.state.load_batch_jobs(self.batch_id)
+            if job['track_id'] and job['state'] in LIBRARY_STATES
+        ]
+
+    def finish(self, status: str = 'completed'):
+        """Cierra el lote ("completed" o "abandoned")"""
+        self.state.set_batch_status(self.batch_id, status)
@@ -0,0 +1,297 @@
+"""
+Library Index
+Índice persistente de la biblioteca de música en disco
+"""
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from mutagen import File as MutagenFile
+
+
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.opus', '.ogg')
+
+# Nombre de la etiqueta donde se guarda el ID de Spotify de cada archivo
+TRACK_ID_TAG = 'spotify_track_id'
+
+
+def read_track_tags(path: Path) -> Dict:
+    """
+    Lee duración y track_id de Spotify de un archivo de audio
+
+    Returns:
+        Diccionario con 'duration' y 'track_id' (pueden ser None)
+    """
+    info = {'duration': None, 'track_id': None}
+
+    try:
+        audio = MutagenFile(str(path))
+    except Exception:
+        return info
+
+    if audio is None:
+        return info
+
+    if getattr(audio, 'info', None) is not None:
+        info['duration'] = getattr(audio.info, 'length', None)
+
+    tags = audio.tags or {}
+    for key in (f'TXXX:{TRACK_ID_TAG}', f'----:com.apple.iTunes:{TRACK_ID_TAG}', TRACK_ID_TAG):
+        if key in tags:
+            value = tags[key]
+            value = value.text[0] if hasattr(value, 'text') else value[0]
+            info['track_id'] = value.decode() if isinstance(value, bytes) else str(value)
+            break
+
+    return info
+
+
+class LibraryIndex:
+    """
+    Manifiesto persistente de los archivos de la biblioteca
+
+    Guarda ruta, track_id, tamaño, mtime y duración de cada archivo. La
+    actualización recorre la carpeta con os.scandir y solo vuelve a listar
+    las carpetas de artista cuyo mtime cambió, así que en re-ejecuciones
+    apenas toca el disco. Las consultas de existencia y de track_id se
+    resuelven en memoria.
+    """
+
+    def __init__(self, root: Path, db_path: Path, read_tags: bool = True):
+        """
+        Inicializa el índice
+
+        Args:
+            root: Carpeta raíz de la biblioteca (output_dir)
+            db_path: Ruta del archivo SQLite del manifiesto
+            read_tags: Leer duración y track_id de los archivos nuevos al actualizar
+        """
+        self.root = Path(root)
+        self.read_tags = read_tags
+        self._lock = threading.RLock()
+        self._loaded = False
+
+        self._paths = set()
+        self._by_track: Dict[str, str] = {}
+
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS library_files (
+                path TEXT PRIMARY KEY,
+                directory TEXT NOT NULL,
+                track_id TEXT,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                duration REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_library_dir ON library_files(directory);
+            CREATE INDEX IF NOT EXISTS idx_library_track ON library_files(track_id);
+
+            CREATE TABLE IF NOT EXISTS library_dirs (
+                directory TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    def _relative(self, path: Path) -> str:
+        """Ruta relativa a la raíz en formato posix (clave del índice)"""
+        path = Path(path)
+        try:
+            return path.relative_to(self.root).as_posix()
+        except ValueError:
+            return path.as_posix()
+
+    # ------------------------------------------------------------------
+    # Actualización
+    # ------------------------------------------------------------------
+
+    def ensure_loaded(self):
+        """
+        Actualiza el índice la primera vez que se consulta
+
+        En el pipeline varios workers llegan aquí a la vez: solo el primero
+        recorre el disco y el resto espera a que termine.
+        """
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self.refresh()
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        Sincroniza el índice con el disco de forma incremental
+
+        Returns:
+            Estadísticas: carpetas revisadas, archivos nuevos y eliminados
+        """
+        stats = {'dirs_scanned': 0, 'dirs_skipped': 0, 'added': 0, 'removed': 0}
+
+        with self._lock:
+            known_dirs = dict(self._conn.execute("SELECT directory, mtime_ns FROM library_dirs"))
+            seen_dirs = set()
+
+            if self.root.exists():
+                with os.scandir(self.root) as entries:
+                    for entry in entries:
+                        if not entry.is_dir(follow_symlinks=False) or entry.name.startswith(('.', 'temp_download')):
+                            continue
+
+                        seen_dirs.add(entry.name)
+                        mtime_ns = entry.stat(follow_symlinks=False).st_mtime_ns
+
+                        if known_dirs.get(entry.name) == mtime_ns:
+                            stats['dirs_skipped'] += 1
+                            continue
+
+                        added, removed = self._scan_directory(entry.name, entry.path)
+                        stats['added'] += added
+                        stats['removed'] += removed
+                        stats['dirs_scanned'] += 1
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO library_dirs VALUES (?, ?)", (entry.name, mtime_ns)
+                        )
+
+            # Carpetas que ya no existen
+            for directory in set(known_dirs) - seen_dirs:
+                removed = self._conn.execute(
+                    "DELETE FROM library_files WHERE directory = ?", (directory,)
+                ).rowcount
+                self._conn.execute("DELETE FROM library_dirs WHERE directory = ?", (directory,))
+                stats['removed'] += removed
+
+            self._conn.commit()
+            self._load_memory()
+
+        return stats
+
+    def _scan_directory(self, directory: str, dir_path: str):
+        """Vuelve a listar una carpeta de artista y actualiza sus filas"""
+        known = {
+            row[0]: (row[1], row[2])
+            for row in self._conn.execute(
+                "SELECT path, size, mtime_ns FROM library_files WHERE directory = ?", (directory,)
+            )
+        }
+        present = set()
+        added = 0
+
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                if not entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                    continue
+
+                rel = f"{directory}/{entry.name}"
+                present.add(rel)
+                st = entry.stat(follow_symlinks=False)
+
+                if known.get(rel) == (st.st_size, st.st_mtime_ns):
+                    continue
+
+                tags = read_track_tags(Path(entry.path)) if self.read_tags else {}
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO library_files VALUES (?, ?, ?, ?, ?, ?)",
+                    (rel, directory, tags.get('track_id'), st.st_size, st.st_mtime_ns,
+                     tags.get('duration'))
+                )
+                if rel not in known:
+                    added += 1
+
+        missing = [(rel,) for rel in known if rel not in present]
+        self._conn.executemany("DELETE FROM library_files WHERE path = ?", missing)
+
+        return added, len(missing)
+
+    def _load_memory(self):
+        """
+        Carga en memoria las rutas y el mapa track_id → ruta
+
+        Se construyen aparte y se sustituyen de una vez: las consultas sin lock
+        nunca ven un índice a medio cargar.
+        """
+        paths = set()
+        by_track = {}
+
+        for path, track_id in self._conn.execute("SELECT path, track_id FROM library_files"):
+            paths.add(path)
+            if track_id:
+                by_track[track_id] = path
+
+        self._paths = paths
+        self._by_track = by_track
+        self._loaded = True
+
+    # ------------------------------------------------------------------
+    # Consultas y registro
+    # ------------------------------------------------------------------
+
+    def exists(self, path: Path) -> bool:
+        """Comprueba en memoria si un archivo está en la biblioteca"""
+        self.ensure_loaded()
+        return self._relative(path) in self._paths
+
+    def find_by_track_id(self, track_id: str) -> Optional[Path]:
+        """Devuelve el archivo asociado a un track_id de Spotify (o None)"""
+        if not track_id:
+            return None
+        self.ensure_loaded()
+        path = self._by_track.get(track_id)
+        return self.root / path if path else None
+
+    def add(self, path: Path, track_id: Optional[str] = None, duration: Optional[float] = None):
+        """
+        Registra un archivo recién descargado
+
+        Args:
+            path: Ruta del archivo
+            track_id: ID de Spotify (opcional)
+            duration: Duración en segundos (opcional)
+        """
+        path = Path(path)
+        rel = self._relative(path)
+
+        try:
+            st = path.stat()
+        except OSError:
+            return
+
+        with self._lock:
+            self.ensure_loaded()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO library_files VALUES (?, ?, ?, ?, ?, ?)",
+                (rel, rel.split('/')[0], track_id, st.st_size, st.st_mtime_ns, duration)
+            )
+            self._conn.commit()
+            self._paths.add(rel)
+            if track_id:
+                self._by_track[track_id] = rel
+
+    def audio_stats(self, extension: str) -> Dict[str, float]:
+        """
+        Tamaño y duración de los archivos con duración conocida de una extensión
+
+        Returns:
+            Diccionario con files, bytes y seconds
+        """
+        with self._lock:
+            files, size, seconds = self._conn.execute(
+                "SELECT COUNT(*), SUM(size), SUM(duration) FROM library_files "
+                "WHERE duration > 0 AND path LIKE ?", (f"%{extension}",)
+            ).fetchone()
+        return {'files': files, 'bytes': size or 0, 'seconds': seconds or 0.0}
+
+    def __len__(self) -> int:
+        self.ensure_loaded()
+        return len(self._paths)
+
+    def close(self):
+        """Cierra la base de datos del índice"""
+        with self._lock:
+            self._conn.close()
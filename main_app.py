@@ -4,26 +4,45 @@ Integra Spotify, descarga de YouTube y interfaz de usuario
 """
 
 import os
+import re
 import sys
-import time
+import threading
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from youtube_downloader import YouTubeAudioDownloader
+from download_planner import DownloadPlanner
+from tracing import PROFILE_MODES, RunProfiler, write_run_report
 from spotify_integration import SpotifyPlaylistExtractor, get_songs_from_spotify_playlist
-from download_manager import ConsoleUI, DownloadStats, create_main_menu, show_delay_config
+from download_manager import (ConsoleUI, DownloadStats, create_main_menu, show_delay_config,
+                              show_pipeline_config, show_format_config)
 
 
 class MusicDownloaderApp:
     """Aplicación principal de descarga de música"""
     
+    # Antigüedad máxima de los metadatos de playlists antes de refrescarlos
+    PLAYLIST_INFO_TTL = timedelta(minutes=5)
+    
+    # Lotes a partir de los cuales se muestra el plan y se pide confirmación
+    PLAN_MIN_SONGS = 100
+    
     def __init__(self):
         self.ui = ConsoleUI()
         self.output_dir = "music"
         self.delay_config = (1.5, 4.0, 20)  # (min_delay, max_delay, pause_every)
+        self.audio_format = "mp3"  # "mp3", "opus" o "m4a" (sin recodificar)
+        self.staging_dir = None  # Carpeta de trabajo (None = music/.staging)
+        self.profile_mode = None  # "cprofile" o "sample" para perfilar cada descarga
+        self.download_mode = "sequential"  # "sequential" o "pipeline"
+        self.pipeline_config = {'workers': None, 'requests_per_second': 1.0}
+        self.track_durations = {}  # Duración en Spotify por track_id (puntuación de búsquedas)
         
     def run(self):
         """Ejecuta la aplicación"""
+        self._offer_resume()
+        
         while True:
             choice = create_main_menu()
             
@@ -42,8 +61,10 @@ class MusicDownloaderApp:
             elif choice == 7:
                 self.configure_delays()
             elif choice == 8:
-                self.open_downloads_folder()
+                self.configure_download_mode()
             elif choice == 9:
+                self.open_downloads_folder()
+            elif choice == 10:
                 self.ui.print_info("¡Hasta luego! 👋")
                 sys.exit(0)
     
@@ -57,6 +78,44 @@ class MusicDownloaderApp:
             self.ui.print_success(f"Min: {config[0]}s | Max: {config[1]}s | Pausa cada: {config[2]}")
             input("\nPresiona Enter para continuar...")
     
+    def configure_download_mode(self):
+        """Configura el modo de descarga (secuencial o pipeline) y el formato de salida"""
+        config = show_pipeline_config(self.download_mode)
+        if config:
+            mode, workers, rate = config
+            self.download_mode = mode
+            if mode == "pipeline":
+                self.pipeline_config = {'workers': workers, 'requests_per_second': rate}
+            
+            audio_format = show_format_config(self.audio_format)
+            if audio_format:
+                self.audio_format = audio_format
+            
+            self.ui.clear()
+            self.ui.print_header("⚙️ CONFIGURACIÓN GUARDADA")
+            self.ui.print_success(f"Modo: {mode} | Formato: {self.audio_format}")
+            input("\nPresiona Enter para continuar...")
+    
+    def _create_downloader(self) -> YouTubeAudioDownloader:
+        """Crea un descargador con la configuración actual"""
+        downloader = YouTubeAudioDownloader(
+            output_dir=self.output_dir,
+            min_delay=self.delay_config[0],
+            max_delay=self.delay_config[1],
+            audio_format=self.audio_format,
+            staging_dir=self.staging_dir
+        )
+        # El preset de delays define los límites del control de tasa adaptativo
+        downloader.controller.apply_delay_preset(*self.delay_config)
+        downloader.track_durations = self.track_durations
+        return downloader
+    
+    def _create_extractor(self) -> SpotifyPlaylistExtractor:
+        """Conecta con Spotify compartiendo las duraciones leídas con los descargadores"""
+        extractor = SpotifyPlaylistExtractor()
+        extractor.track_durations = self.track_durations
+        return extractor
+    
     def download_manual_list(self):
         """Descarga canciones desde lista manual"""
         self.ui.clear()
@@ -98,7 +157,7 @@ class MusicDownloaderApp:
         try:
             # Conectar con Spotify
             self.ui.print_info("Conectando con Spotify...")
-            extractor = SpotifyPlaylistExtractor()
+            extractor = self._create_extractor()
             
             # Solicitar URL
             playlist_url = self.ui.input_text("URL de la playlist de Spotify")
@@ -125,9 +184,11 @@ class MusicDownloaderApp:
             if not self.ui.confirm(f"\n¿Descargar {info['total_tracks']} canciones?"):
                 return
             
-            # Obtener canciones
+            # Obtener canciones (reutiliza el listado guardado si la playlist no cambió)
             self.ui.print_info("Obteniendo lista de canciones...")
-            songs = extractor.get_all_tracks(playlist_url)
+            playlist_id = extractor._extract_playlist_id(playlist_url)
+            downloader_temp = self._create_downloader()
+            songs, _ = downloader_temp._get_playlist_tracks(extractor, playlist_id, info)
             
             if not songs:
                 self.ui.print_error("No se encontraron canciones")
@@ -137,13 +198,6 @@ class MusicDownloaderApp:
             self.ui.print_success(f"✅ {len(songs)} canciones obtenidas")
             
             # Verificar si ya se descargó antes
-            playlist_id = extractor._extract_playlist_id(playlist_url)
-            downloader_temp = YouTubeAudioDownloader(
-                output_dir=self.output_dir,
-                min_delay=self.delay_config[0],
-                max_delay=self.delay_config[1]
-            )
-            
             if playlist_id in downloader_temp.download_history:
                 self.ui.print_warning("⚠️  Esta playlist ya fue descargada antes")
                 print(f"\n{self.ui.CYAN}💡 Sugerencia:{self.ui.RESET} Usa la opción 4 'Actualizar playlists' para descargar solo canciones nuevas")
@@ -151,20 +205,7 @@ class MusicDownloaderApp:
                 if not self.ui.confirm("\n¿Continuar de todos modos y procesar toda la playlist?"):
                     return
             
-            # Advertencia si son muchas canciones
-            if len(songs) > 100:
-                self.ui.print_warning(f"Esta playlist tiene {len(songs)} canciones")
-                
-                min_d, max_d, pause = self.delay_config
-                estimated_time = (len(songs) * (min_d + max_d) / 2) / 60
-                
-                print(f"\n⏱️  Tiempo estimado: ~{estimated_time:.0f} minutos")
-                print(f"⚙️  Delays configurados: {min_d}-{max_d}s (pausa cada {pause})")
-                
-                if not self.ui.confirm("\n¿Continuar con la descarga?"):
-                    return
-            
-            # Descargar
+            # Descargar (con muchas canciones se muestra antes el plan)
             self._download_with_progress(songs)
             
         except Exception as e:
@@ -179,7 +220,7 @@ class MusicDownloaderApp:
         
         try:
             self.ui.print_info("Obteniendo tus playlists...")
-            extractor = SpotifyPlaylistExtractor()
+            extractor = self._create_extractor()
             playlists = extractor.get_user_playlists()
             
             if not playlists:
@@ -212,7 +253,8 @@ class MusicDownloaderApp:
                     if self.ui.confirm(f"\n¿Descargar esta playlist?"):
                         # Obtener canciones
                         self.ui.print_info("Obteniendo canciones...")
-                        songs_with_ids = extractor.get_all_tracks(playlist_id)
+                        downloader = self._create_downloader()
+                        songs_with_ids, _ = downloader._get_playlist_tracks(extractor, playlist_id, selected)
                         
                         if songs_with_ids:
                             self.ui.print_success(f"✅ {len(songs_with_ids)} canciones obtenidas")
@@ -234,11 +276,7 @@ class MusicDownloaderApp:
         self.ui.print_header("🔄 ACTUALIZAR PLAYLISTS")
         
         try:
-            downloader = YouTubeAudioDownloader(
-                output_dir=self.output_dir,
-                min_delay=self.delay_config[0],
-                max_delay=self.delay_config[1]
-            )
+            downloader = self._create_downloader()
             
             history = downloader.download_history
             
@@ -252,15 +290,18 @@ class MusicDownloaderApp:
             print(f"\n{self.ui.BOLD}📋 PLAYLISTS DESCARGADAS:{self.ui.RESET}\n")
             playlist_ids = list(history.keys())
             
-            extractor = SpotifyPlaylistExtractor()
+            extractor = self._create_extractor()
+            
+            # Se muestra desde la caché local; lo caducado se refresca en segundo plano
+            infos, refresher = self._load_playlist_infos(playlist_ids, extractor, downloader)
             
             valid_playlists = []
-            for i, playlist_id in enumerate(playlist_ids, 1):
-                info = extractor.get_playlist_info(playlist_id)
+            for playlist_id in playlist_ids:
+                info = infos.get(playlist_id)
                 if info:
                     valid_playlists.append((playlist_id, info))
                     last_update = history[playlist_id]['last_update'][:10]  # Solo fecha
-                    print(f"  {self.ui.CYAN}{i}.{self.ui.RESET} {info['name']}")
+                    print(f"  {self.ui.CYAN}{len(valid_playlists)}.{self.ui.RESET} {info['name']}")
                     print(f"     🎵 {info['total_tracks']} canciones | 📅 Última actualización: {last_update}")
             
             if not valid_playlists:
@@ -276,6 +317,15 @@ class MusicDownloaderApp:
             if choice.upper() == 'X':
                 return
             
+            # Usar los metadatos recién refrescados (snapshot_id actual) al sincronizar
+            if refresher:
+                refresher.join()
+                if refresher.error:
+                    self.ui.print_warning(f"No se pudieron refrescar las playlists ({refresher.error}); "
+                                          f"se usan los datos en caché")
+                infos.update(refresher.result)
+                valid_playlists = [(playlist_id, infos[playlist_id]) for playlist_id, _ in valid_playlists]
+            
             try:
                 choice_int = int(choice)
                 
@@ -283,13 +333,13 @@ class MusicDownloaderApp:
                     # Actualizar todas
                     for playlist_id, info in valid_playlists:
                         print(f"\n🔄 Actualizando: {info['name']}")
-                        self._update_single_playlist(playlist_id, extractor, downloader)
+                        self._update_single_playlist(playlist_id, extractor, downloader, info)
                 
                 elif 1 <= choice_int <= len(valid_playlists):
                     # Actualizar una
                     playlist_id, info = valid_playlists[choice_int - 1]
                     print(f"\n🔄 Actualizando: {info['name']}")
-                    self._update_single_playlist(playlist_id, extractor, downloader)
+                    self._update_single_playlist(playlist_id, extractor, downloader, info)
                 else:
                     self.ui.print_error("Opción inválida")
                     
@@ -301,10 +351,63 @@ class MusicDownloaderApp:
         
         input("\nPresiona Enter para continuar...")
     
-    def _update_single_playlist(self, playlist_id: str, extractor, downloader):
+    def _load_playlist_infos(self, playlist_ids: List[str], extractor,
+                             downloader) -> Tuple[Dict[str, dict], Optional[threading.Thread]]:
+        """
+        Obtiene los metadatos de las playlists usando la caché local
+        
+        Las playlists sin caché se piden en paralelo antes de volver; las que
+        tienen caché caducada se devuelven tal cual y se refrescan en un hilo.
+        El hilo no toca el diccionario devuelto: deja los datos nuevos en
+        su atributo result (y el fallo, si lo hay, en error) para mezclarlos
+        tras hacer join().
+        
+        Args:
+            playlist_ids: IDs de las playlists
+            extractor: Instancia de SpotifyPlaylistExtractor
+            downloader: Instancia del descargador (acceso al estado persistente)
+            
+        Returns:
+            Tupla (diccionario playlist_id → info, hilo de refresco o None)
+        """
+        cached = downloader.state.load_playlist_info(playlist_ids)
+        infos = {playlist_id: entry['info'] for playlist_id, entry in cached.items()}
+        
+        missing = [playlist_id for playlist_id in playlist_ids if playlist_id not in cached]
+        if missing:
+            fetched = extractor.get_playlists_info(missing)
+            downloader.state.save_playlist_info(fetched)
+            infos.update(fetched)
+        
+        now = datetime.now()
+        stale = [
+            playlist_id for playlist_id, entry in cached.items()
+            if now - datetime.fromisoformat(entry['fetched_at']) > self.PLAYLIST_INFO_TTL
+        ]
+        if not stale:
+            return infos, None
+        
+        def refresh():
+            try:
+                fetched = extractor.get_playlists_info(stale)
+                downloader.state.save_playlist_info(fetched)
+            except Exception as e:
+                refresher.error = e
+            else:
+                refresher.result = fetched
+        
+        refresher = threading.Thread(target=refresh, daemon=True)
+        refresher.result = {}
+        refresher.error = None
+        refresher.start()
+        return infos, refresher
+    
+    def _update_single_playlist(self, playlist_id: str, extractor, downloader, info: dict = None):
         """Actualiza una playlist individual"""
-        # Obtener canciones actuales de Spotify
-        current_tracks = extractor.get_all_tracks(playlist_id)
+        # Obtener canciones actuales (sin pedirlas a Spotify si el snapshot no cambió)
+        current_tracks, refetched = downloader._get_playlist_tracks(extractor, playlist_id, info)
+        if not refetched:
+            self.ui.print_info("📌 Sin cambios en Spotify desde la última sincronización (listado guardado)")
         
         if not current_tracks:
             self.ui.print_error("No se pudieron obtener las canciones de la playlist")
@@ -353,6 +456,9 @@ class MusicDownloaderApp:
         """
         new_tracks = []
         
+        # Sincronizar el índice con el disco (solo relee carpetas modificadas)
+        downloader.library.refresh()
+        
         for track_data in tracks:
             if len(track_data) == 3:
                 track_id, artist, song = track_data
@@ -360,14 +466,11 @@ class MusicDownloaderApp:
                 track_id = None
                 artist, song = track_data
             
-            # Construir path esperado
-            artist_normalized = downloader._normalize_artist(artist)
-            artist_dir = downloader.output_dir / artist_normalized
-            filename = downloader._sanitize_filename(f"{artist} - {song}.mp3")
-            file_path = artist_dir / filename
+            # Construir path esperado y consultar el índice de la biblioteca (en memoria)
+            file_path = downloader._get_output_path(artist, song)
             
             # Si NO existe, agregarlo a la lista de nuevas
-            if not file_path.exists():
+            if not downloader._is_in_library(file_path, track_id):
                 if len(track_data) == 3:
                     new_tracks.append((track_id, artist, song))
                 else:
@@ -375,197 +478,284 @@ class MusicDownloaderApp:
         
         return new_tracks
     
+    def download_multiple_playlists(self):
+        """Descarga varias playlists de Spotify sin esperar a tener el listado completo"""
+        self.ui.clear()
+        self.ui.print_header("📋 MÚLTIPLES PLAYLISTS")
+
+        playlist_urls = []
+
+        self.ui.print_info("Ingresa las URLs de las playlists una por una (deja vacío para terminar)\n")
+
+        while True:
+            url = self.ui.input_text(f"URL #{len(playlist_urls) + 1} (o Enter para terminar)")
+            if not url:
+                break
+            playlist_urls.append(url)
+
+        if not playlist_urls:
+            self.ui.print_warning("No se agregaron playlists")
+            input("\nPresiona Enter para continuar...")
+            return
+
+        if not self.ui.confirm(f"¿Descargar {len(playlist_urls)} playlists (sin duplicados)?"):
+            return
+
+        try:
+            self.ui.print_info("Conectando con Spotify...")
+            extractor = self._create_extractor()
+
+            # Las descargas empiezan con la primera página; el resto llega mientras tanto
+            self._download_with_progress(extractor.iter_multiple_playlists(playlist_urls))
+
+        except Exception as e:
+            self.ui.print_error(f"Error: {e}")
+
+        input("\nPresiona Enter para continuar...")
+
     def manage_blacklist(self):
         """Gestiona la lista negra de canciones"""
         self.ui.clear()
         self.ui.print_header("⛔ LISTA NEGRA")
         
         try:
-            downloader = YouTubeAudioDownloader(
-                output_dir=self.output_dir,
-                min_delay=self.delay_config[0],
-                max_delay=self.delay_config[1]
-            )
+            downloader = self._create_downloader()
+            failures = downloader.failures
             
-            blacklist = downloader.blacklist
-            
-            if not blacklist:
+            if not len(failures):
                 self.ui.print_info("La lista negra está vacía")
                 input("\nPresiona Enter para continuar...")
                 return
             
             # Separar por estado
-            blacklisted = {k: v for k, v in blacklist.items() if v.get('blacklisted', False)}
-            pending = {k: v for k, v in blacklist.items() if not v.get('blacklisted', False)}
+            blocked, expired, pending = failures.split()
             
             # Mostrar estadísticas
             print(f"\n{self.ui.BOLD}📊 ESTADÍSTICAS:{self.ui.RESET}")
-            print(f"  ⛔ En lista negra (3+ intentos): {len(blacklisted)}")
+            print(f"  ⛔ En lista negra (3+ intentos): {len(blocked)}")
+            print(f"  ⏳ Bloqueo cumplido (se reintentarán): {len(expired)}")
             print(f"  ⚠️  Con intentos fallidos (1-2): {len(pending)}")
             
             # Mostrar canciones en lista negra
-            if blacklisted:
+            blocked_keys = list(blocked)
+            if blocked:
                 print(f"\n{self.ui.BOLD}⛔ CANCIONES BLOQUEADAS:{self.ui.RESET}\n")
-                for i, (key, data) in enumerate(blacklisted.items(), 1):
+                for i, key in enumerate(blocked_keys, 1):
+                    data = blocked[key]
+                    until = failures.blocked_until(data)
+                    retry = "nunca" if until == datetime.max else f"{until:%d/%m/%Y}"
                     print(f"  {i}. {data['artist']} - {data['song']}")
-                    print(f"     Intentos: {data['attempts']} | Último error: {data['last_error']}")
+                    print(f"     Intentos: {data['attempts']} | Reintento: {retry} | Último error: {data['last_error']}")
             
             # Opciones
             print(f"\n{self.ui.BOLD}OPCIONES:{self.ui.RESET}")
             print(f"  {self.ui.CYAN}1.{self.ui.RESET} Limpiar lista negra completa")
             print(f"  {self.ui.CYAN}2.{self.ui.RESET} Resetear intentos (dar segunda oportunidad)")
-            print(f"  {self.ui.CYAN}3.{self.ui.RESET} Volver\n")
+            print(f"  {self.ui.CYAN}3.{self.ui.RESET} Desbloquear canciones concretas")
+            print(f"  {self.ui.CYAN}4.{self.ui.RESET} Borrar canciones con 1-2 intentos")
+            print(f"  {self.ui.CYAN}5.{self.ui.RESET} Volver\n")
             
             choice = input(f"{self.ui.BOLD}👉 Selecciona: {self.ui.RESET}")
             
             if choice == '1':
                 if self.ui.confirm("¿Limpiar TODA la lista negra?"):
-                    downloader.blacklist = {}
-                    downloader._save_blacklist()
+                    failures.remove()
                     self.ui.print_success("✅ Lista negra limpiada")
             
             elif choice == '2':
                 # Resetear intentos
-                for key in blacklist:
-                    downloader.blacklist[key]['attempts'] = 0
-                    downloader.blacklist[key]['blacklisted'] = False
-                downloader._save_blacklist()
+                failures.reset()
                 self.ui.print_success("✅ Intentos reseteados, las canciones se volverán a intentar")
-        
-        except Exception as e:
-            self.ui.print_error(f"Error: {e}")
-        
-        input("\nPresiona Enter para continuar...")
-        """Descarga múltiples playlists de Spotify"""
-        self.ui.clear()
-        self.ui.print_header("📋 DESCARGAS MÚLTIPLES")
-        
-        try:
-            extractor = SpotifyPlaylistExtractor()
-            
-            playlists = []
-            
-            self.ui.print_info("Ingresa las URLs de las playlists (deja vacío para terminar)\n")
             
-            while True:
-                url = self.ui.input_text(f"Playlist #{len(playlists) + 1} (o Enter para terminar)")
-                if not url:
-                    break
-                
-                # Validar playlist
-                info = extractor.get_playlist_info(url)
-                if info:
-                    playlists.append(url)
-                    self.ui.print_success(f"Agregada: {info['name']} ({info['total_tracks']} canciones)")
+            elif choice == '3':
+                if not blocked_keys:
+                    self.ui.print_info("No hay canciones bloqueadas")
                 else:
-                    self.ui.print_error("URL inválida, intenta de nuevo")
-            
-            if not playlists:
-                self.ui.print_warning("No se agregaron playlists")
-                input("\nPresiona Enter para continuar...")
-                return
-            
-            # Obtener todas las canciones
-            self.ui.print_info(f"\nObteniendo canciones de {len(playlists)} playlists...")
-            all_songs = extractor.get_multiple_playlists(playlists)
-            
-            self.ui.print_success(f"✅ {len(all_songs)} canciones únicas encontradas")
+                    numbers = input("Números separados por comas (ej: 1,3,5): ")
+                    positions = {int(n) for n in re.findall(r'\d+', numbers)}
+                    keys = [blocked_keys[p - 1] for p in sorted(positions) if 1 <= p <= len(blocked_keys)]
+                    count = failures.reset(keys)
+                    self.ui.print_success(f"✅ {count} canciones desbloqueadas")
             
-            if self.ui.confirm(f"\n¿Descargar {len(all_songs)} canciones?"):
-                self._download_with_progress(all_songs)
+            elif choice == '4':
+                count = failures.remove(pending)
+                self.ui.print_success(f"✅ {count} registros eliminados")
         
         except Exception as e:
             self.ui.print_error(f"Error: {e}")
         
         input("\nPresiona Enter para continuar...")
     
-    def _download_with_progress(self, songs: List[Tuple], playlist_id: str = None, update_mode: bool = False):
+    def _offer_resume(self):
+        """Ofrece reanudar el último lote que no llegó a terminar"""
+        downloader = self._create_downloader()
+        unfinished = downloader.state.unfinished_batches()
+        if not unfinished:
+            return
+        
+        batch = unfinished[0]
+        journal = downloader.begin_journal(batch_id=batch['batch_id'])
+        pending = journal.pending_songs()
+        downloader.journal = None
+        
+        if not pending:
+            downloader.state.set_batch_status(batch['batch_id'], 'completed')
+            return
+        
+        self.ui.clear()
+        self.ui.print_header("⏯️ LOTE INTERRUMPIDO")
+        done = sum(count for state, count in batch['jobs'].items() if state in ('tagged', 'done', 'failed'))
+        print(f"📅 Iniciado: {batch['created_at'][:16].replace('T', ' ')}")
+        print(f"✅ Terminadas: {done} | ⏳ Pendientes: {len(pending)}")
+        
+        if self.ui.confirm("\n¿Reanudar donde se quedó?"):
+            self._download_with_progress(pending, batch['playlist_id'], batch['update_mode'],
+                                         resume_batch=batch['batch_id'])
+            input("\nPresiona Enter para continuar...")
+        elif self.ui.confirm("¿Descartar el lote (no volver a preguntar)?"):
+            downloader.state.set_batch_status(batch['batch_id'], 'abandoned')
+    
+    def _download_with_progress(self, songs: Iterable[Tuple], playlist_id: str = None, update_mode: bool = False,
+                                resume_batch: str = None):
         """
         Descarga canciones con barra de progreso y estadísticas
         
         Args:
-            songs: Lista de tuplas (track_id, artista, canción)
+            songs: Lista de tuplas (track_id, artista, canción) o un generador que
+                   las produce según llegan (el total se va actualizando)
             playlist_id: ID de la playlist (para tracking)
             update_mode: Si es True, solo descarga canciones nuevas
+            resume_batch: ID de un lote interrumpido que se está reanudando
         """
         self.ui.clear()
         header = "🔄 ACTUALIZANDO PLAYLIST" if update_mode else "⬇️ DESCARGANDO MÚSICA"
         self.ui.print_header(header)
         
-        # Crear estadísticas
-        stats = DownloadStats(len(songs))
-        
         # Crear descargador
         min_delay, max_delay, pause_every = self.delay_config
-        downloader = YouTubeAudioDownloader(
-            output_dir=self.output_dir,
-            min_delay=min_delay,
-            max_delay=max_delay
-        )
+        downloader = self._create_downloader()
+        
+        # Con muchas canciones, mostrar antes qué hay que hacer y cuánto llevará
+        pipeline_mode = self.download_mode == "pipeline"
+        if isinstance(songs, list) and len(songs) > self.PLAN_MIN_SONGS:
+            plan = DownloadPlanner(downloader, self.download_mode).plan(songs)
+            for line in plan.format_lines():
+                print(line)
+            print()
+            
+            if not plan.to_download:
+                self.ui.print_success("✅ No hay nada que descargar")
+                return
+            if not self.ui.confirm("¿Continuar con la descarga?"):
+                return
+        
+        # Crear estadísticas
+        if isinstance(songs, list):
+            stats = DownloadStats(len(songs), concurrent=pipeline_mode)
+        else:
+            stats = DownloadStats(concurrent=pipeline_mode)
+            songs = stats.count_songs(songs)
         
         # Mostrar configuración
         print(f"{self.ui.BOLD}📊 CONFIGURACIÓN:{self.ui.RESET}")
         print(f"  📁 Carpeta: {self.output_dir}/")
-        print(f"  ⏱️  Delays: {min_delay}-{max_delay}s")
-        print(f"  ☕ Pausa cada: {pause_every} canciones")
+        print(f"  ⏱️  Delays: {min_delay}-{max_delay}s (acelera tras {pause_every} canciones sin errores)")
+        if not pipeline_mode:
+            print(f"  🚦 Control de tasa: {downloader.controller.describe()}")
+        print(f"  🎧 Formato: {self.audio_format}")
         if update_mode:
             print(f"  🔄 Modo: Actualización (solo canciones nuevas)")
         print()
         
-        # Extraer track_ids para el historial
-        track_ids = [song[0] if len(song) >= 3 else None for song in songs]
+        # Diario del lote: cada canción y etapa queda registrada por si el proceso se corta
+        journal = downloader.begin_journal(playlist_id, update_mode, batch_id=resume_batch)
+        songs = downloader._journal_songs(songs)
         
-        # Descargar con estadísticas en tiempo real
-        actual_downloads = 0  # Contador de descargas reales (no skips)
+        profiler = RunProfiler(self.profile_mode).start() if self.profile_mode else None
+        try:
+            if pipeline_mode:
+                self._run_pipeline(songs, downloader, stats)
+            else:
+                self._run_sequential(songs, downloader, stats)
+        finally:
+            if profiler:
+                profiler.stop()
+        
+        # Canciones que quedaron en la biblioteca (al reanudar, también las de antes del corte)
+        track_ids = journal.finished_track_ids()
+        downloader.end_journal()
+        
+        # Actualizar historial si es una playlist de Spotify (las fallidas se reintentan la próxima vez)
+        if playlist_id:
+            downloader._merge_download_history(playlist_id, track_ids)
+        
+        self._print_final_report(downloader, stats, profiler)
+    
+    def _run_pipeline(self, songs: Iterable[Tuple], downloader, stats: DownloadStats):
+        """Descarga las canciones con el pipeline de etapas concurrentes"""
+        from download_pipeline import DownloadPipeline
+        
+        pipeline = DownloadPipeline(
+            downloader,
+            workers=self.pipeline_config.get('workers'),
+            requests_per_second=self.pipeline_config.get('requests_per_second', 1.0)
+        )
+        print(f"  🚀 Pipeline: {pipeline.describe()}\n")
         
-        for i, song_data in enumerate(songs, 1):
-            # Parsear datos de la canción
-            if len(song_data) == 3:
-                track_id, artist, song = song_data
+        for completed, result in enumerate(pipeline.run(songs), 1):
+            skipped = (result['message'] == "Ya existe")
+            stats.finish_song(result['success'], skipped, elapsed=result['elapsed'])
+            
+            print(f"\n{self.ui.BOLD}[{result['index']}/{stats.get_total_label()}]{self.ui.RESET} {result['artist']} - {result['song']}")
+            if result['success']:
+                if skipped:
+                    self.ui.print_warning("Ya existe")
+                else:
+                    self.ui.print_success(result['message'])
             else:
-                track_id = None
-                artist, song = song_data
+                self.ui.print_error(result['message'])
             
-            # Actualizar estadísticas
+            if completed % 5 == 0 or (stats.total_known and completed == stats.total_songs):
+                stats.transcode_stats = pipeline.get_transcode_stats()
+                self.ui.print_stats(stats, downloader.get_download_speed())
+    
+    def _run_sequential(self, songs: Iterable[Tuple], downloader, stats: DownloadStats):
+        """
+        Descarga las canciones una tras otra al ritmo del control de tasa adaptativo
+        
+        Los fallos transitorios se reintentan más tarde, intercalados con las
+        siguientes canciones (ver YouTubeAudioDownloader.iter_sequential).
+        """
+        def announce(job):
+            # Actualizar estadísticas y mostrar progreso
             stats.start_song()
-            
-            # Mostrar progreso
-            print(f"\n{self.ui.BOLD}[{i}/{len(songs)}]{self.ui.RESET} {artist} - {song}")
-            
-            # Descargar
-            success, message = downloader.download_song(artist, song, track_id)
-            
+            retry = f" {self.ui.YELLOW}(reintento {job.retries}){self.ui.RESET}" if job.retries else ""
+            print(f"\n{self.ui.BOLD}[{job.index}/{stats.get_total_label()}]{self.ui.RESET} "
+                  f"{job.artist} - {job.song}{retry}")
+        
+        # Descargar con estadísticas en tiempo real
+        for i, job in enumerate(downloader.iter_sequential(songs, on_start=announce), 1):
             # Actualizar estadísticas
-            skipped = (message == "Ya existe")
-            stats.finish_song(success, skipped)
+            skipped = (job.message == "Ya existe")
+            stats.finish_song(job.success, skipped)
             
             # Mostrar resultado
-            if success:
+            if job.success:
                 if skipped:
                     self.ui.print_warning(f"Ya existe")
                 else:
-                    self.ui.print_success(message)
-                    actual_downloads += 1  # Solo contar descargas reales
+                    self.ui.print_success(job.message)
             else:
-                self.ui.print_error(message)
+                self.ui.print_error(job.message)
             
             # Mostrar estadísticas cada 5 canciones o al final
-            if i % 5 == 0 or i == len(songs):
+            if i % 5 == 0 or (stats.total_known and i == stats.total_songs):
                 download_speed = downloader.get_download_speed()
                 self.ui.print_stats(stats, download_speed)
-            
-            # Pausa larga SOLO después de descargas reales (no skips)
-            if actual_downloads > 0 and actual_downloads % pause_every == 0 and i < len(songs):
-                import random
-                pause_time = random.uniform(30, 60)
-                print(f"\n{self.ui.YELLOW}☕ Pausa de descanso: {pause_time:.1f}s (después de {actual_downloads} descargas reales){self.ui.RESET}")
-                time.sleep(pause_time)
-                actual_downloads = 0  # Resetear contador para la próxima pausa
-        
-        # Actualizar historial si es una playlist de Spotify
-        if playlist_id and track_ids:
-            downloader._update_download_history(playlist_id, [tid for tid in track_ids if tid])
-        
+    
+    def _print_final_report(self, downloader, stats: DownloadStats,
+                            profiler: Optional[RunProfiler] = None):
+        """Muestra el resumen final de la descarga"""
         # Resumen final
         self.ui.clear()
         self.ui.print_header("✨ DESCARGA COMPLETADA")
@@ -577,6 +767,9 @@ class MusicDownloaderApp:
         # Resultados
         if stats.downloaded > 0:
             self.ui.print_success(f"{stats.downloaded} canciones descargadas")
+        fallbacks = downloader.metrics.fallback_successes
+        if fallbacks > 0:
+            self.ui.print_info(f"{fallbacks} descargadas con un video alternativo (falló el elegido)")
         if stats.skipped > 0:
             self.ui.print_info(f"{stats.skipped} canciones ya existían")
         if stats.failed > 0:
@@ -590,9 +783,28 @@ class MusicDownloaderApp:
                 print(f"     💬 Motivo: {failed['reason']}")
             
             # Sugerencia
-            print(f"\n{self.ui.YELLOW}💡 Tip: Las canciones con 3+ intentos fallidos se agregan automáticamente")
-            print(f"   a la lista negra para no seguir intentando descargarlas.{self.ui.RESET}")
+            print(f"\n{self.ui.YELLOW}💡 Tip: Las canciones con 3+ fallos permanentes (video no disponible o no")
+            print(f"   encontrado) se agregan a la lista negra; los errores de red y bloqueos")
+            print(f"   temporales se reintentan y no cuentan.{self.ui.RESET}")
             print(f"\n{self.ui.CYAN}   Puedes gestionar la lista negra desde el menú principal (opción 6){self.ui.RESET}")
+        
+        cache_lines = downloader.get_cache_summary_lines()
+        if cache_lines:
+            print()
+            for line in cache_lines:
+                print(line)
+        
+        # Dónde se fue el tiempo: etapas por total y p95 (y perfil si se pidió)
+        summary_lines = downloader.tracer.format_summary()
+        if summary_lines:
+            print(f"\n{self.ui.BOLD}⏱️  TIEMPO POR ETAPA:{self.ui.RESET}\n")
+            for line in summary_lines:
+                print(f"  {line}")
+            
+            paths = write_run_report(downloader.tracer, downloader.data_dir / "traces", profiler)
+            print(f"\n{self.ui.CYAN}📄 Informe: {paths['summary']} | Traza: {paths['trace']}{self.ui.RESET}")
+            if 'profile' in paths:
+                print(f"{self.ui.CYAN}🔬 Perfil ({profiler.mode}): {paths['profile']}{self.ui.RESET}")
     
     def open_downloads_folder(self):
         """Abre la carpeta de descargas"""
@@ -621,8 +833,16 @@ class MusicDownloaderApp:
 
 def main():
     """Punto de entrada de la aplicación"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="YouTube Music Downloader")
+    parser.add_argument('--profile', choices=PROFILE_MODES,
+                        help="Perfilar cada descarga (cprofile: hilo principal; sample: todos los hilos)")
+    args = parser.parse_args()
+    
     try:
         app = MusicDownloaderApp()
+        app.profile_mode = args.profile
         app.run()
     except KeyboardInterrupt:
         print("\n\n👋 Aplicación cerrada por el usuario")
@@ -0,0 +1,397 @@
+"""
+Metrics
+Métricas agregadas de una ejecución y exportación para Prometheus o JSON
+"""
+
+import http.server
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# Límites (segundos) de los histogramas de latencia por etapa
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Ventana para la velocidad de descarga actual (segundos)
+THROUGHPUT_WINDOW = 30.0
+
+# Etiqueta de los fallos sin clase de error (omitidas por la lista negra, canceladas)
+SKIPPED_CLASS = 'skipped'
+
+
+def _format_value(value: float) -> str:
+    """Número en el formato de Prometheus (enteros sin notación científica)"""
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Histogram:
+    """Histograma acumulativo al estilo Prometheus"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, limit in enumerate(self.buckets):
+            if value <= limit:
+                self.counts[i] += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Cuantil aproximado (límite superior del bucket que lo contiene; None si supera el último)"""
+        if not self.count:
+            return None
+        target = q * self.count
+        for limit, count in zip(self.buckets, self.counts):
+            if count >= target:
+                return limit
+        return None
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'avg': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip((str(b) for b in self.buckets), self.counts)),
+        }
+
+
+class Metrics:
+    """
+    Contadores, velocidad y latencias de toda la ejecución (seguro entre hilos)
+
+    Las métricas propias se actualizan al vuelo; las de otros componentes
+    (cachés, control de tasa, conversión) se leen al exportar mediante
+    colectores registrados con add_collector.
+    """
+
+    def __init__(self, window: float = THROUGHPUT_WINDOW):
+        """
+        Args:
+            window: Segundos de la ventana para la velocidad actual
+        """
+        self.window = window
+        self.start_time = time.time()
+
+        self._lock = threading.Lock()
+        self._bytes_total = 0
+        self._recent = deque()  # (monotonic, bytes)
+        self._stages: Dict[str, Histogram] = {}
+        self._songs = {'downloaded': 0, 'skipped': 0, 'failed': 0}
+        self._fallback_successes = 0
+        self._retries: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self._file_progress: Dict[str, int] = {}
+        self._collectors: Dict[str, Callable[[], Optional[Dict]]] = {}
+
+    # ------------------------------------------------------------------
+    # Registro
+    # ------------------------------------------------------------------
+
+    def add_bytes(self, count: int):
+        """Suma bytes descargados al total y a la ventana"""
+        if count <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._bytes_total += count
+            self._recent.append((now, count))
+            self._trim(now)
+
+    def progress(self, key: str, downloaded_bytes: int, finished: bool = False):
+        """
+        Registra el progreso de un archivo a partir de su contador acumulado
+
+        yt-dlp informa de los bytes descargados del archivo actual, no de la
+        diferencia; aquí se convierte en incrementos para el total global.
+
+        Args:
+            key: Identificador del archivo (nombre o hilo)
+            downloaded_bytes: Bytes descargados del archivo hasta ahora
+            finished: El archivo terminó (se olvida su contador)
+        """
+        with self._lock:
+            previous = self._file_progress.get(key, 0)
+            # Un contador menor indica que el mismo hilo empezó otro archivo
+            delta = downloaded_bytes - previous if downloaded_bytes >= previous else downloaded_bytes
+            if finished:
+                self._file_progress.pop(key, None)
+            else:
+                self._file_progress[key] = downloaded_bytes
+        self.add_bytes(delta)
+
+    def observe_stage(self, stage: str, seconds: float):
+        """Añade una latencia al histograma de una etapa"""
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def record_song(self, success: bool, message: str, elapsed: Optional[float] = None,
+                    fallback: bool = False, error_class: Optional[str] = None):
+        """
+        Registra el resultado de una canción
+
+        Args:
+            success: Si terminó bien
+            message: Mensaje del resultado ("Ya existe", motivo del fallo...)
+            elapsed: Duración total de la canción (solo para las descargadas)
+            fallback: Si se descargó un candidato distinto del elegido en la búsqueda
+            error_class: Clase del fallo (ver retry_engine.classify_error)
+        """
+        with self._lock:
+            if success and message == "Ya existe":
+                self._songs['skipped'] += 1
+            elif success:
+                self._songs['downloaded'] += 1
+                if fallback:
+                    self._fallback_successes += 1
+            else:
+                self._songs['failed'] += 1
+                error_class = error_class or SKIPPED_CLASS
+                self._errors[error_class] = self._errors.get(error_class, 0) + 1
+
+        if success and message != "Ya existe" and elapsed is not None:
+            self.observe_stage('song', elapsed)
+
+    def record_retry(self, error_class: str):
+        """Registra un reintento programado por un fallo de la clase indicada"""
+        with self._lock:
+            self._retries[error_class] = self._retries.get(error_class, 0) + 1
+
+    def add_collector(self, name: str, collector: Callable[[], Optional[Dict]]):
+        """
+        Registra una fuente de métricas externa
+
+        Args:
+            name: Prefijo de las métricas (p.ej. "search_cache")
+            collector: Función que devuelve un diccionario de valores numéricos
+        """
+        with self._lock:
+            self._collectors[name] = collector
+
+    def _trim(self, now: float):
+        while self._recent and now - self._recent[0][0] > self.window:
+            self._recent.popleft()
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    @property
+    def fallback_successes(self) -> int:
+        """Canciones descargadas con un candidato alternativo"""
+        with self._lock:
+            return self._fallback_successes
+
+    @property
+    def bytes_total(self) -> int:
+        with self._lock:
+            return self._bytes_total
+
+    def bytes_per_second(self) -> float:
+        """Velocidad media de la ventana reciente"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if not self._recent:
+                return 0.0
+            elapsed = min(self.window, time.time() - self.start_time)
+            return sum(count for _, count in self._recent) / max(elapsed, 1.0)
+
+    def to_dict(self) -> Dict:
+        """Instantánea serializable de todas las métricas"""
+        with self._lock:
+            stages = {stage: h.to_dict() for stage, h in self._stages.items()}
+            songs = dict(self._songs)
+            fallback_successes = self._fallback_successes
+            retries = dict(self._retries)
+            errors = dict(self._errors)
+            collectors = dict(self._collectors)
+            bytes_total = self._bytes_total
+
+        elapsed = time.time() - self.start_time
+        snapshot = {
+            'timestamp': time.time(),
+            'uptime_seconds': elapsed,
+            'bytes_total': bytes_total,
+            'bytes_per_second': self.bytes_per_second(),
+            'bytes_per_second_avg': bytes_total / elapsed if elapsed > 0 else 0.0,
+            'songs': songs,
+            'fallback_successes': fallback_successes,
+            'retries': retries,
+            'errors': errors,
+            'stages': stages,
+        }
+
+        for name, collector in collectors.items():
+            try:
+                values = collector()
+            except Exception:
+                values = None
+            if values:
+                snapshot[name] = {k: v for k, v in values.items() if isinstance(v, (int, float))}
+
+        return snapshot
+
+    def render_prometheus(self) -> str:
+        """Métricas en el formato de texto de Prometheus"""
+        data = self.to_dict()
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples):
+            lines.append(f"# HELP ymd_{name} {help_text}")
+            lines.append(f"# TYPE ymd_{name} {kind}")
+            for labels, value in samples:
+                label_text = "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}" if labels else ""
+                lines.append(f"ymd_{name}{label_text} {_format_value(value)}")
+
+        metric('uptime_seconds', 'gauge', "Segundos desde el inicio", [({}, data['uptime_seconds'])])
+        metric('bytes_downloaded_total', 'counter', "Bytes descargados", [({}, data['bytes_total'])])
+        metric('download_bytes_per_second', 'gauge', f"Velocidad en los últimos {self.window:g}s",
+               [({}, data['bytes_per_second'])])
+        metric('songs_total', 'counter', "Canciones procesadas por resultado",
+               [({'outcome': k}, v) for k, v in data['songs'].items()])
+        metric('fallback_successes_total', 'counter', "Canciones descargadas con un candidato alternativo",
+               [({}, data['fallback_successes'])])
+        metric('retries_total', 'counter', "Reintentos programados por clase de error",
+               [({'class': k}, v) for k, v in sorted(data['retries'].items())])
+        metric('errors_total', 'counter', "Canciones fallidas por clase de error",
+               [({'class': k}, v) for k, v in sorted(data['errors'].items())])
+
+        lines.append("# HELP ymd_stage_seconds Latencia por etapa")
+        lines.append("# TYPE ymd_stage_seconds histogram")
+        for stage, h in sorted(data['stages'].items()):
+            for limit, count in h['buckets'].items():
+                lines.append(f'ymd_stage_seconds_bucket{{stage="{stage}",le="{limit}"}} {count}')
+            lines.append(f'ymd_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h["count"]}')
+            lines.append(f'ymd_stage_seconds_sum{{stage="{stage}"}} {_format_value(h["sum"])}')
+            lines.append(f'ymd_stage_seconds_count{{stage="{stage}"}} {h["count"]}')
+
+        for name in sorted(set(data) - {'timestamp', 'uptime_seconds', 'bytes_total', 'bytes_per_second',
+                                         'bytes_per_second_avg', 'songs', 'fallback_successes',
+                                         'retries', 'errors', 'stages'}):
+            for key, value in sorted(data[name].items()):
+                lines.append(f"ymd_{name}_{key} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path: Path, text: str):
+    """Escribe un archivo entero de una vez (los lectores nunca ven uno a medias)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(f".{path.name}.tmp")
+    temp.write_text(text, encoding='utf-8')
+    os.replace(temp, path)
+
+
+class MetricsExporter:
+    """
+    Publica las métricas durante ejecuciones largas
+
+    - textfile: archivo .prom para el textfile collector de node_exporter
+    - json_file: la misma instantánea en JSON
+    - port: servidor HTTP local con /metrics (Prometheus) y /metrics.json
+
+    Los archivos se reescriben cada `interval` segundos y una última vez al
+    detener el exportador.
+    """
+
+    def __init__(self, metrics: Metrics, textfile: Optional[str] = None,
+                 json_file: Optional[str] = None, port: Optional[int] = None,
+                 host: str = "127.0.0.1", interval: float = 15.0):
+        self.metrics = metrics
+        self.textfile = Path(textfile) if textfile else None
+        self.json_file = Path(json_file) if json_file else None
+        self.port = port
+        self.host = host
+        self.interval = interval
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.textfile or self.json_file or self.port is not None)
+
+    def write_files(self):
+        """Escribe los archivos de métricas configurados"""
+        if self.textfile:
+            _write_atomic(self.textfile, self.metrics.render_prometheus())
+        if self.json_file:
+            _write_atomic(self.json_file, json.dumps(self.metrics.to_dict(), indent=2))
+
+    def start(self) -> 'MetricsExporter':
+        """Arranca la escritura periódica y el servidor HTTP (si se configuraron)"""
+        if self.port is not None:
+            self._server = http.server.ThreadingHTTPServer((self.host, self.port), self._handler())
+            self.port = self._server.server_address[1]
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+        if self.textfile or self.json_file:
+            self._thread = threading.Thread(target=self._loop, name="metrics-writer", daemon=True)
+            self._thread.start()
+
+        return self
+
+    def stop(self):
+        """Detiene el exportador dejando escrita la última instantánea"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.write_files()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write_files()
+            except OSError:
+                pass
+
+    def _handler(self):
+        metrics = self.metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') == '/metrics':
+                    body = metrics.render_prometheus().encode()
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif self.path.rstrip('/') == '/metrics.json':
+                    body = json.dumps(metrics.to_dict()).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,381 @@
+"""
+Rate Controller
+Control adaptativo de tasa y concurrencia según la respuesta de los servidores
+"""
+
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+# Peticiones remotas por canción (búsqueda + descarga; la carátula suele estar en caché)
+REQUESTS_PER_SONG = 2
+
+# Mensajes de yt-dlp/requests que indican que el servidor nos está frenando. Solo señales
+# explícitas: un 429 suelto puede ser parte de un título o un ID, y un timeout es un
+# fallo de red, no un bloqueo
+THROTTLE_PATTERN = re.compile(
+    r"HTTP Error (429|403)|Too Many Requests|Sign in to confirm you.re not a bot",
+    re.IGNORECASE
+)
+
+
+def is_throttle_error(message: str) -> bool:
+    """Indica si un mensaje de error es una señal de bloqueo (HTTP 429/403, anti-bot)"""
+    return bool(message) and THROTTLE_PATTERN.search(message) is not None
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Segundos de una cabecera Retry-After numérica (None si no hay o es una fecha)"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveController:
+    """
+    Token bucket + concurrencia AIMD compartidos por todas las peticiones remotas
+
+    - Tasa: cada petición consume un token; los tokens se reponen a `rate`
+      por segundo hasta `burst`.
+    - Concurrencia: como mucho `concurrency` peticiones a la vez.
+    - Ante un 429/403 o un Retry-After, la tasa y la concurrencia
+      se reducen a la mitad y todas las peticiones esperan un enfriamiento
+      (Retry-After si lo hay; si no, `cooldown` con backoff exponencial).
+    - Cada `increase_after` peticiones con una tasa de errores baja, la tasa
+      sube un paso y la concurrencia una unidad, sin pasar de los máximos.
+
+    Sustituye a los delays fijos: si todo va bien no se espera de más, y si el
+    servidor empieza a frenar se reduce el ritmo de inmediato.
+    """
+
+    def __init__(self, rate: float = 1.0, min_rate: Optional[float] = None,
+                 max_rate: Optional[float] = None, burst: float = 1.0,
+                 concurrency: int = 1, max_concurrency: int = 1,
+                 increase_after: int = 20, cooldown: Tuple[float, float] = (30.0, 60.0),
+                 error_threshold: float = 0.05):
+        """
+        Inicializa el controlador
+
+        Args:
+            rate: Peticiones por segundo iniciales (0 = sin límite de tasa)
+            min_rate: Tasa mínima al reducir (por defecto, rate / 8)
+            max_rate: Tasa máxima al aumentar (por defecto, rate)
+            burst: Tokens acumulables (ráfaga máxima)
+            concurrency: Peticiones simultáneas iniciales
+            max_concurrency: Peticiones simultáneas máximas
+            increase_after: Peticiones por ventana antes de intentar aumentar
+            cooldown: Espera (mín, máx) tras un bloqueo sin Retry-After (segundos)
+            error_threshold: Tasa de errores máxima de una ventana para aumentar
+        """
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+        self.burst = max(1.0, burst)
+        self.increase_after = max(1, increase_after)
+        self.cooldown = cooldown
+        self.error_threshold = error_threshold
+        self._set_rate_limits(rate, min_rate, max_rate)
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = min(max(1, concurrency), self.max_concurrency)
+
+        # Función opcional que recibe los segundos esperados en cada petición (trazas)
+        self.wait_observer = None
+
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._active = 0
+        self._blocked_until = 0.0
+        self._backoff_level = 0
+        self._window_total = 0
+        self._window_errors = 0
+
+        self.stats = {
+            'requests': 0,
+            'errors': 0,
+            'throttles': 0,
+            'increases': 0,
+            'decreases': 0,
+            'cooldown_seconds': 0.0,
+        }
+
+    @classmethod
+    def from_delays(cls, min_delay: float, max_delay: float, pause_every: int = 10,
+                    long_pause: Tuple[float, float] = (30.0, 60.0)) -> 'AdaptiveController':
+        """
+        Crea un controlador a partir de un preset de delays (min, max, pausa cada)
+
+        Ver apply_delay_preset para la correspondencia.
+        """
+        controller = cls()
+        controller.apply_delay_preset(min_delay, max_delay, pause_every, long_pause)
+        return controller
+
+    def apply_delay_preset(self, min_delay: float, max_delay: float, pause_every: int = 10,
+                           long_pause: Optional[Tuple[float, float]] = None):
+        """
+        Traduce un preset de delays a los límites del controlador
+
+        - El delay medio marca la tasa inicial, min_delay la máxima y el doble
+          de max_delay la mínima (en canciones, ~REQUESTS_PER_SONG peticiones).
+        - pause_every (canciones) es la ventana para decidir si se puede acelerar.
+        - long_pause es el enfriamiento tras un bloqueo, en lugar de una pausa fija.
+
+        Un preset con delays a 0 desactiva el límite de tasa.
+        """
+        if max_delay <= 0:
+            rate = min_rate = max_rate = 0.0
+        else:
+            mean_delay = (min_delay + max_delay) / 2
+            rate = REQUESTS_PER_SONG / mean_delay
+            max_rate = REQUESTS_PER_SONG / min_delay if min_delay > 0 else rate * 2
+            min_rate = REQUESTS_PER_SONG / (max_delay * 2)
+
+        self.configure(rate=rate, min_rate=min_rate, max_rate=max_rate,
+                       burst=REQUESTS_PER_SONG,
+                       increase_after=max(1, pause_every) * REQUESTS_PER_SONG,
+                       cooldown=long_pause)
+
+    def configure(self, rate: Optional[float] = None, min_rate: Optional[float] = None,
+                  max_rate: Optional[float] = None, burst: Optional[float] = None,
+                  concurrency: Optional[int] = None, max_concurrency: Optional[int] = None,
+                  increase_after: Optional[int] = None,
+                  cooldown: Optional[Tuple[float, float]] = None):
+        """Cambia los límites (los parámetros None se mantienen)"""
+        with self._cond:
+            if rate is not None:
+                self._set_rate_limits(rate, min_rate, max_rate)
+            if burst is not None:
+                self.burst = max(1.0, burst)
+                self._tokens = min(self._tokens, self.burst)
+            if max_concurrency is not None:
+                self.max_concurrency = max(1, max_concurrency)
+            if concurrency is not None:
+                self.concurrency = max(1, concurrency)
+            self.concurrency = min(self.concurrency, self.max_concurrency)
+            if increase_after is not None:
+                self.increase_after = max(1, increase_after)
+            if cooldown is not None:
+                self.cooldown = cooldown
+            self._cond.notify_all()
+
+    def _set_rate_limits(self, rate: float, min_rate: Optional[float], max_rate: Optional[float]):
+        self.rate = max(0.0, rate)
+        self.max_rate = max(self.rate, max_rate) if max_rate is not None else self.rate
+        self.min_rate = min(self.rate, min_rate) if min_rate is not None else self.rate / 8
+
+    # ------------------------------------------------------------------
+    # Espera antes de cada petición
+    # ------------------------------------------------------------------
+
+    def _refill(self, now: float):
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """Espera al enfriamiento (si lo hay) y a un token de la tasa"""
+        self._local.throttled = False
+
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif not self.rate or self._tokens >= 1:
+                    if self.rate:
+                        self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+
+                self._cond.wait(wait)
+
+    @contextmanager
+    def request(self):
+        """
+        Reserva un hueco de concurrencia y un token para una petición remota
+
+        El resultado se comunica después con record_result o record_throttle.
+        """
+        start = time.perf_counter()
+        with self._cond:
+            while self._active >= self.concurrency:
+                self._cond.wait()
+            self._active += 1
+
+        try:
+            self.acquire()
+            if self.wait_observer:
+                self.wait_observer(time.perf_counter() - start)
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # Respuesta del servidor
+    # ------------------------------------------------------------------
+
+    def record_result(self, ok: bool):
+        """
+        Registra el resultado de una petición
+
+        Si durante la petición ya se registró un bloqueo (p.ej. desde el logger
+        de yt-dlp) no se vuelve a contar.
+        """
+        if getattr(self._local, 'throttled', False):
+            self._local.throttled = False
+            return
+
+        with self._cond:
+            self.stats['requests'] += 1
+            self._window_total += 1
+            if not ok:
+                self.stats['errors'] += 1
+                self._window_errors += 1
+
+            if self._window_total >= self.increase_after:
+                if self._window_errors / self._window_total <= self.error_threshold:
+                    self._increase()
+                self._window_total = 0
+                self._window_errors = 0
+
+    def record_throttle(self, retry_after: Optional[float] = None):
+        """
+        Registra un bloqueo (429/403): reducción multiplicativa y enfriamiento
+
+        Args:
+            retry_after: Segundos indicados por el servidor (Retry-After)
+        """
+        self._local.throttled = True
+
+        with self._cond:
+            now = time.monotonic()
+            self.stats['requests'] += 1
+            self.stats['errors'] += 1
+            self.stats['throttles'] += 1
+            self._window_total += 1
+            self._window_errors += 1
+
+            # Las peticiones que fallan juntas cuentan como un solo bloqueo
+            already_cooling = now < self._blocked_until
+
+            if retry_after is not None:
+                pause = retry_after
+            elif already_cooling:
+                pause = 0.0
+            else:
+                low, high = self.cooldown
+                pause = min(high, low * 2 ** self._backoff_level) * random.uniform(0.9, 1.1)
+
+            if not already_cooling:
+                self._decrease()
+                self._backoff_level = min(self._backoff_level + 1, 6)
+
+            until = now + pause
+            if until > self._blocked_until:
+                self.stats['cooldown_seconds'] += until - max(now, self._blocked_until)
+                self._blocked_until = until
+
+            self._cond.notify_all()
+
+    def throttle_recorded(self) -> bool:
+        """True si ya se registró un bloqueo en la petición actual de este hilo"""
+        return getattr(self._local, 'throttled', False)
+
+    def is_cooling_down(self) -> bool:
+        """True mientras dura la pausa tras un bloqueo"""
+        with self._cond:
+            return time.monotonic() < self._blocked_until
+
+    def observe(self, message: str) -> bool:
+        """
+        Registra un mensaje de error si indica un bloqueo
+
+        Returns:
+            True si el mensaje se contó como bloqueo
+        """
+        if is_throttle_error(message):
+            self.record_throttle()
+            return True
+        return False
+
+    def _increase(self):
+        """Aumento aditivo (con el lock tomado)"""
+        if self.rate and self.rate < self.max_rate:
+            step = max((self.max_rate - self.min_rate) / 10, self.max_rate * 0.05)
+            self.rate = min(self.max_rate, self.rate + step)
+        if self.concurrency < self.max_concurrency:
+            self.concurrency += 1
+        self._backoff_level = max(0, self._backoff_level - 1)
+        self.stats['increases'] += 1
+        self._cond.notify_all()
+
+    def _decrease(self):
+        """Reducción multiplicativa (con el lock tomado)"""
+        if self.rate:
+            self.rate = max(self.min_rate, self.rate / 2)
+        self.concurrency = max(1, self.concurrency // 2)
+        self._tokens = min(self._tokens, 0.0)
+        self.stats['decreases'] += 1
+
+    # ------------------------------------------------------------------
+    # Informes
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict:
+        """Estado actual y contadores"""
+        with self._cond:
+            return {
+                **self.stats,
+                'rate': self.rate,
+                'max_rate': self.max_rate,
+                'concurrency': self.concurrency,
+                'max_concurrency': self.max_concurrency,
+                'cooling_down': max(0.0, self._blocked_until - time.monotonic()),
+            }
+
+    def describe(self) -> str:
+        """Descripción corta del estado actual"""
+        stats = self.get_stats()
+        rate = f"{stats['rate']:.2f}/{stats['max_rate']:.2f} req/s" if stats['max_rate'] else "sin límite"
+        return (f"{rate} | concurrencia {stats['concurrency']}/{stats['max_concurrency']} | "
+                f"{stats['throttles']} bloqueos")
+
+
+class ControllerLogger:
+    """
+    Logger para yt-dlp que pasa los errores al controlador
+
+    Con 'ignoreerrors' yt-dlp no lanza excepciones: los 429/403 solo llegan
+    como mensajes. De los avisos solo cuentan los que son una señal explícita
+    de bloqueo; el resto se ignora. Los errores se siguen mostrando por stderr
+    y, si se indica on_error, se entregan también para clasificar el fallo.
+    """
+
+    def __init__(self, controller: AdaptiveController, on_error: Optional[Callable[[str], None]] = None):
+        self.controller = controller
+        self.on_error = on_error
+
+    def debug(self, msg):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        self.controller.observe(msg)
+
+    def error(self, msg):
+        self.controller.observe(msg)
+        if self.on_error:
+            self.on_error(msg)
+        print(msg, file=sys.stderr)
@@ -0,0 +1,184 @@
+"""
+Retry Engine
+Clasificación de errores y reintentos diferidos con backoff exponencial
+"""
+
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+from typing import Any, List, Optional, Union
+
+from rate_controller import THROTTLE_PATTERN
+
+# Clases de error de una canción
+TRANSIENT = 'transient'      # red, timeouts del servidor, errores sin explicación
+THROTTLED = 'throttled'      # 429/403, comprobación anti-bot
+UNAVAILABLE = 'unavailable'  # video eliminado, privado, bloqueado por región o edad
+NOT_FOUND = 'not_found'      # la búsqueda no devolvió ningún video
+
+ERROR_CLASSES = (TRANSIENT, THROTTLED, UNAVAILABLE, NOT_FOUND)
+
+# Solo estos fallos cuentan para la lista negra; el resto se reintenta
+PERMANENT_CLASSES = (UNAVAILABLE, NOT_FOUND)
+RETRYABLE_CLASSES = (TRANSIENT, THROTTLED)
+
+# Mensajes de yt-dlp de videos que no se podrán descargar por mucho que se reintente.
+# Va antes que THROTTLE_PATTERN: "Sign in to confirm your age" no es un bloqueo anti-bot
+UNAVAILABLE_PATTERN = re.compile(
+    r"Video unavailable|Private video|video is (private|unavailable)|has been removed|"
+    r"no longer available|account associated with this video has been terminated|"
+    r"not (made this video )?available in your country|geo.?restrict|blocked it in your country|"
+    r"confirm your age|age.?restrict|inappropriate for some users|members.only|"
+    r"copyright|Premieres in|live event will begin|HTTP Error (410|451)",
+    re.IGNORECASE
+)
+
+# Errores de red: se reintentan con el backoff normal y no frenan el control de tasa
+TRANSIENT_PATTERN = re.compile(
+    r"timed out|timeout|Connection (reset|refused|aborted)|Remote end closed|IncompleteRead|"
+    r"Temporary failure in name resolution|Network is unreachable|HTTP Error 5\d\d",
+    re.IGNORECASE
+)
+
+NOT_FOUND_PATTERN = re.compile(r"HTTP Error 404|No encontrado|no (video )?results", re.IGNORECASE)
+
+# Códigos HTTP de excepciones con .response (requests)
+STATUS_CLASSES = {404: NOT_FOUND, 410: UNAVAILABLE, 451: UNAVAILABLE, 403: THROTTLED, 429: THROTTLED}
+
+
+def classify_error(error: Union[BaseException, str, None], default: str = TRANSIENT) -> str:
+    """
+    Clase de un error de yt-dlp o requests
+
+    Args:
+        error: Excepción o mensaje de error
+        default: Clase si el error no coincide con ningún patrón
+
+    Returns:
+        Una de ERROR_CLASSES
+    """
+    if error is None:
+        return default
+
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status in STATUS_CLASSES:
+        return STATUS_CLASSES[status]
+    if status is not None and status >= 500:
+        return TRANSIENT
+
+    message = str(error)
+    if UNAVAILABLE_PATTERN.search(message):
+        return UNAVAILABLE
+    if TRANSIENT_PATTERN.search(message):
+        return TRANSIENT
+    if THROTTLE_PATTERN.search(message):
+        return THROTTLED
+    if NOT_FOUND_PATTERN.search(message):
+        return NOT_FOUND
+    return default
+
+
+class RetryPolicy:
+    """
+    Cuándo y tras cuánto tiempo reintentar una canción
+
+    El retraso crece exponencialmente con cada intento (base · 2^(n-1), con
+    un máximo) y se reparte al azar entre la mitad y el total ("equal
+    jitter"), así los reintentos de varias canciones no coinciden. Los
+    bloqueos esperan el doble.
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 15.0, max_delay: float = 300.0):
+        """
+        Args:
+            max_retries: Reintentos por canción (0 = sin reintentos)
+            base_delay: Retraso del primer reintento (segundos)
+            max_delay: Retraso máximo (segundos)
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, error_class: Optional[str], retries_done: int) -> bool:
+        """True si un fallo de esta clase se puede volver a intentar"""
+        return error_class in RETRYABLE_CLASSES and retries_done < self.max_retries
+
+    def delay(self, attempt: int, error_class: str = TRANSIENT, min_delay: float = 0.0) -> float:
+        """
+        Segundos hasta el reintento número `attempt` (empezando en 1)
+
+        Args:
+            attempt: Número de reintento
+            error_class: Clase del último error
+            min_delay: Espera mínima (p.ej. lo que queda de enfriamiento del control de tasa)
+        """
+        cap = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        if error_class == THROTTLED:
+            cap = min(self.max_delay, cap * 2)
+        return max(min_delay, random.uniform(cap / 2, cap))
+
+
+class DelayedQueue:
+    """
+    Cola de elementos que no se entregan hasta que vence su retraso
+
+    Los reintentos esperan aquí en lugar de dormir en el hilo que falló: el
+    worker sigue con otras canciones y el reintento se recoge cuando toca.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def put(self, item: Any, delay: float):
+        """Programa un elemento para dentro de `delay` segundos"""
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + max(0.0, delay), next(self._counter), item))
+            self._cond.notify_all()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """
+        Espera al próximo elemento vencido
+
+        Returns:
+            El elemento, o None si se agotó el tiempo o la cola se cerró
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    return heapq.heappop(self._heap)[2]
+
+                wait = self._heap[0][0] - now if self._heap else None
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+            return None
+
+    def close(self) -> List[Any]:
+        """
+        Cierra la cola y despierta a quien espera en get()
+
+        Returns:
+            Elementos que quedaban pendientes
+        """
+        with self._cond:
+            self._closed = True
+            pending = [entry[2] for entry in sorted(self._heap)]
+            self._heap.clear()
+            self._cond.notify_all()
+        return pending
@@ -0,0 +1,199 @@
+"""
+Search Cache
+Caché persistente de resultados de búsqueda de YouTube
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class SearchCache:
+    """
+    Caché en disco (SQLite) de búsquedas de YouTube
+
+    Guarda el video elegido y la lista de candidatos, indexado por texto de
+    búsqueda normalizado y por track_id de Spotify. Las entradas caducan tras
+    un TTL y, si se supera el tamaño máximo, se eliminan las menos usadas (LRU).
+    """
+
+    def __init__(self, db_path: Path, ttl_days: float = 30, max_entries: int = 20000):
+        """
+        Inicializa la caché
+
+        Args:
+            db_path: Ruta del archivo SQLite
+            ttl_days: Días que una entrada se considera válida
+            max_entries: Número máximo de entradas antes de expulsar las más antiguas
+        """
+        self.db_path = Path(db_path)
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+        self._lock = threading.Lock()
+        self._inserts_since_check = 0
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS search_cache (
+                key TEXT PRIMARY KEY,
+                video TEXT NOT NULL,
+                candidates TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_search_cache_access ON search_cache(last_access)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Normaliza el texto de búsqueda (minúsculas, espacios y signos)"""
+        query = unicodedata.normalize('NFKC', query).lower()
+        query = re.sub(r'[^\w\s-]', ' ', query)
+        return re.sub(r'\s+', ' ', query).strip()
+
+    def _keys(self, query: str, track_id: Optional[str]) -> List[str]:
+        """Claves bajo las que se guarda una búsqueda (track_id primero)"""
+        keys = []
+        if track_id:
+            keys.append(f"track:{track_id}")
+        keys.append(f"query:{self.normalize_query(query)}")
+        return keys
+
+    def get(self, query: str, track_id: Optional[str] = None) -> Optional[Dict]:
+        """
+        Busca un resultado en caché
+
+        Args:
+            query: Texto de búsqueda
+            track_id: ID de Spotify (opcional)
+
+        Returns:
+            Diccionario {'video': ..., 'candidates': [...]} o None
+        """
+        now = time.time()
+
+        with self._lock:
+            for key in self._keys(query, track_id):
+                row = self._conn.execute(
+                    "SELECT video, candidates, created FROM search_cache WHERE key = ?", (key,)
+                ).fetchone()
+
+                if not row:
+                    continue
+
+                if now - row[2] > self.ttl:
+                    self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                    self.expired += 1
+                    continue
+
+                self._conn.execute(
+                    "UPDATE search_cache SET last_access = ? WHERE key = ?", (now, key)
+                )
+                self._conn.commit()
+                self.hits += 1
+                return {'video': json.loads(row[0]), 'candidates': json.loads(row[1])}
+
+            self.misses += 1
+            return None
+
+    def put(self, query: str, video: Dict, candidates: List[Dict], track_id: Optional[str] = None):
+        """
+        Guarda el resultado de una búsqueda
+
+        Args:
+            query: Texto de búsqueda
+            video: Video elegido
+            candidates: Lista ordenada de candidatos
+            track_id: ID de Spotify (opcional)
+        """
+        now = time.time()
+        video_json = json.dumps(video, ensure_ascii=False)
+        candidates_json = json.dumps(candidates, ensure_ascii=False)
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?, ?)",
+                [(key, video_json, candidates_json, now, now) for key in self._keys(query, track_id)]
+            )
+            self._conn.commit()
+
+            # Comprobar el tamaño de vez en cuando para no contar en cada inserción
+            self._inserts_since_check += 1
+            if self._inserts_since_check >= 100:
+                self._inserts_since_check = 0
+                self._evict()
+
+    def _evict(self):
+        """Elimina entradas caducadas y las menos usadas si se supera el límite"""
+        self._conn.execute(
+            "DELETE FROM search_cache WHERE created < ?", (time.time() - self.ttl,)
+        )
+
+        count = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute("""
+                DELETE FROM search_cache WHERE key IN (
+                    SELECT key FROM search_cache ORDER BY last_access ASC LIMIT ?
+                )
+            """, (count - self.max_entries,))
+
+        self._conn.commit()
+
+    def load_index(self) -> Dict[str, Optional[float]]:
+        """
+        Claves vigentes y duración del video elegido, en una sola consulta
+
+        No cuenta como acierto ni actualiza el uso (LRU): sirve para planificar
+        un lote sin consultar la caché canción por canción.
+
+        Returns:
+            Diccionario clave → duración en segundos (o None)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, video FROM search_cache WHERE created >= ?", (time.time() - self.ttl,)
+            ).fetchall()
+
+        index = {}
+        for key, video in rows:
+            try:
+                index[key] = json.loads(video).get('duration')
+            except (ValueError, AttributeError):
+                index[key] = None
+        return index
+
+    def clear(self):
+        """Vacía la caché"""
+        with self._lock:
+            self._conn.execute("DELETE FROM search_cache")
+            self._conn.commit()
+
+    def get_stats(self) -> Dict:
+        """Estadísticas de uso de la caché"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'hit_rate': (self.hits / lookups) if lookups else 0.0,
+        }
+
+    def close(self):
+        """Cierra la conexión con la base de datos"""
+        with self._lock:
+            self._conn.close()
@@ -4,8 +4,11 @@ Obtiene canciones de playlists de Spotify para descargar
 """
 
 import os
-from typing import List, Tuple, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Tuple, Optional
 import spotipy
+from spotipy.exceptions import SpotifyException
 from spotipy.oauth2 import SpotifyOAuth
 from dotenv import load_dotenv
 
@@ -13,20 +16,38 @@ from dotenv import load_dotenv
 class SpotifyPlaylistExtractor:
     """Extrae canciones de playlists de Spotify"""
     
-    def __init__(self):
-        """Inicializa la conexión con Spotify"""
+    # Paginación de get_all_tracks
+    PAGE_SIZE = 100
+    PAGE_WORKERS = 4
+    MAX_PAGE_RETRIES = 5
+    TRACK_FIELDS = "items(track(id,name,duration_ms,artists(name))),total"
+    
+    # Solo metadatos: sin la primera página de canciones que incluye la respuesta completa
+    INFO_FIELDS = "id,name,owner(display_name),tracks(total),description,public,snapshot_id"
+    
+    def __init__(self, open_browser: bool = True):
+        """
+        Inicializa la conexión con Spotify
+        
+        Args:
+            open_browser: Abrir el navegador si hace falta autorizar la cuenta
+                          (False en ejecuciones desatendidas)
+        """
         load_dotenv()
         
         # Configurar autenticación
         self.scope = "playlist-read-private playlist-read-collaborative"
         
+        # Duración (segundos) de cada canción leída, para elegir la versión en YouTube
+        self.track_durations: Dict[str, float] = {}
+        
         try:
             auth_manager = SpotifyOAuth(
                 client_id=os.getenv('SPOTIPY_CLIENT_ID'),
                 client_secret=os.getenv('SPOTIPY_CLIENT_SECRET'),
                 redirect_uri=os.getenv('SPOTIPY_REDIRECT_URI'),
                 scope=self.scope,
-                open_browser=True,
+                open_browser=open_browser,
                 cache_path=".cache"
             )
             
@@ -66,28 +87,154 @@ class SpotifyPlaylistExtractor:
             playlist_input: URL o ID de la playlist
             
         Returns:
-            Diccionario con información de la playlist
+            Diccionario con información de la playlist (incluye snapshot_id,
+            que cambia cada vez que se modifica la playlist)
         """
         playlist_id = self._extract_playlist_id(playlist_input)
         
         try:
-            playlist = self.sp.playlist(playlist_id)
+            playlist = self.sp.playlist(playlist_id, fields=self.INFO_FIELDS)
             return {
                 'id': playlist['id'],
                 'name': playlist['name'],
                 'owner': playlist['owner']['display_name'],
                 'total_tracks': playlist['tracks']['total'],
                 'description': playlist.get('description', ''),
-                'public': playlist['public']
+                'public': playlist['public'],
+                'snapshot_id': playlist.get('snapshot_id')
             }
         except Exception as e:
             print(f"❌ Error obteniendo información de playlist: {e}")
             return None
     
+    def get_playlists_info(self, playlist_inputs: List[str]) -> Dict[str, dict]:
+        """
+        Obtiene la información de varias playlists en paralelo
+        
+        Args:
+            playlist_inputs: Lista de URLs o IDs de playlists
+            
+        Returns:
+            Diccionario playlist_id → información (se omiten las que fallan)
+        """
+        playlist_ids = [self._extract_playlist_id(p) for p in playlist_inputs]
+        
+        with ThreadPoolExecutor(max_workers=self.PAGE_WORKERS) as executor:
+            infos = executor.map(self.get_playlist_info, playlist_ids)
+            return {
+                playlist_id: info
+                for playlist_id, info in zip(playlist_ids, infos)
+                if info
+            }
+    
+    def _parse_track_items(self, items: List[dict]) -> List[Tuple[str, str, str]]:
+        """Convierte los items de una página en tuplas (track_id, artista, canción)"""
+        songs = []
+        
+        for item in items:
+            if not item.get('track'):
+                continue
+            
+            track = item['track']
+            
+            if not track.get('artists') or not track.get('id'):
+                continue
+            
+            track_id = track['id']
+            artist = track['artists'][0]['name']
+            
+            if track.get('duration_ms'):
+                self.track_durations[track_id] = track['duration_ms'] / 1000
+            song_name = track['name']
+            
+            # Limpiar el nombre de la canción (quitar "(feat. ...)")
+            song_name = song_name.split(' (feat.')[0]
+            song_name = song_name.split(' [')[0]
+            
+            songs.append((track_id, artist, song_name))
+        
+        return songs
+    
+    def _fetch_tracks_page(self, playlist_id: str, offset: int) -> dict:
+        """
+        Descarga una página de canciones respetando Retry-After
+        
+        Args:
+            playlist_id: ID de la playlist
+            offset: Posición de la primera canción de la página
+            
+        Returns:
+            Respuesta de la API con 'items' y 'total'
+        """
+        for attempt in range(self.MAX_PAGE_RETRIES + 1):
+            try:
+                return self.sp.playlist_items(
+                    playlist_id,
+                    fields=self.TRACK_FIELDS,
+                    limit=self.PAGE_SIZE,
+                    offset=offset,
+                    additional_types=('track',)
+                )
+            except SpotifyException as e:
+                if e.http_status != 429 or attempt == self.MAX_PAGE_RETRIES:
+                    raise
+                
+                # Spotify indica cuánto esperar antes de volver a pedir
+                retry_after = e.headers.get('Retry-After') or e.headers.get('retry-after') or 1
+                time.sleep(float(retry_after) + 0.5)
+    
+    def _iter_track_pages(self, playlist_id: str) -> Iterator[List[Tuple[str, str, str]]]:
+        """
+        Genera las páginas de canciones de una playlist en orden
+        
+        La primera página indica el total; el resto de offsets se conocen de
+        antemano y se piden en paralelo con un número limitado de hilos. Cada
+        página se entrega en cuanto ella y las anteriores están disponibles.
+        """
+        first_page = self._fetch_tracks_page(playlist_id, 0)
+        yield self._parse_track_items(first_page['items'])
+        
+        offsets = range(self.PAGE_SIZE, first_page['total'], self.PAGE_SIZE)
+        if not offsets:
+            return
+        
+        executor = ThreadPoolExecutor(max_workers=self.PAGE_WORKERS)
+        try:
+            futures = [executor.submit(self._fetch_tracks_page, playlist_id, offset) for offset in offsets]
+            for future in futures:
+                yield self._parse_track_items(future.result()['items'])
+        finally:
+            # Si el consumidor se detiene antes, no pedir las páginas pendientes
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def iter_tracks(self, playlist_input: str) -> Iterator[Tuple[str, str, str]]:
+        """
+        Genera las canciones de una playlist a medida que llegan las páginas
+        
+        Permite empezar a descargar antes de tener el listado completo.
+        
+        Args:
+            playlist_input: URL o ID de la playlist
+            
+        Yields:
+            Tuplas (track_id, artista, canción) en el orden de la playlist
+        """
+        playlist_id = self._extract_playlist_id(playlist_input)
+        
+        try:
+            for page in self._iter_track_pages(playlist_id):
+                yield from page
+        except Exception as e:
+            print(f"❌ Error obteniendo canciones: {e}")
+    
     def get_all_tracks(self, playlist_input: str) -> List[Tuple[str, str, str]]:
         """
         Obtiene todas las canciones de una playlist
         
+        Las páginas se piden en paralelo y solo con los campos que se usan,
+        para reducir el tamaño de las respuestas. El orden de la playlist se
+        conserva.
+        
         Args:
             playlist_input: URL o ID de la playlist
             
@@ -96,37 +243,10 @@ class SpotifyPlaylistExtractor:
         """
         playlist_id = self._extract_playlist_id(playlist_input)
         
-        songs = []
-        
         try:
-            results = self.sp.playlist_tracks(playlist_id)
-            
-            while results:
-                for item in results['items']:
-                    if not item['track']:
-                        continue
-                    
-                    track = item['track']
-                    
-                    if not track['artists'] or not track['id']:
-                        continue
-                    
-                    track_id = track['id']
-                    artist = track['artists'][0]['name']
-                    song_name = track['name']
-                    
-                    # Limpiar el nombre de la canción (quitar "(feat. ...)")
-                    song_name = song_name.split(' (feat.')[0]
-                    song_name = song_name.split(' [')[0]
-                    
-                    songs.append((track_id, artist, song_name))
-                
-                # Paginación
-                if results['next']:
-                    results = self.sp.next(results)
-                else:
-                    break
-            
+            songs = []
+            for page in self._iter_track_pages(playlist_id):
+                songs.extend(page)
             return songs
             
         except Exception as e:
@@ -152,7 +272,8 @@ class SpotifyPlaylistExtractor:
                         'name': playlist['name'],
                         'owner': playlist['owner']['display_name'],
                         'total_tracks': playlist['tracks']['total'],
-                        'public': playlist['public']
+                        'public': playlist['public'],
+                        'snapshot_id': playlist.get('snapshot_id')
                     })
                 
                 if results['next']:
@@ -166,17 +287,19 @@ class SpotifyPlaylistExtractor:
             print(f"❌ Error obteniendo playlists del usuario: {e}")
             return []
     
-    def get_multiple_playlists(self, playlist_inputs: List[str]) -> List[Tuple[str, str, str]]:
+    def iter_multiple_playlists(self, playlist_inputs: List[str]) -> Iterator[Tuple[str, str, str]]:
         """
-        Obtiene canciones de múltiples playlists
+        Genera las canciones de múltiples playlists sin duplicados
+        
+        Las canciones se entregan página a página y los duplicados se
+        descartan sobre la marcha.
         
         Args:
             playlist_inputs: Lista de URLs o IDs de playlists
             
-        Returns:
-            Lista de tuplas (track_id, artista, canción) sin duplicados
+        Yields:
+            Tuplas (track_id, artista, canción)
         """
-        all_songs = []
         seen = set()
         
         for playlist_input in playlist_inputs:
@@ -187,15 +310,22 @@ class SpotifyPlaylistExtractor:
                 print(f"   Nombre: {info['name']}")
                 print(f"   Canciones: {info['total_tracks']}")
             
-            songs = self.get_all_tracks(playlist_input)
-            
-            # Filtrar duplicados
-            for track_id, artist, song in songs:
+            for track_id, artist, song in self.iter_tracks(playlist_input):
                 if track_id not in seen:
                     seen.add(track_id)
-                    all_songs.append((track_id, artist, song))
+                    yield (track_id, artist, song)
+    
+    def get_multiple_playlists(self, playlist_inputs: List[str]) -> List[Tuple[str, str, str]]:
+        """
+        Obtiene canciones de múltiples playlists
         
-        return all_songs
+        Args:
+            playlist_inputs: Lista de URLs o IDs de playlists
+            
+        Returns:
+            Lista de tuplas (track_id, artista, canción) sin duplicados
+        """
+        return list(self.iter_multiple_playlists(playlist_inputs))
 
 
 def get_songs_from_spotify_playlist(playlist_url: str) -> List[Tuple[str, str, str]]:
@@ -0,0 +1,199 @@
+"""
+Staging Area
+Carpetas de trabajo aisladas por descarga y publicación atómica en la biblioteca
+"""
+
+import errno
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional, Set
+
+# Archivos de una descarga a medias que yt-dlp puede continuar (continuedl)
+PARTIAL_SUFFIXES = ('.part', '.ytdl')
+
+# Restos de trabajos terminados hace más de esto se eliminan al arrancar
+STALE_AFTER = 24 * 3600
+
+
+def publish_file(source: Path, destination: Path):
+    """
+    Mueve un archivo terminado a su ruta final de forma atómica
+
+    En el mismo sistema de archivos basta con os.replace. Si la carpeta de
+    trabajo está en otro volumen (p.ej. tmpfs), se copia primero a un archivo
+    oculto junto al destino, se sincroniza y se renombra: la biblioteca nunca
+    ve un archivo a medias.
+
+    Args:
+        source: Archivo en la carpeta de trabajo
+        destination: Ruta final en la biblioteca
+    """
+    source = Path(source)
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+
+    try:
+        os.replace(source, destination)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    temp_destination = destination.with_name(f".{destination.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(source, 'rb') as src, open(temp_destination, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+            dst.flush()
+            os.fsync(dst.fileno())
+        shutil.copystat(source, temp_destination)
+        os.replace(temp_destination, destination)
+    except BaseException:
+        try:
+            temp_destination.unlink()
+        except OSError:
+            pass
+        raise
+
+    source.unlink()
+
+
+class StagingArea:
+    """
+    Carpetas de trabajo para las descargas en curso
+
+    Cada trabajo recibe su propia carpeta, así dos descargas del mismo artista
+    (o del mismo video) nunca comparten archivos. La carpeta se nombra por el
+    ID del video para que un reintento posterior encuentre y continúe los
+    .part que dejó el anterior; si esa carpeta ya está en uso en este proceso,
+    se usa otra con sufijo.
+    """
+
+    def __init__(self, root: Path):
+        """
+        Inicializa el área de trabajo
+
+        Args:
+            root: Carpeta base (en la biblioteca o en un volumen rápido como /dev/shm)
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._active: Set[Path] = set()
+
+        self.purge_stale()
+
+    def claim(self, video_id: str) -> Path:
+        """
+        Reserva una carpeta de trabajo para un video
+
+        Args:
+            video_id: ID del video de YouTube
+
+        Returns:
+            Carpeta creada y reservada para el trabajo
+        """
+        with self._lock:
+            job_dir = self.root / video_id
+            n = 1
+            while job_dir in self._active:
+                n += 1
+                job_dir = self.root / f"{video_id}-{n}"
+
+            self._active.add(job_dir)
+
+        job_dir.mkdir(parents=True, exist_ok=True)
+        return job_dir
+
+    def release(self, job_dir: Path, keep_partial: bool = False):
+        """
+        Elimina una carpeta de trabajo y la libera
+
+        Args:
+            job_dir: Carpeta devuelta por claim
+            keep_partial: Conservar los .part de yt-dlp para continuar la descarga
+                          en el siguiente intento
+        """
+        try:
+            if keep_partial and job_dir.exists():
+                for f in job_dir.iterdir():
+                    if f.name.endswith(PARTIAL_SUFFIXES):
+                        continue
+                    if f.is_dir():
+                        shutil.rmtree(f, ignore_errors=True)
+                    else:
+                        try:
+                            f.unlink()
+                        except OSError:
+                            pass
+                try:
+                    job_dir.rmdir()
+                except OSError:
+                    pass
+            else:
+                shutil.rmtree(job_dir, ignore_errors=True)
+        finally:
+            with self._lock:
+                self._active.discard(job_dir)
+
+    def find_output(self, job_dir: Path, ext: Optional[str] = None) -> Optional[Path]:
+        """
+        Archivo terminado dentro de una carpeta de trabajo
+
+        Args:
+            job_dir: Carpeta del trabajo
+            ext: Extensión esperada (None para cualquiera)
+
+        Returns:
+            Ruta del archivo, o None si la descarga no produjo ninguno
+        """
+        if not job_dir.exists():
+            return None
+
+        candidates = [
+            f for f in job_dir.iterdir()
+            if f.is_file()
+            and not f.name.endswith(PARTIAL_SUFFIXES)
+            and not f.name.startswith('.')
+            and (ext is None or f.suffix == ext)
+        ]
+        if not candidates:
+            return None
+
+        # La carpeta es exclusiva del trabajo: si hubiera varios, el más reciente es el bueno
+        return max(candidates, key=lambda f: f.stat().st_mtime_ns)
+
+    def purge_stale(self, max_age: float = STALE_AFTER) -> int:
+        """
+        Elimina carpetas de trabajos antiguos que ya no están en uso
+
+        Returns:
+            Número de carpetas eliminadas
+        """
+        removed = 0
+        cutoff = time.time() - max_age
+
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError:
+            return 0
+
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            with self._lock:
+                if Path(entry.path) in self._active:
+                    continue
+            try:
+                if entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+
+        return removed
@@ -0,0 +1,570 @@
+"""
+State Store
+Almacenamiento transaccional (SQLite) del estado del descargador
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class StateStore:
+    """
+    Estado persistente del descargador en SQLite (modo WAL)
+
+    Reemplaza a blacklist.json y download_history.json: cada cambio actualiza
+    solo las filas afectadas en lugar de reescribir el documento completo.
+    Incluye además un registro por canción descargada.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS failures (
+            key TEXT PRIMARY KEY,
+            artist TEXT NOT NULL,
+            song TEXT NOT NULL,
+            track_id TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            last_attempt TEXT,
+            blacklisted INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_failures_track ON failures(track_id);
+
+        CREATE TABLE IF NOT EXISTS playlists (
+            playlist_id TEXT PRIMARY KEY,
+            last_update TEXT NOT NULL,
+            total_tracks INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE TABLE IF NOT EXISTS playlist_tracks (
+            playlist_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            track_id TEXT NOT NULL,
+            PRIMARY KEY (playlist_id, track_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_playlist_tracks_track ON playlist_tracks(track_id);
+
+        CREATE TABLE IF NOT EXISTS playlist_snapshots (
+            playlist_id TEXT PRIMARY KEY,
+            snapshot_id TEXT NOT NULL,
+            tracks TEXT NOT NULL,
+            fetched_at TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS playlist_info (
+            playlist_id TEXT PRIMARY KEY,
+            info TEXT NOT NULL,
+            fetched_at TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS downloads (
+            key TEXT PRIMARY KEY,
+            track_id TEXT,
+            artist TEXT NOT NULL,
+            song TEXT NOT NULL,
+            file_path TEXT,
+            video_id TEXT,
+            downloaded_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_downloads_track ON downloads(track_id);
+
+        CREATE TABLE IF NOT EXISTS track_candidates (
+            key TEXT PRIMARY KEY,
+            track_id TEXT,
+            candidates TEXT NOT NULL,
+            failed TEXT NOT NULL DEFAULT '[]',
+            updated_at TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mode TEXT NOT NULL,
+            audio_format TEXT,
+            downloaded INTEGER NOT NULL,
+            searches INTEGER NOT NULL,
+            search_seconds REAL NOT NULL,
+            elapsed REAL NOT NULL,
+            finished_at TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS batches (
+            batch_id TEXT PRIMARY KEY,
+            playlist_id TEXT,
+            update_mode INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS batch_jobs (
+            batch_id TEXT NOT NULL,
+            key TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            track_id TEXT,
+            artist TEXT NOT NULL,
+            song TEXT NOT NULL,
+            state TEXT NOT NULL,
+            message TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (batch_id, key)
+        );
+    """
+
+    def __init__(self, db_path: Path):
+        """
+        Abre (o crea) la base de datos de estado
+
+        Args:
+            db_path: Ruta del archivo SQLite
+        """
+        self.db_path = Path(db_path)
+        self._lock = threading.RLock()
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+    def is_empty(self) -> bool:
+        """True si la base de datos no tiene fallos ni playlists registradas"""
+        with self._lock:
+            failures = self._conn.execute("SELECT 1 FROM failures LIMIT 1").fetchone()
+            playlists = self._conn.execute("SELECT 1 FROM playlists LIMIT 1").fetchone()
+            return failures is None and playlists is None
+
+    # ------------------------------------------------------------------
+    # Fallos / lista negra
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _failure_row(key: str, data: Dict) -> tuple:
+        return (
+            key,
+            data.get('artist', ''),
+            data.get('song', ''),
+            data.get('track_id'),
+            data.get('attempts', 0),
+            data.get('last_error'),
+            data.get('last_attempt'),
+            1 if data.get('blacklisted', False) else 0,
+        )
+
+    @staticmethod
+    def _failure_dict(row: sqlite3.Row) -> Dict:
+        data = {
+            'artist': row['artist'],
+            'song': row['song'],
+            'attempts': row['attempts'],
+            'last_error': row['last_error'],
+            'last_attempt': row['last_attempt'],
+        }
+        if row['track_id']:
+            data['track_id'] = row['track_id']
+        if row['blacklisted']:
+            data['blacklisted'] = True
+        return data
+
+    def load_failures(self) -> Dict[str, Dict]:
+        """Carga todos los fallos con el mismo formato que blacklist.json"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM failures").fetchall()
+        return {row['key']: self._failure_dict(row) for row in rows}
+
+    def upsert_failure(self, key: str, data: Dict):
+        """Inserta o actualiza un único registro de fallos"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO failures VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                self._failure_row(key, data)
+            )
+
+    def delete_failure(self, key: str):
+        """Elimina el registro de fallos de una canción"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM failures WHERE key = ?", (key,))
+
+    def upsert_failures(self, failures: Dict[str, Dict]):
+        """Inserta o actualiza varios registros de fallos en una sola transacción"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO failures VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._failure_row(key, data) for key, data in failures.items()]
+            )
+
+    def delete_failures(self, keys: List[str]):
+        """Elimina varios registros de fallos en una sola transacción"""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM failures WHERE key = ?", [(key,) for key in keys])
+
+    def replace_failures(self, failures: Dict[str, Dict]):
+        """Reemplaza todos los fallos en una sola transacción (operaciones masivas)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM failures")
+            self._conn.executemany(
+                "INSERT INTO failures VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._failure_row(key, data) for key, data in failures.items()]
+            )
+
+    # ------------------------------------------------------------------
+    # Historial de playlists
+    # ------------------------------------------------------------------
+
+    def load_history(self) -> Dict[str, Dict]:
+        """Carga el historial con el mismo formato que download_history.json"""
+        history = {}
+
+        with self._lock:
+            playlists = self._conn.execute(
+                "SELECT p.*, s.snapshot_id FROM playlists p "
+                "LEFT JOIN playlist_snapshots s ON s.playlist_id = p.playlist_id"
+            ).fetchall()
+            tracks = self._conn.execute(
+                "SELECT playlist_id, track_id FROM playlist_tracks ORDER BY playlist_id, position"
+            ).fetchall()
+
+        for row in playlists:
+            history[row['playlist_id']] = {
+                'track_ids': [],
+                'last_update': row['last_update'],
+                'total_tracks': row['total_tracks'],
+            }
+            if row['snapshot_id']:
+                history[row['playlist_id']]['snapshot_id'] = row['snapshot_id']
+
+        for row in tracks:
+            if row['playlist_id'] in history:
+                history[row['playlist_id']]['track_ids'].append(row['track_id'])
+
+        return history
+
+    def save_playlist(self, playlist_id: str, data: Dict):
+        """
+        Guarda el historial de una playlist
+
+        Args:
+            playlist_id: ID de la playlist
+            data: Diccionario con track_ids, last_update y total_tracks
+        """
+        with self._lock, self._conn:
+            self._write_playlist(playlist_id, data)
+
+    def _write_playlist(self, playlist_id: str, data: Dict):
+        """Escribe las filas de una playlist (dentro de una transacción abierta)"""
+        track_ids = data.get('track_ids', [])
+
+        self._conn.execute(
+            "INSERT OR REPLACE INTO playlists VALUES (?, ?, ?)",
+            (playlist_id, data.get('last_update', datetime.now().isoformat()),
+             data.get('total_tracks', len(track_ids)))
+        )
+        self._conn.execute("DELETE FROM playlist_tracks WHERE playlist_id = ?", (playlist_id,))
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO playlist_tracks VALUES (?, ?, ?)",
+            [(playlist_id, position, track_id) for position, track_id in enumerate(track_ids)]
+        )
+
+    def delete_playlist(self, playlist_id: str):
+        """Elimina una playlist del historial"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM playlists WHERE playlist_id = ?", (playlist_id,))
+            self._conn.execute("DELETE FROM playlist_tracks WHERE playlist_id = ?", (playlist_id,))
+            self._conn.execute("DELETE FROM playlist_snapshots WHERE playlist_id = ?", (playlist_id,))
+            self._conn.execute("DELETE FROM playlist_info WHERE playlist_id = ?", (playlist_id,))
+
+    def replace_history(self, history: Dict[str, Dict]):
+        """Reemplaza todo el historial en una sola transacción"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM playlists")
+            self._conn.execute("DELETE FROM playlist_tracks")
+            for playlist_id, data in history.items():
+                self._write_playlist(playlist_id, data)
+
+    def get_snapshot(self, playlist_id: str) -> Optional[Dict]:
+        """
+        Obtiene el último listado de Spotify guardado para una playlist
+
+        Returns:
+            Diccionario con snapshot_id, tracks [(track_id, artista, canción)] y
+            fetched_at, o None si no hay listado guardado
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM playlist_snapshots WHERE playlist_id = ?", (playlist_id,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return {
+            'snapshot_id': row['snapshot_id'],
+            'tracks': [tuple(track) for track in json.loads(row['tracks'])],
+            'fetched_at': row['fetched_at'],
+        }
+
+    def save_snapshot(self, playlist_id: str, snapshot_id: str, tracks: List[tuple]):
+        """Guarda el snapshot_id de Spotify y el listado de canciones de una playlist"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO playlist_snapshots VALUES (?, ?, ?, ?)",
+                (playlist_id, snapshot_id, json.dumps([list(track) for track in tracks]),
+                 datetime.now().isoformat())
+            )
+
+    def load_playlist_info(self, playlist_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Carga los metadatos de Spotify guardados para varias playlists
+
+        Returns:
+            Diccionario playlist_id → {'info': ..., 'fetched_at': ...}
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM playlist_info").fetchall()
+
+        wanted = set(playlist_ids)
+        return {
+            row['playlist_id']: {'info': json.loads(row['info']), 'fetched_at': row['fetched_at']}
+            for row in rows if row['playlist_id'] in wanted
+        }
+
+    def save_playlist_info(self, infos: Dict[str, Dict]):
+        """Guarda los metadatos de Spotify de varias playlists en una transacción"""
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO playlist_info VALUES (?, ?, ?)",
+                [(playlist_id, json.dumps(info), now) for playlist_id, info in infos.items()]
+            )
+
+    # ------------------------------------------------------------------
+    # Registro de descargas
+    # ------------------------------------------------------------------
+
+    def record_download(self, key: str, artist: str, song: str, track_id: Optional[str] = None,
+                        file_path: Optional[str] = None, video_id: Optional[str] = None):
+        """Registra una canción descargada correctamente"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, track_id, artist, song, file_path, video_id, datetime.now().isoformat())
+            )
+
+    def load_track_index(self) -> Dict[str, Dict]:
+        """
+        Índice global track_id → video de YouTube y archivo descargado
+
+        Returns:
+            Diccionario track_id → {'video_id': ..., 'file_path': ...}
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT track_id, video_id, file_path FROM downloads "
+                "WHERE track_id IS NOT NULL ORDER BY downloaded_at"
+            ).fetchall()
+        return {
+            row['track_id']: {'video_id': row['video_id'], 'file_path': row['file_path']}
+            for row in rows
+        }
+
+    # ------------------------------------------------------------------
+    # Candidatos de búsqueda (alternativas si falla la descarga)
+    # ------------------------------------------------------------------
+
+    def save_candidates(self, key: str, candidates: List[Dict], track_id: Optional[str] = None):
+        """Guarda la lista ordenada de candidatos de una canción (conserva los fallidos)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO track_candidates (key, track_id, candidates, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET track_id = excluded.track_id, "
+                "candidates = excluded.candidates, updated_at = excluded.updated_at",
+                (key, track_id, json.dumps(candidates, ensure_ascii=False), datetime.now().isoformat())
+            )
+
+    def get_candidates(self, key: str) -> Optional[Dict]:
+        """
+        Candidatos guardados de una canción
+
+        Returns:
+            Diccionario con candidates (lista ordenada) y failed (IDs de video
+            que ya fallaron), o None si no hay
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT candidates, failed FROM track_candidates WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        return {'candidates': json.loads(row['candidates']), 'failed': json.loads(row['failed'])}
+
+    def mark_candidate_failed(self, key: str, video_id: str, track_id: Optional[str] = None):
+        """Anota un video cuya descarga falló para no volver a elegirlo"""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT failed FROM track_candidates WHERE key = ?", (key,)
+            ).fetchone()
+            failed = json.loads(row['failed']) if row else []
+            if video_id in failed:
+                return
+            failed.append(video_id)
+            self._conn.execute(
+                "INSERT INTO track_candidates (key, track_id, candidates, failed, updated_at) "
+                "VALUES (?, ?, '[]', ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET failed = excluded.failed, updated_at = excluded.updated_at",
+                (key, track_id, json.dumps(failed), datetime.now().isoformat())
+            )
+
+    # ------------------------------------------------------------------
+    # Diario de lotes (reanudación tras un corte)
+    # ------------------------------------------------------------------
+
+    def create_batch(self, batch_id: str, playlist_id: Optional[str] = None, update_mode: bool = False):
+        """Registra un lote nuevo en curso"""
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO batches VALUES (?, ?, ?, 'running', ?, ?)",
+                (batch_id, playlist_id, 1 if update_mode else 0, now, now)
+            )
+
+    def get_batch(self, batch_id: str) -> Optional[Dict]:
+        """Obtiene un lote con el recuento de trabajos por estado"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+            if row is None:
+                return None
+            counts = self._conn.execute(
+                "SELECT state, COUNT(*) FROM batch_jobs WHERE batch_id = ? GROUP BY state", (batch_id,)
+            ).fetchall()
+
+        batch = dict(row)
+        batch['update_mode'] = bool(batch['update_mode'])
+        batch['jobs'] = {state: count for state, count in counts}
+        return batch
+
+    def unfinished_batches(self) -> List[Dict]:
+        """Lotes que no llegaron a terminar, del más reciente al más antiguo"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT batch_id FROM batches WHERE status = 'running' ORDER BY created_at DESC"
+            ).fetchall()
+        return [self.get_batch(row['batch_id']) for row in rows]
+
+    def set_batch_status(self, batch_id: str, status: str):
+        """Cambia el estado de un lote (running, completed, abandoned)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE batches SET status = ?, updated_at = ? WHERE batch_id = ?",
+                (status, datetime.now().isoformat(), batch_id)
+            )
+
+    def add_batch_jobs(self, batch_id: str, jobs: List[tuple]):
+        """
+        Añade canciones al diario del lote (las que ya estaban conservan su estado)
+
+        Args:
+            batch_id: ID del lote
+            jobs: Tuplas (key, position, track_id, artist, song)
+        """
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO batch_jobs VALUES (?, ?, ?, ?, ?, ?, 'queued', NULL, ?)",
+                [(batch_id, *job, now) for job in jobs]
+            )
+
+    def set_job_state(self, batch_id: str, key: str, state: str, message: Optional[str] = None):
+        """Guarda el estado de una canción del lote en cuanto termina cada etapa"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE batch_jobs SET state = ?, message = ?, updated_at = ? "
+                "WHERE batch_id = ? AND key = ?",
+                (state, message, datetime.now().isoformat(), batch_id, key)
+            )
+
+    def load_batch_jobs(self, batch_id: str) -> List[Dict]:
+        """Trabajos de un lote en el orden original"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM batch_jobs WHERE batch_id = ? ORDER BY position", (batch_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    # ------------------------------------------------------------------
+    # Rendimiento de ejecuciones anteriores (estimaciones del planificador)
+    # ------------------------------------------------------------------
+
+    def record_run(self, mode: str, audio_format: str, downloaded: int, searches: int,
+                   search_seconds: float, elapsed: float):
+        """
+        Guarda el rendimiento de una ejecución
+
+        Args:
+            mode: "sequential" o "pipeline"
+            audio_format: Formato de salida
+            downloaded: Canciones descargadas (sin contar las que ya existían)
+            searches: Búsquedas hechas en YouTube (sin contar la caché)
+            search_seconds: Tiempo total de esas búsquedas
+            elapsed: Duración de la ejecución (segundos)
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO runs (mode, audio_format, downloaded, searches, search_seconds, elapsed, finished_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (mode, audio_format, downloaded, searches, search_seconds, elapsed, datetime.now().isoformat())
+            )
+
+    def recent_runs(self, mode: str, limit: int = 20) -> List[Dict]:
+        """Últimas ejecuciones de un modo, de la más reciente a la más antigua"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM runs WHERE mode = ? ORDER BY run_id DESC LIMIT ?", (mode, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    # ------------------------------------------------------------------
+    # Migración
+    # ------------------------------------------------------------------
+
+    def migrate_from_json(self, blacklist_file: Path, history_file: Path) -> bool:
+        """
+        Importa una sola vez los antiguos data/*.json
+
+        Los archivos migrados se renombran a *.json.migrated para no volver a importarlos.
+
+        Args:
+            blacklist_file: Ruta de blacklist.json
+            history_file: Ruta de download_history.json
+
+        Returns:
+            True si se importó algún archivo
+        """
+        migrated = False
+
+        for json_file, importer in ((blacklist_file, self.replace_failures),
+                                    (history_file, self.replace_history)):
+            json_file = Path(json_file)
+            if not json_file.exists():
+                continue
+
+            try:
+                with open(json_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  No se pudo migrar {json_file.name}: {e}")
+                continue
+
+            if isinstance(data, dict):
+                importer(data)
+                json_file.rename(json_file.with_name(json_file.name + ".migrated"))
+                migrated = True
+
+        return migrated
+
+    def close(self):
+        """Cierra la conexión con la base de datos"""
+        with self._lock:
+            self._conn.close()
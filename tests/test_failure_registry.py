@@ -0,0 +1,108 @@
+"""
+Tests de FailureRegistry: bloqueo tras varios fallos, enfriamiento y caducidad
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from failure_registry import FailureRegistry
+from state_store import StateStore
+
+
+@pytest.fixture
+def state(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    yield store
+    store.close()
+
+
+def record_times(registry, times, artist="Artista", song="Canción", track_id="t1"):
+    entry = None
+    for _ in range(times):
+        entry = registry.record(artist, song, "Video no disponible", track_id)
+    return entry
+
+
+def test_blocks_after_threshold(state):
+    registry = FailureRegistry(state, threshold=3)
+    entry = record_times(registry, 2)
+    assert not entry.get('blacklisted')
+    assert not registry.is_blocked("Artista", "Canción", "t1")
+
+    entry = record_times(registry, 1)
+    assert entry['blacklisted']
+    assert registry.is_blocked("Artista", "Canción", "t1")
+
+
+def test_lookup_by_track_id_survives_rename(state):
+    registry = FailureRegistry(state, threshold=1)
+    record_times(registry, 1)
+    assert registry.is_blocked("Artista", "Canción (Remastered)", "t1")
+    # Mismo nombre, otro track_id: otra versión de la canción
+    assert not registry.is_blocked("Artista", "Canción", "t2")
+
+
+def test_lookup_by_normalized_name(state):
+    registry = FailureRegistry(state, threshold=1)
+    record_times(registry, 1, track_id=None)
+    assert registry.is_blocked("artista", "cancion")
+
+
+def test_cooldown_doubles_and_is_capped(state):
+    registry = FailureRegistry(state, threshold=3, cooldown_days=7, max_cooldown_days=90)
+    last = datetime(2024, 1, 1)
+    entry = {'blacklisted': True, 'last_attempt': last.isoformat()}
+
+    expected = {3: 7, 4: 14, 5: 28, 6: 56, 7: 90, 50: 90}
+    for attempts, days in expected.items():
+        assert registry.blocked_until({**entry, 'attempts': attempts}) == last + timedelta(days=days)
+
+
+def test_not_blocked_and_permanent(state):
+    registry = FailureRegistry(state, cooldown_days=7)
+    assert registry.blocked_until({'attempts': 2}) is None
+
+    permanent = FailureRegistry(state, cooldown_days=0)
+    entry = {'attempts': 3, 'blacklisted': True, 'last_attempt': datetime.now().isoformat()}
+    assert permanent.blocked_until(entry) == datetime.max
+
+
+def test_block_expires_after_cooldown(state):
+    old = (datetime.now() - timedelta(days=8)).isoformat()
+    state.upsert_failure("track:t1", {'artist': "A", 'song': "S", 'track_id': "t1",
+                                      'attempts': 3, 'blacklisted': True, 'last_attempt': old})
+    state.upsert_failure("track:t2", {'artist': "B", 'song': "S", 'track_id': "t2",
+                                      'attempts': 4, 'blacklisted': True, 'last_attempt': old})
+    state.upsert_failure("track:t3", {'artist': "C", 'song': "S", 'track_id': "t3",
+                                      'attempts': 1, 'last_attempt': old})
+
+    registry = FailureRegistry(state, threshold=3, cooldown_days=7)
+    assert not registry.is_blocked("A", "S", "t1")
+    # Un fallo más tras el bloqueo: 14 días
+    assert registry.is_blocked("B", "S", "t2")
+
+    blocked, expired, pending = registry.split()
+    assert set(blocked) == {"track:t2"}
+    assert set(expired) == {"track:t1"}
+    assert set(pending) == {"track:t3"}
+
+
+def test_changes_are_persisted(state):
+    registry = FailureRegistry(state, threshold=2)
+    record_times(registry, 2, track_id="t1")
+    record_times(registry, 1, artist="Otro", track_id="t2")
+
+    reloaded = FailureRegistry(state, threshold=2)
+    assert reloaded.is_blocked("Artista", "Canción", "t1")
+    assert len(reloaded) == 2
+
+    assert reloaded.forget("Otro", "Canción", "t2")
+    assert reloaded.reset() == 1
+    assert not reloaded.is_blocked("Artista", "Canción", "t1")
+
+    again = FailureRegistry(state, threshold=2)
+    assert again.get("Artista", "Canción", "t1")['attempts'] == 0
+    assert again.get("Otro", "Canción", "t2") is None
+    assert again.remove() == 1
+    assert len(FailureRegistry(state)) == 0
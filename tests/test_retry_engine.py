@@ -0,0 +1,124 @@
+"""
+Tests de retry_engine: clasificación de errores, retrasos y cola diferida
+"""
+
+import random
+import time
+
+import pytest
+
+from rate_controller import is_throttle_error
+from retry_engine import (NOT_FOUND, THROTTLED, TRANSIENT, UNAVAILABLE, DelayedQueue,
+                          RetryPolicy, classify_error)
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.response = FakeResponse(status_code)
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("ERROR: [youtube] abc: HTTP Error 429: Too Many Requests", THROTTLED),
+    ("ERROR: unable to download video data: HTTP Error 403: Forbidden", THROTTLED),
+    ("ERROR: Sign in to confirm you're not a bot", THROTTLED),
+    ("ERROR: [youtube] abc: Video unavailable", UNAVAILABLE),
+    ("ERROR: [youtube] abc: Private video", UNAVAILABLE),
+    ("ERROR: Sign in to confirm your age", UNAVAILABLE),
+    ("ERROR: HTTP Error 410: Gone", UNAVAILABLE),
+    ("ERROR: Read timed out. (read timeout=20)", TRANSIENT),
+    ("ERROR: Connection reset by peer", TRANSIENT),
+    ("ERROR: HTTP Error 503: Service Unavailable", TRANSIENT),
+    ("ERROR: HTTP Error 404: Not Found", NOT_FOUND),
+    ("No encontrado en YouTube", NOT_FOUND),
+])
+def test_classify_error_messages(message, expected):
+    assert classify_error(message) == expected
+
+
+@pytest.mark.parametrize("message", [
+    "Artista - 429 (Official Video)",
+    "downloaded 4030 bytes",
+    "video id x403abc",
+])
+def test_numbers_in_messages_are_not_throttles(message):
+    assert classify_error(message) == TRANSIENT
+    assert not is_throttle_error(message)
+
+
+def test_timeouts_are_not_throttles():
+    assert not is_throttle_error("Read timed out")
+
+
+@pytest.mark.parametrize("status, expected", [
+    (404, NOT_FOUND),
+    (410, UNAVAILABLE),
+    (429, THROTTLED),
+    (403, THROTTLED),
+    (500, TRANSIENT),
+    (502, TRANSIENT),
+])
+def test_classify_error_status_codes(status, expected):
+    assert classify_error(FakeHTTPError(status)) == expected
+
+
+def test_classify_error_default():
+    assert classify_error(None) == TRANSIENT
+    assert classify_error(None, default=NOT_FOUND) == NOT_FOUND
+    assert classify_error("algo raro", default=UNAVAILABLE) == UNAVAILABLE
+
+
+def test_should_retry_only_retryable_classes():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.should_retry(TRANSIENT, 0)
+    assert policy.should_retry(THROTTLED, 1)
+    assert not policy.should_retry(TRANSIENT, 2)
+    assert not policy.should_retry(UNAVAILABLE, 0)
+    assert not policy.should_retry(NOT_FOUND, 0)
+    assert not policy.should_retry(None, 0)
+
+
+def test_delay_grows_exponentially_with_equal_jitter():
+    random.seed(0)
+    policy = RetryPolicy(base_delay=10, max_delay=1000)
+    for attempt, cap in ((1, 10), (2, 20), (3, 40), (4, 80)):
+        for _ in range(50):
+            assert cap / 2 <= policy.delay(attempt) <= cap
+
+
+def test_delay_doubles_for_throttles_and_respects_max():
+    random.seed(0)
+    policy = RetryPolicy(base_delay=10, max_delay=60)
+    for _ in range(50):
+        assert 10 <= policy.delay(1, THROTTLED) <= 20
+        assert 30 <= policy.delay(10) <= 60
+        assert 30 <= policy.delay(10, THROTTLED) <= 60
+
+
+def test_delay_min_delay():
+    policy = RetryPolicy(base_delay=1, max_delay=2)
+    assert policy.delay(1, min_delay=45) == 45
+
+
+def test_delayed_queue_orders_by_due_time():
+    queue = DelayedQueue()
+    queue.put('later', 0.05)
+    queue.put('now', 0)
+    assert queue.get(timeout=1) == 'now'
+    assert queue.get(timeout=0) is None
+    assert queue.get(timeout=1) == 'later'
+
+
+def test_delayed_queue_close_returns_pending():
+    queue = DelayedQueue()
+    queue.put('a', 60)
+    queue.put('b', 30)
+    start = time.monotonic()
+    assert queue.close() == ['b', 'a']
+    assert queue.get() is None
+    assert time.monotonic() - start < 1
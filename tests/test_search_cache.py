@@ -0,0 +1,76 @@
+"""
+Tests de SearchCache: claves, caducidad (TTL) y expulsión de las menos usadas (LRU)
+"""
+
+import pytest
+
+import search_cache
+from search_cache import SearchCache
+
+DAY = 86400
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(search_cache.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = SearchCache(tmp_path / "search_cache.db", ttl_days=30, max_entries=50)
+    yield cache
+    cache.close()
+
+
+def video(video_id):
+    return {'id': video_id, 'duration': 200}
+
+
+def stored_keys(cache):
+    return {row[0] for row in cache._conn.execute("SELECT key FROM search_cache")}
+
+
+def test_get_by_query_and_track_id(cache):
+    cache.put("Artista - Canción", video('a'), [video('a'), video('b')], track_id="t1")
+
+    assert cache.get("ARTISTA -  Canción!")['video']['id'] == 'a'
+    assert cache.get("otra búsqueda", track_id="t1")['candidates'][1]['id'] == 'b'
+    assert cache.get("otra búsqueda") is None
+    assert cache.get_stats()['hits'] == 2
+    assert cache.get_stats()['misses'] == 1
+
+
+def test_entries_expire_after_ttl(cache, clock):
+    cache.put("Artista - Canción", video('a'), [])
+
+    clock[0] += 29 * DAY
+    assert cache.get("Artista - Canción") is not None
+
+    clock[0] += 2 * DAY
+    assert cache.get("Artista - Canción") is None
+    assert cache.get_stats()['expired'] == 1
+    assert stored_keys(cache) == set()
+
+
+def test_eviction_removes_least_recently_used(cache, clock):
+    for i in range(60):
+        clock[0] += 1
+        cache.put(f"canción {i}", video(str(i)), [])
+
+    # Las 10 primeras se usan ahora: pasan a ser las más recientes
+    for i in range(10):
+        clock[0] += 1
+        assert cache.get(f"canción {i}") is not None
+
+    # La comprobación de tamaño se hace cada 100 inserciones
+    for i in range(60, 100):
+        clock[0] += 1
+        cache.put(f"canción {i}", video(str(i)), [])
+
+    index = stored_keys(cache)
+    assert len(index) == 50
+    assert all(f"query:canción {i}" in index for i in range(10))
+    assert all(f"query:canción {i}" in index for i in range(60, 100))
+    assert not any(f"query:canción {i}" in index for i in range(10, 60))
@@ -0,0 +1,85 @@
+"""
+Tests de staging.publish_file: publicación en el mismo volumen y entre volúmenes (EXDEV)
+"""
+
+import errno
+import os
+
+import pytest
+
+import staging
+
+
+@pytest.fixture
+def cross_device(monkeypatch):
+    """Simula que la carpeta de trabajo está en otro volumen: el primer os.replace falla con EXDEV"""
+    real_replace = os.replace
+    calls = []
+
+    def replace(src, dst):
+        calls.append((src, dst))
+        if len(calls) == 1:
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        return real_replace(src, dst)
+
+    monkeypatch.setattr(staging.os, 'replace', replace)
+    return calls
+
+
+def test_publish_same_device(tmp_path):
+    source = tmp_path / "work" / "song.opus"
+    source.parent.mkdir()
+    source.write_bytes(b"audio")
+    destination = tmp_path / "music" / "Artista" / "song.opus"
+
+    staging.publish_file(source, destination)
+
+    assert destination.read_bytes() == b"audio"
+    assert not source.exists()
+
+
+def test_publish_cross_device_copies_through_temp_file(tmp_path, cross_device):
+    source = tmp_path / "work" / "song.opus"
+    source.parent.mkdir()
+    content = os.urandom(3 * 1024 * 1024 + 7)
+    source.write_bytes(content)
+    os.utime(source, (1_000_000, 1_000_000))
+    destination = tmp_path / "music" / "song.opus"
+
+    staging.publish_file(source, destination)
+
+    assert destination.read_bytes() == content
+    assert not source.exists()
+    assert destination.stat().st_mtime == 1_000_000
+    # El renombrado final se hace desde un archivo oculto junto al destino
+    temp = cross_device[1][0]
+    assert temp.parent == destination.parent and temp.name.startswith(".song.opus.")
+    assert [f.name for f in destination.parent.iterdir()] == ["song.opus"]
+
+
+def test_publish_cross_device_cleans_up_on_failure(tmp_path, cross_device, monkeypatch):
+    source = tmp_path / "song.opus"
+    source.write_bytes(b"audio")
+    destination = tmp_path / "music" / "song.opus"
+
+    def broken_copy(*args, **kwargs):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(staging.shutil, 'copyfileobj', broken_copy)
+
+    with pytest.raises(OSError):
+        staging.publish_file(source, destination)
+    assert list(destination.parent.iterdir()) == []
+    assert source.exists()
+
+
+def test_publish_other_errors_are_raised(tmp_path, monkeypatch):
+    def replace(src, dst):
+        raise OSError(errno.EACCES, "Permission denied")
+
+    monkeypatch.setattr(staging.os, 'replace', replace)
+    source = tmp_path / "song.opus"
+    source.write_bytes(b"audio")
+
+    with pytest.raises(PermissionError):
+        staging.publish_file(source, tmp_path / "music" / "song.opus")
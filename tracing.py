@@ -0,0 +1,308 @@
+"""
+Tracing
+Spans por etapa y canción, perfilado opcional y resumen de dónde se va el tiempo
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+# Perfiladores disponibles para RunProfiler
+PROFILE_MODES = ('cprofile', 'sample')
+
+# Spans guardados como máximo (los resúmenes siguen contando todos)
+MAX_SPANS = 200_000
+
+# Módulos donde un hilo está parado esperando (no cuentan en el top de muestras)
+IDLE_MODULES = ('threading.py', 'queue.py', 'selectors.py', 'socketserver.py')
+
+
+class Tracer:
+    """
+    Registro de spans (etapa, canción, inicio y duración)
+
+    Cada hilo lleva la canción en curso (bind), así las etapas de una misma
+    canción quedan agrupadas aunque en el pipeline las ejecuten hilos
+    distintos. Los spans se pueden exportar en formato Chrome Trace
+    (chrome://tracing o Perfetto) y resumir por etapa.
+    """
+
+    def __init__(self, max_spans: int = MAX_SPANS):
+        """
+        Args:
+            max_spans: Spans guardados con detalle para el archivo de traza
+        """
+        self.max_spans = max_spans
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._spans: List[Dict] = []
+        self._durations: Dict[str, List[float]] = {}
+        self.dropped = 0
+
+    @contextmanager
+    def bind(self, trace_id: str) -> Iterator[None]:
+        """Asocia los spans del hilo actual a una canción mientras dure el bloque"""
+        previous = getattr(self._local, 'trace_id', None)
+        self._local.trace_id = trace_id
+        try:
+            yield
+        finally:
+            self._local.trace_id = previous
+
+    def record(self, name: str, duration: float, end: Optional[float] = None, **attrs):
+        """
+        Registra un span ya medido (p.ej. en otro proceso)
+
+        Args:
+            name: Etapa
+            duration: Duración en segundos
+            end: Final del span (time.perf_counter; por defecto, ahora)
+        """
+        end = time.perf_counter() if end is None else end
+        self._add(name, end - duration, duration, attrs)
+
+    def _add(self, name: str, start: float, duration: float, attrs: Dict):
+        span = {
+            'name': name,
+            'trace_id': getattr(self._local, 'trace_id', None),
+            'thread': threading.current_thread().name,
+            'start': start - self._origin,
+            'duration': duration,
+        }
+        if attrs:
+            span['attrs'] = attrs
+
+        with self._lock:
+            self._durations.setdefault(name, []).append(duration)
+            if len(self._spans) < self.max_spans:
+                self._spans.append(span)
+            else:
+                self.dropped += 1
+
+    # ------------------------------------------------------------------
+    # Resumen y exportación
+    # ------------------------------------------------------------------
+
+    def summary(self) -> List[Dict]:
+        """
+        Estadísticas por etapa ordenadas por tiempo total
+
+        Returns:
+            Lista de diccionarios con stage, count, total, mean, p50, p95 y max
+        """
+        with self._lock:
+            durations = {name: sorted(values) for name, values in self._durations.items()}
+
+        def pct(values, p):
+            return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+        rows = [
+            {
+                'stage': name,
+                'count': len(values),
+                'total': sum(values),
+                'mean': sum(values) / len(values),
+                'p50': pct(values, 50),
+                'p95': pct(values, 95),
+                'max': values[-1],
+            }
+            for name, values in durations.items() if values
+        ]
+        rows.sort(key=lambda r: r['total'], reverse=True)
+        return rows
+
+    def format_summary(self, top: int = 10) -> List[str]:
+        """Tabla de texto con las etapas más costosas (por total y por p95)"""
+        rows = self.summary()
+        if not rows:
+            return []
+
+        lines = [f"{'Etapa':<14}{'N':>7}{'Total':>11}{'Media':>10}{'p50':>10}{'p95':>10}{'Máx':>10}"]
+        for r in rows[:top]:
+            lines.append(
+                f"{r['stage']:<14}{r['count']:>7}{r['total']:>10.1f}s{r['mean']:>9.2f}s"
+                f"{r['p50']:>9.2f}s{r['p95']:>9.2f}s{r['max']:>9.2f}s"
+            )
+
+        slowest = max(rows, key=lambda r: r['p95'])
+        lines.append(f"Mayor p95: {slowest['stage']} ({slowest['p95']:.2f}s)")
+        return lines
+
+    def write_chrome_trace(self, path: Path):
+        """Guarda los spans en formato Chrome Trace (JSON)"""
+        with self._lock:
+            spans = list(self._spans)
+
+        threads = {}
+        events = []
+        for span in spans:
+            tid = threads.setdefault(span['thread'], len(threads) + 1)
+            args = dict(span.get('attrs', {}))
+            if span['trace_id']:
+                args['song'] = span['trace_id']
+            events.append({
+                'name': span['name'],
+                'cat': 'stage',
+                'ph': 'X',
+                'ts': round(span['start'] * 1e6),
+                'dur': round(span['duration'] * 1e6),
+                'pid': 1,
+                'tid': tid,
+                'args': args,
+            })
+        for name, tid in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': name}})
+
+        Path(path).write_text(json.dumps({'traceEvents': events}), encoding='utf-8')
+
+
+class RunProfiler:
+    """
+    Perfilado opcional de una ejecución completa
+
+    - cprofile: cProfile de todas las funciones llamadas en el hilo principal
+      (toda la ejecución en modo secuencial)
+    - sample: muestreo periódico de las pilas de todos los hilos (incluido el
+      pipeline) con un coste casi nulo; genera pilas "colapsadas" para
+      flamegraph.pl o speedscope
+    """
+
+    def __init__(self, mode: str = 'cprofile', interval: float = 0.005):
+        """
+        Args:
+            mode: "cprofile" o "sample"
+            interval: Segundos entre muestras (modo sample)
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Modo de perfilado no soportado: {mode}")
+        self.mode = mode
+        self.interval = interval
+
+        self._profile = None
+        self._stacks = Counter()
+        self._samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> 'RunProfiler':
+        if self.mode == 'cprofile':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._thread = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._profile:
+            self._profile.disable()
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                thread_name = names.get(ident, str(ident)).rsplit('-', 1)[0]
+                self._stacks[(thread_name,) + tuple(reversed(stack))] += 1
+            self._samples += 1
+
+    def top_lines(self, limit: int = 15) -> List[str]:
+        """Funciones con más tiempo (cumulativo en cprofile, muestras propias en sample)"""
+        if self._profile:
+            buffer = io.StringIO()
+            pstats.Stats(self._profile, stream=buffer).sort_stats('cumulative').print_stats(limit)
+            return buffer.getvalue().strip().splitlines()
+
+        # Los hilos parados en colas/locks dominarían el top: se cuentan aparte
+        own = Counter()
+        idle = 0
+        for stack, count in self._stacks.items():
+            if any(f"({module}:" in stack[-1] for module in IDLE_MODULES):
+                idle += count
+            else:
+                own[stack[-1]] += count
+        total = sum(own.values()) or 1
+        lines = [f"{count / total * 100:5.1f}%  {frame}" for frame, count in own.most_common(limit)]
+        lines.append(f"({self._samples} muestras; {idle} pilas de hilos en espera excluidas)")
+        return lines
+
+    def write(self, base_path: Path) -> Path:
+        """
+        Guarda el perfil junto a base_path
+
+        Returns:
+            .prof (cprofile, para snakeviz/pstats) o .folded (sample, pilas colapsadas)
+        """
+        if self._profile:
+            path = Path(base_path).with_suffix('.prof')
+            self._profile.dump_stats(str(path))
+            return path
+
+        path = Path(base_path).with_suffix('.folded')
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self._stacks.most_common():
+                f.write(";".join(frame.replace(';', ',') for frame in stack) + f" {count}\n")
+        return path
+
+
+def write_run_report(tracer: Tracer, directory: Path, profiler: Optional[RunProfiler] = None,
+                     top: int = 10) -> Dict[str, Path]:
+    """
+    Escribe el resumen de la ejecución en `directory`
+
+    Args:
+        tracer: Spans de la ejecución
+        directory: Carpeta de informes (p.ej. data/traces)
+        profiler: Perfil de la ejecución (opcional)
+        top: Etapas a incluir en el resumen de texto
+
+    Returns:
+        Rutas escritas: summary (texto), trace (Chrome Trace) y profile si lo hay
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    base = directory / f"run-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+
+    lines = ["Resumen por etapa (ordenado por tiempo total)", ""]
+    lines += tracer.format_summary(top)
+    if tracer.dropped:
+        lines.append(f"({tracer.dropped} spans no guardados en la traza; el resumen sí los incluye)")
+
+    paths = {'summary': base.with_suffix('.txt'), 'trace': base.with_suffix('.trace.json')}
+
+    if profiler:
+        paths['profile'] = profiler.write(base)
+        lines += ["", f"Perfil ({profiler.mode}):", ""] + profiler.top_lines()
+
+    paths['summary'].write_text("\n".join(lines) + "\n", encoding='utf-8')
+    tracer.write_chrome_trace(paths['trace'])
+    return paths
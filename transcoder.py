@@ -0,0 +1,138 @@
+"""
+Transcoder
+Conversión a MP3 en un grupo de procesos independiente de las descargas
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from staging import publish_file
+
+
+def transcode_file(source: str, destination: str, bitrate: str = "320k",
+                   ffmpeg: str = "ffmpeg") -> Dict:
+    """
+    Convierte un archivo de audio a MP3 con FFmpeg (se ejecuta en otro proceso)
+
+    El resultado se escribe primero junto al origen (en la carpeta de trabajo)
+    y después se publica en el destino, así nunca queda un MP3 a medias en la
+    biblioteca aunque la carpeta de trabajo esté en otro volumen.
+
+    Args:
+        source: Archivo descargado (webm, m4a...)
+        destination: Ruta final del MP3
+        bitrate: Bitrate de salida
+        ffmpeg: Ejecutable de FFmpeg
+
+    Returns:
+        Diccionario con ok, seconds y error
+    """
+    start = time.perf_counter()
+    temp_output = str(Path(source).with_suffix('.transcoding.mp3'))
+
+    cmd = [
+        ffmpeg, '-y', '-loglevel', 'error', '-i', source,
+        '-vn', '-codec:a', 'libmp3lame', '-b:a', bitrate, temp_output
+    ]
+
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            error = result.stderr.decode('utf-8', errors='replace').strip()
+            return {'ok': False, 'seconds': time.perf_counter() - start, 'error': error[-300:]}
+
+        publish_file(Path(temp_output), Path(destination))
+        return {'ok': True, 'seconds': time.perf_counter() - start, 'error': None}
+
+    except Exception as e:
+        return {'ok': False, 'seconds': time.perf_counter() - start, 'error': str(e)}
+
+
+class TranscodePool:
+    """
+    Grupo de procesos para convertir a MP3 sin bloquear las descargas
+
+    La etapa de descarga entrega la ruta del archivo y sigue con la siguiente
+    canción; la conversión ocurre en paralelo en tantos procesos como núcleos.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, bitrate: str = "320k",
+                 ffmpeg: Optional[str] = None):
+        """
+        Inicializa el grupo de procesos
+
+        Args:
+            max_workers: Procesos de conversión (por defecto, número de CPUs)
+            bitrate: Bitrate del MP3
+            ffmpeg: Ruta de FFmpeg (por defecto, el del PATH)
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.bitrate = bitrate
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg') or 'ffmpeg'
+
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.encode_times: List[float] = []
+        self.failed = 0
+
+    def submit(self, source: Path, destination: Path) -> Future:
+        """
+        Encola una conversión
+
+        Args:
+            source: Archivo descargado
+            destination: Ruta final del MP3
+
+        Returns:
+            Future con el diccionario de resultado de transcode_file
+        """
+        with self._lock:
+            self._pending += 1
+
+        future = self._executor.submit(
+            transcode_file, str(source), str(destination), self.bitrate, self.ffmpeg
+        )
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+            try:
+                result = future.result()
+            except Exception:
+                self.failed += 1
+                return
+            if result['ok']:
+                self.encode_times.append(result['seconds'])
+            else:
+                self.failed += 1
+
+    @property
+    def queue_depth(self) -> int:
+        """Conversiones encoladas o en curso"""
+        with self._lock:
+            return self._pending
+
+    def get_stats(self) -> Dict:
+        """Profundidad de cola y tiempos de conversión"""
+        with self._lock:
+            times = list(self.encode_times)
+            return {
+                'queue_depth': self._pending,
+                'encoded': len(times),
+                'failed': self.failed,
+                'avg_encode_time': (sum(times) / len(times)) if times else 0.0,
+                'total_encode_time': sum(times),
+            }
+
+    def shutdown(self):
+        """Espera a las conversiones pendientes y cierra los procesos"""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,87 @@
+"""
+YoutubeDL Pool
+Instancias de yt-dlp reutilizables entre canciones
+"""
+
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+import yt_dlp
+
+
+class YoutubeDLPool:
+    """
+    Mantiene instancias YoutubeDL de larga duración
+
+    Crear un YoutubeDL implica cargar extractores y procesar todas las
+    opciones; en lugar de hacerlo en cada canción, cada hilo (worker) obtiene
+    su propia instancia por configuración ("search", "download") y la reutiliza
+    durante todo el lote. Las instancias no se comparten entre hilos.
+    """
+
+    def __init__(self, configs: Dict[str, Dict]):
+        """
+        Inicializa el pool
+
+        Args:
+            configs: Opciones de yt-dlp por nombre de configuración
+        """
+        self.configs = configs
+        self.created = 0
+
+        self._local = threading.local()
+        self._instances: List[yt_dlp.YoutubeDL] = []
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> yt_dlp.YoutubeDL:
+        """
+        Obtiene la instancia del hilo actual para una configuración
+
+        Args:
+            name: Nombre de la configuración ("search" o "download")
+
+        Returns:
+            Instancia YoutubeDL lista para usar
+        """
+        instances = getattr(self._local, 'instances', None)
+        if instances is None:
+            instances = self._local.instances = {}
+
+        ydl = instances.get(name)
+        if ydl is None:
+            ydl = yt_dlp.YoutubeDL(dict(self.configs[name]))
+            instances[name] = ydl
+            with self._lock:
+                self._instances.append(ydl)
+                self.created += 1
+
+        return ydl
+
+    def get_downloader(self, output_dir: Path, name: str = 'download') -> yt_dlp.YoutubeDL:
+        """
+        Obtiene la instancia de descarga apuntando a una carpeta concreta
+
+        yt-dlp lee el parámetro "paths" en cada descarga, así que basta con
+        cambiarlo en la instancia del hilo en lugar de crear una nueva.
+
+        Args:
+            output_dir: Carpeta donde se guardarán los archivos descargados
+            name: Configuración de descarga a usar
+        """
+        ydl = self.get(name)
+        ydl.params['paths'] = {'home': str(output_dir)}
+        return ydl
+
+    def close(self):
+        """Cierra todas las instancias creadas"""
+        with self._lock:
+            instances, self._instances = self._instances, []
+
+        for ydl in instances:
+            try:
+                ydl.close()
+            except Exception:
+                pass
+
+        self._local = threading.local()
@@ -3,40 +3,108 @@ YouTube Audio Downloader
 Módulo para descargar audio de YouTube a partir de nombres de canciones
 """
 
-import os
 import re
+import base64
 import time
-import random
-import json
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import Any, Callable, Iterable, Iterator, List, Dict, Optional, Tuple
 from datetime import datetime
-import yt_dlp
 from mutagen.mp3 import MP3
-from mutagen.id3 import ID3, TIT2, TPE1, APIC
-from mutagen.mp4 import MP4, MP4Cover
-import requests
+from mutagen.id3 import ID3, TIT2, TPE1, TXXX, APIC
+from mutagen.mp4 import MP4, MP4Cover, MP4FreeForm
+from mutagen.oggopus import OggOpus
+from mutagen.oggvorbis import OggVorbis
+from mutagen.flac import Picture
 from tqdm import tqdm
 
+from artwork_cache import ArtworkCache
+from candidate_scoring import CandidateScorer, format_ranking
+from download_pipeline import DownloadPipeline, SongJob
+from failure_registry import FailureRegistry
+from job_journal import JobJournal
+from library_index import LibraryIndex, AUDIO_EXTENSIONS, TRACK_ID_TAG
+from metrics import Metrics
+from rate_controller import AdaptiveController, ControllerLogger, is_throttle_error
+from retry_engine import (DelayedQueue, RetryPolicy, PERMANENT_CLASSES, NOT_FOUND, THROTTLED,
+                          TRANSIENT, UNAVAILABLE, classify_error)
+from search_cache import SearchCache
+from staging import StagingArea, publish_file
+from tracing import Tracer
+from state_store import StateStore
+from ydl_pool import YoutubeDLPool
+
+
+# Formatos de salida: "mp3" recodifica; "opus" y "m4a" conservan el audio original de YouTube
+AUDIO_FORMATS = {
+    'mp3': {
+        'format': 'bestaudio/best',
+        'codec': 'mp3',
+        'quality': '320',
+        'ext': '.mp3',
+    },
+    'opus': {
+        # Opus dentro de WebM se remuxea a Ogg sin recodificar
+        'format': 'bestaudio[acodec=opus]/bestaudio',
+        'codec': 'opus',
+        'quality': None,
+        'ext': '.opus',
+    },
+    'm4a': {
+        # AAC dentro de M4A se copia tal cual
+        'format': 'bestaudio[ext=m4a]/bestaudio',
+        'codec': 'm4a',
+        'quality': None,
+        'ext': '.m4a',
+    },
+}
+
+# Tamaño del registro de puntuaciones antes de rotarlo (search_scores.log.1)
+SCORE_LOG_MAX_BYTES = 5 * 1024 * 1024
+
+# Alternativas a probar si falla la descarga del video elegido (y puntuación mínima)
+MAX_FALLBACK_CANDIDATES = 2
+MIN_FALLBACK_SCORE = 0
+
+# Motivo de una descarga fallida según la clase de error
+DOWNLOAD_FAILURES = {
+    UNAVAILABLE: "Error en descarga (video no disponible o restringido)",
+    THROTTLED: "Error en descarga (bloqueo temporal de YouTube)",
+    TRANSIENT: "Error en descarga (archivo corrupto o bloqueado)",
+}
+
 
 class YouTubeAudioDownloader:
     """Descargador de audio desde YouTube con detección inteligente"""
     
-    def __init__(self, output_dir: str = "music", min_delay: float = 0.5, max_delay: float = 3.0):
+    def __init__(self, output_dir: str = "music", min_delay: float = 0.5, max_delay: float = 3.0,
+                 use_search_cache: bool = True, audio_format: str = "mp3",
+                 staging_dir: Optional[str] = None):
         """
         Inicializa el descargador
         
         Args:
             output_dir: Directorio base donde se guardarán las canciones
-            min_delay: Tiempo mínimo de espera entre descargas (segundos)
-            max_delay: Tiempo máximo de espera entre descargas (segundos)
+            min_delay: Tiempo mínimo entre descargas (segundos): fija la tasa máxima
+            max_delay: Tiempo máximo entre descargas (segundos): fija la tasa mínima
+            use_search_cache: Reutilizar búsquedas anteriores guardadas en disco
+            audio_format: "mp3" (320 kbps) u "opus"/"m4a" (sin recodificar)
+            staging_dir: Carpeta de trabajo para las descargas en curso, p.ej. un
+                         tmpfs como /dev/shm (por defecto, music/.staging)
         """
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Formato de audio no soportado: {audio_format}")
+        self.audio_format = audio_format
+        self.output_ext = AUDIO_FORMATS[audio_format]['ext']
+
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
         
-        # Configuración de delays variables para simular comportamiento humano
+        # Los delays definen los límites del control de tasa adaptativo
         self.min_delay = min_delay
         self.max_delay = max_delay
+        self.controller = AdaptiveController.from_delays(min_delay, max_delay)
         
         # Archivos de datos
         self.data_dir = Path("data")
@@ -44,19 +112,62 @@ class YouTubeAudioDownloader:
         self.blacklist_file = self.data_dir / "blacklist.json"
         self.download_history_file = self.data_dir / "download_history.json"
         
-        # Cargar listas
-        self.blacklist = self._load_blacklist()
+        # Estado persistente en SQLite (migra los antiguos JSON la primera vez)
+        self.state = StateStore(self.data_dir / "state.db")
+        if self.state.is_empty():
+            self.state.migrate_from_json(self.blacklist_file, self.download_history_file)
+        
+        # Caché de búsquedas de YouTube (evita repetir ytsearch en re-ejecuciones)
+        self.search_cache = SearchCache(self.data_dir / "search_cache.db") if use_search_cache else None
+        
+        # Índice de la biblioteca en disco (evita un stat por canción)
+        self.library = LibraryIndex(self.output_dir, self.data_dir / "library_index.db")
+        
+        # Carpeta de trabajo aislada por descarga (fuera del índice de la biblioteca)
+        self.staging = StagingArea(Path(staging_dir) if staging_dir else self.output_dir / ".staging")
+        
+        # Caché de carátulas con sesión HTTP compartida (keep-alive)
+        self.artwork_cache = ArtworkCache(self.data_dir / "artwork")
+        self.artwork_cache.controller = self.controller
+        
+        # Fallos por track_id (o artista/canción) con bloqueo temporal
+        self.failures = FailureRegistry(self.state)
+        
+        # Cargar historial
         self.download_history = self._load_download_history()
         
-        # Estadísticas de descarga
+        # Índice global: cada track_id de Spotify se resuelve y descarga una sola vez
+        self.track_index = self.state.load_track_index()
+        
+        # Lock para modificar listas/estadísticas desde varios hilos (modo pipeline)
+        self._lock = threading.RLock()
+        
+        # Diario del lote en curso (permite reanudarlo si el proceso se corta)
+        self.journal: Optional[JobJournal] = None
+        
+        # Canciones fallidas de la ejecución (para el resumen)
         self.download_stats = {
-            'bytes_downloaded': 0,
-            'start_time': None,
             'failed_songs': []
         }
         
+        # Métricas agregadas (bytes, velocidad, latencias por etapa, errores)
+        self.metrics = Metrics()
+        if self.search_cache:
+            self.metrics.add_collector('search_cache', self.search_cache.get_stats)
+        self.metrics.add_collector('artwork_cache', self.artwork_cache.get_stats)
+        self.metrics.add_collector('rate_controller', self.controller.get_stats)
+        
+        # Spans por etapa y canción (resumen de dónde se va el tiempo)
+        self.tracer = Tracer()
+        self._phases = threading.local()
+        self.controller.wait_observer = self._observe_rate_wait
+        
+        # Reintentos de fallos transitorios y último error de cada hilo (para clasificarlo)
+        self.retry_policy = RetryPolicy()
+        self._errors = threading.local()
+        
         # Palabras clave a evitar en los resultados
-        self.blacklist = [
+        self.blocked_keywords = [
             'remix', 'mix', 'mashup', 'cover', 'karaoke',
             'instrumental', 'acoustic', 'live', 'concert',
             'reaction', 'tutorial', 'how to', 'speedup',
@@ -64,14 +175,27 @@ class YouTubeAudioDownloader:
             'nightcore', 'bass boosted', 'extended', 'hour'
         ]
         
+        # Puntuación de candidatos (los términos se compilan una sola vez)
+        self.scorer = CandidateScorer(self.blocked_keywords)
+        self.score_log_file = self.data_dir / "search_scores.log"
+        if self.score_log_file.exists() and self.score_log_file.stat().st_size > SCORE_LOG_MAX_BYTES:
+            self.score_log_file.replace(self.score_log_file.with_suffix('.log.1'))
+        
+        # Duración en Spotify por track_id (la rellena el extractor al leer las playlists)
+        self.track_durations: Dict[str, float] = {}
+        
         # Configuración de yt-dlp con hook para velocidad
+        fmt = AUDIO_FORMATS[audio_format]
+        extract_audio = {
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': fmt['codec'],
+        }
+        if fmt['quality']:
+            extract_audio['preferredquality'] = fmt['quality']
+        
         self.ydl_opts = {
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '320',
-            }],
+            'format': fmt['format'],
+            'postprocessors': [extract_audio],
             'outtmpl': '%(title)s.%(ext)s',
             'quiet': True,
             'no_warnings': True,
@@ -81,81 +205,204 @@ class YouTubeAudioDownloader:
             'geo_bypass': True,
             'age_limit': None,
             'progress_hooks': [self._download_progress_hook],
+            'postprocessor_hooks': [self._postprocessor_hook],
+            # Los 429/403 llegan como mensajes: el controlador los usa para frenar
+            'logger': ControllerLogger(self.controller, on_error=self._note_error),
+            # Reanudar los .part que quedaron de un intento anterior
+            'continuedl': True,
+        }
+        
+        # Configuración de búsqueda (solo metadatos, sin descargar)
+        self.search_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': True,
+            'force_generic_extractor': False,
+            'logger': ControllerLogger(self.controller, on_error=self._note_error),
         }
+        
+        # Descarga sin FFmpeg (la conversión se hace aparte, ver transcoder.py)
+        self.ydl_raw_opts = {k: v for k, v in self.ydl_opts.items() if k != 'postprocessors'}
+        
+        # Instancias de yt-dlp reutilizables (una por hilo y configuración)
+        self.ydl_pool = YoutubeDLPool({
+            'search': self.search_opts,
+            'download': self.ydl_opts,
+            'download_raw': self.ydl_raw_opts,
+        })
     
     def _download_progress_hook(self, d):
-        """Hook para capturar estadísticas de descarga"""
-        if d['status'] == 'downloading':
-            if 'downloaded_bytes' in d:
-                self.download_stats['bytes_downloaded'] = d['downloaded_bytes']
-    
-    def _load_blacklist(self) -> Dict:
-        """Carga la lista negra de canciones fallidas"""
-        if self.blacklist_file.exists():
-            try:
-                with open(self.blacklist_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
+        """Hook para capturar estadísticas de descarga (bytes acumulados de todos los archivos)"""
+        if d['status'] not in ('downloading', 'finished'):
+            return
+        
+        downloaded = d.get('downloaded_bytes', d.get('total_bytes'))
+        if downloaded is None:
+            return
+        
+        # yt-dlp da el contador del archivo actual; la clave distingue archivos entre hilos
+        key = d.get('tmpfilename') or d.get('filename') or str(threading.get_ident())
+        self.metrics.progress(key, downloaded, finished=d['status'] == 'finished')
+        
+        # Fases de la descarga: resolución de formatos hasta el primer byte, luego transferencia
+        phases = self._phases
+        now = time.perf_counter()
+        if getattr(phases, 'transfer_start', None) is None and getattr(phases, 'start', None) is not None:
+            self._record_stage('resolve', now - phases.start)
+            phases.transfer_start = now
+        if d['status'] == 'finished' and getattr(phases, 'transfer_start', None) is not None:
+            self._record_stage('transfer', now - phases.transfer_start)
+            phases.transfer_start = None
+            phases.start = None
+    
+    def _postprocessor_hook(self, d):
+        """Hook de yt-dlp que mide cada postprocesado (FFmpeg)"""
+        if d.get('status') == 'started':
+            self._phases.postprocess_start = time.perf_counter()
+        elif d.get('status') == 'finished' and getattr(self._phases, 'postprocess_start', None):
+            self._record_stage('ffmpeg', time.perf_counter() - self._phases.postprocess_start,
+                               postprocessor=d.get('postprocessor'))
+            self._phases.postprocess_start = None
+    
+    def _record_stage(self, stage: str, seconds: float, **attrs):
+        """Registra la duración de una etapa en las métricas y en la traza"""
+        self.metrics.observe_stage(stage, seconds)
+        self.tracer.record(stage, seconds, **attrs)
+    
+    @contextmanager
+    def _stage(self, stage: str):
+        """Mide un bloque como etapa (métricas + span de la canción en curso)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record_stage(stage, time.perf_counter() - start)
+    
+    def _observe_rate_wait(self, seconds: float):
+        """Tiempo esperado por el control de tasa antes de una petición"""
+        if seconds >= 0.001:
+            self._record_stage('rate_wait', seconds)
+    
+    @contextmanager
+    def _download_phases(self):
+        """Delimita una llamada a ydl.download para separar resolución y transferencia"""
+        phases = self._phases
+        phases.start = time.perf_counter()
+        phases.transfer_start = None
+        try:
+            yield
+        finally:
+            # Si yt-dlp no avisó del final, cerrar la transferencia al volver
+            if phases.transfer_start is not None:
+                self._record_stage('transfer', time.perf_counter() - phases.transfer_start)
+            phases.start = None
+            phases.transfer_start = None
+    
+    def _run_counters(self) -> Dict[str, float]:
+        """Contadores acumulados que se guardan como rendimiento de una ejecución"""
+        snapshot = self.metrics.to_dict()
+        search = snapshot['stages'].get('search', {})
+        return {
+            'downloaded': snapshot['songs']['downloaded'],
+            'searches': search.get('count', 0),
+            'search_seconds': search.get('sum', 0.0),
+        }
     
-    def _save_blacklist(self):
-        """Guarda la lista negra"""
-        with open(self.blacklist_file, 'w', encoding='utf-8') as f:
-            json.dump(self.blacklist, f, indent=2, ensure_ascii=False)
+    def _record_run(self, mode: str, before: Dict[str, float], elapsed: float):
+        """
+        Guarda el rendimiento de una ejecución (lo usa el planificador para estimar)
+        
+        Args:
+            mode: "sequential" o "pipeline"
+            before: _run_counters() al empezar
+            elapsed: Duración de la ejecución (segundos)
+        """
+        after = self._run_counters()
+        delta = {name: after[name] - before[name] for name in after}
+        # Sin descargas no hay nada que medir (todo existía o falló)
+        if delta['downloaded'] > 0:
+            self.state.record_run(mode, self.audio_format, elapsed=elapsed, **delta)
     
     def _load_download_history(self) -> Dict:
         """Carga el historial de descargas por playlist"""
-        if self.download_history_file.exists():
-            try:
-                with open(self.download_history_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
+        return self.state.load_history()
     
     def _save_download_history(self):
-        """Guarda el historial de descargas"""
-        with open(self.download_history_file, 'w', encoding='utf-8') as f:
-            json.dump(self.download_history, f, indent=2, ensure_ascii=False)
+        """Guarda el historial de descargas completo"""
+        with self._lock:
+            self.state.replace_history(self.download_history)
     
-    def _add_to_blacklist(self, artist: str, song: str, reason: str):
-        """Agrega una canción a la lista negra después de 3 intentos"""
-        key = f"{artist} - {song}"
+    def _record_failure(self, artist: str, song: str, reason: str, error_class: str = TRANSIENT,
+                        track_id: Optional[str] = None):
+        """
+        Registra una canción fallida en las estadísticas
         
-        if key not in self.blacklist:
-            self.blacklist[key] = {
+        Solo los fallos permanentes (video no disponible, no encontrado) cuentan
+        para la lista negra: un timeout o un bloqueo no dicen nada de la canción.
+        """
+        with self._lock:
+            if error_class in PERMANENT_CLASSES:
+                entry = self.failures.record(artist, song, reason, track_id)
+                if entry.get('blacklisted'):
+                    until = self.failures.blocked_until(entry)
+                    retry = "" if until == datetime.max else f" (se reintentará el {until:%d/%m/%Y})"
+                    print(f"  ⛔ Canción agregada a lista negra tras {entry['attempts']} intentos fallidos{retry}")
+            self.download_stats['failed_songs'].append({
                 'artist': artist,
                 'song': song,
-                'attempts': 1,
-                'last_error': reason,
-                'last_attempt': datetime.now().isoformat()
+                'reason': reason,
+                'error_class': error_class
+            })
+    
+    def _update_download_history(self, playlist_id: str, track_ids: List[str]):
+        """Actualiza el historial de una playlist"""
+        with self._lock:
+            self.download_history[playlist_id] = {
+                'track_ids': track_ids,
+                'last_update': datetime.now().isoformat(),
+                'total_tracks': len(track_ids)
             }
-        else:
-            self.blacklist[key]['attempts'] += 1
-            self.blacklist[key]['last_error'] = reason
-            self.blacklist[key]['last_attempt'] = datetime.now().isoformat()
+            self.state.save_playlist(playlist_id, self.download_history[playlist_id])
+    
+    def _merge_download_history(self, playlist_id: str, track_ids: List[str]):
+        """
+        Añade canciones al historial de una playlist sin perder las ya registradas
         
-        # Si llega a 3 intentos, marcar como bloqueada
-        if self.blacklist[key]['attempts'] >= 3:
-            self.blacklist[key]['blacklisted'] = True
-            print(f"  ⛔ Canción agregada a lista negra después de 3 intentos fallidos")
+        El historial solo debe recibir las canciones que quedaron en la biblioteca
+        (descargadas o ya existentes): las que fallaron no se registran, así que la
+        siguiente actualización de la playlist vuelve a intentarlas.
         
-        self._save_blacklist()
-    
-    def _is_blacklisted(self, artist: str, song: str) -> bool:
-        """Verifica si una canción está en la lista negra"""
-        key = f"{artist} - {song}"
-        return key in self.blacklist and self.blacklist[key].get('blacklisted', False)
+        Args:
+            playlist_id: ID de la playlist
+            track_ids: track_ids a añadir, en orden
+        """
+        previous = self.download_history.get(playlist_id, {}).get('track_ids', [])
+        known = set(previous)
+        merged = list(previous)
+        for track_id in track_ids:
+            if track_id and track_id not in known:
+                known.add(track_id)
+                merged.append(track_id)
+        self._update_download_history(playlist_id, merged)
     
-    def _update_download_history(self, playlist_id: str, track_ids: List[str]):
-        """Actualiza el historial de una playlist"""
-        self.download_history[playlist_id] = {
-            'track_ids': track_ids,
-            'last_update': datetime.now().isoformat(),
-            'total_tracks': len(track_ids)
-        }
-        self._save_download_history()
+    def _record_download(self, artist: str, song: str, track_id: Optional[str],
+                         output_path: Path, video_info: Optional[Dict] = None):
+        """Registra una descarga exitosa en el estado persistente y en el índice"""
+        self.library.add(
+            output_path, track_id,
+            duration=video_info.get('duration') if video_info else None
+        )
+        video_id = video_info['id'] if video_info else None
+        self.state.record_download(
+            f"{artist} - {song}", artist, song,
+            track_id=track_id,
+            file_path=str(output_path),
+            video_id=video_id
+        )
+        if track_id:
+            with self._lock:
+                self.track_index[track_id] = {'video_id': video_id, 'file_path': str(output_path)}
+        self.failures.forget(artist, song, track_id)
     
     def _get_new_tracks(self, playlist_id: str, current_tracks: List[Tuple[str, str, str]]) -> List[Tuple[str, str, str]]:
         """Obtiene solo las canciones nuevas de una playlist"""
@@ -171,43 +418,48 @@ class YouTubeAudioDownloader:
         ]
         
         return new_tracks
-    
+
+    def _get_playlist_tracks(self, extractor, playlist_id: str,
+                             info: Optional[Dict] = None) -> Tuple[List[Tuple[str, str, str]], bool]:
+        """
+        Obtiene el listado de una playlist reutilizando el guardado si no cambió
+
+        Compara el snapshot_id actual de Spotify (una llamada de metadatos) con
+        el guardado; si coincide, devuelve el listado guardado sin pedir todas
+        las páginas de canciones.
+
+        Args:
+            extractor: Instancia de SpotifyPlaylistExtractor
+            playlist_id: ID de la playlist
+            info: Información ya obtenida con get_playlist_info (opcional)
+
+        Returns:
+            Tupla (lista de (track_id, artista, canción), True si se descargó de nuevo)
+        """
+        if info is None:
+            info = extractor.get_playlist_info(playlist_id)
+
+        snapshot_id = info.get('snapshot_id') if info else None
+        cached = self.state.get_snapshot(playlist_id)
+
+        if snapshot_id and cached and cached['snapshot_id'] == snapshot_id:
+            return cached['tracks'], False
+
+        tracks = extractor.get_all_tracks(playlist_id)
+        self.track_durations.update(getattr(extractor, 'track_durations', {}))
+        if tracks and snapshot_id:
+            self.state.save_snapshot(playlist_id, snapshot_id, tracks)
+
+        return tracks, True
+
     def get_download_speed(self) -> str:
-        """Calcula la velocidad de descarga"""
-        if self.download_stats['start_time'] and self.download_stats['bytes_downloaded'] > 0:
-            elapsed = time.time() - self.download_stats['start_time']
-            if elapsed > 0:
-                speed_mbps = (self.download_stats['bytes_downloaded'] / 1024 / 1024) / elapsed
-                return f"{speed_mbps:.2f} MB/s"
-        return "Calculando..."
-    
-    def _human_delay(self):
-        """
-        Espera un tiempo aleatorio para simular comportamiento humano
-        
-        Incluye variaciones naturales:
-        - 70% del tiempo: delay normal (min_delay a max_delay)
-        - 20% del tiempo: delay corto (para simular rapidez ocasional)
-        - 10% del tiempo: delay largo (para simular distracciones)
-        """
-        rand = random.random()
-        
-        if rand < 0.70:
-            # Comportamiento normal
-            delay = random.uniform(self.min_delay, self.max_delay)
-        elif rand < 0.90:
-            # Ocasionalmente más rápido
-            delay = random.uniform(self.min_delay * 0.5, self.min_delay)
-        else:
-            # Ocasionalmente más lento (como si el usuario se distrajera)
-            delay = random.uniform(self.max_delay, self.max_delay * 2)
-        
-        # Agregar micro-variaciones (como clics humanos no perfectos)
-        delay += random.uniform(-0.1, 0.1)
-        delay = max(0.3, delay)  # Mínimo absoluto de 0.3s
-        
-        time.sleep(delay)
-        
+        """Velocidad de descarga reciente (ventana deslizante) y total descargado"""
+        speed = self.metrics.bytes_per_second()
+        if speed <= 0:
+            return "Calculando..."
+        total_mb = self.metrics.bytes_total / 1024 / 1024
+        return f"{speed / 1024 / 1024:.2f} MB/s ({total_mb:.0f} MB en total)"
+    
     def _sanitize_filename(self, filename: str) -> str:
         """
         Limpia el nombre de archivo de caracteres inválidos
@@ -241,98 +493,208 @@ class YouTubeAudioDownloader:
         normalized = re.sub(r'\s+', ' ', normalized).strip()
         return self._sanitize_filename(normalized)
     
-    def _is_valid_result(self, title: str, duration: int) -> bool:
-        """
-        Valida si un resultado de búsqueda es apropiado
-        
-        Args:
-            title: Título del video
-            duration: Duración en segundos
-            
-        Returns:
-            True si el resultado es válido
-        """
-        title_lower = title.lower()
-        
-        # Verificar palabras en lista negra
-        for word in self.blacklist:
-            if word in title_lower:
-                return False
-        
-        # Verificar duración razonable (30 segundos a 10 minutos)
-        if duration < 30 or duration > 600:
-            return False
-        
-        return True
+    def _entry_to_video(self, entry: Dict) -> Dict:
+        """Convierte una entrada de yt-dlp en el diccionario de video que usamos"""
+        return {
+            'id': entry['id'],
+            'title': entry.get('title', ''),
+            'url': entry['url'],
+            'duration': entry.get('duration', 0),
+            'channel': entry.get('channel', ''),
+            'channel_verified': bool(entry.get('channel_is_verified')),
+        }
+    
+    def _expected_duration(self, track_id: Optional[str]) -> Optional[float]:
+        """Duración de la canción en Spotify (segundos), si se conoce"""
+        return self.track_durations.get(track_id) if track_id else None
+    
+    def _log_scores(self, query: str, ranked: List[Dict], expected_duration: Optional[float]):
+        """Añade al registro de búsquedas la puntuación de todos los candidatos"""
+        lines = format_ranking(query, ranked, expected_duration)
+        with self._lock:
+            with open(self.score_log_file, 'a', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
     
-    def _search_youtube(self, query: str, max_results: int = 5) -> Optional[Dict]:
+    def _search_youtube(self, query: str, max_results: int = 5, track_id: str = None,
+                        use_cache: bool = True, artist: str = None, song: str = None) -> Optional[Dict]:
         """
         Busca en YouTube y selecciona el mejor resultado
         
+        Todos los candidatos se puntúan (ver candidate_scoring.py) y se elige
+        el de mayor puntuación; la lista ordenada queda en la caché.
+        
         Args:
             query: Texto de búsqueda
             max_results: Número máximo de resultados a considerar
+            track_id: ID de Spotify (opcional, clave adicional de la caché y duración esperada)
+            use_cache: Consultar la caché antes de buscar (el resultado se guarda igualmente)
+            artist: Artista buscado (por defecto, se compara con el texto de búsqueda)
+            song: Canción buscada
             
         Returns:
             Información del mejor video encontrado o None
         """
-        search_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': True,
-            'force_generic_extractor': False,
-        }
+        if self.search_cache and use_cache:
+            cached = self.search_cache.get(query, track_id)
+            if cached:
+                return cached['video']
         
         try:
-            with yt_dlp.YoutubeDL(search_opts) as ydl:
-                # Buscar en YouTube
+            # Buscar en YouTube (instancia reutilizada del hilo actual)
+            ydl = self.ydl_pool.get('search')
+            with self.controller.request(), self._stage('search'):
                 results = ydl.extract_info(
                     f"ytsearch{max_results}:{query}",
                     download=False
                 )
-                
-                if not results or 'entries' not in results:
-                    return None
-                
-                # Filtrar y seleccionar el mejor resultado
-                for entry in results['entries']:
-                    if not entry:
-                        continue
-                    
-                    title = entry.get('title', '')
-                    duration = entry.get('duration', 0)
-                    
-                    # Validar resultado
-                    if self._is_valid_result(title, duration):
-                        return {
-                            'id': entry['id'],
-                            'title': title,
-                            'url': entry['url'],
-                            'duration': duration,
-                            'channel': entry.get('channel', ''),
-                        }
-                
-                # Si no hay resultados válidos, usar el primero
-                if results['entries']:
-                    entry = results['entries'][0]
-                    return {
-                        'id': entry['id'],
-                        'title': entry.get('title', ''),
-                        'url': entry['url'],
-                        'duration': entry.get('duration', 0),
-                        'channel': entry.get('channel', ''),
-                    }
+            self.controller.record_result(results is not None)
+            
+            if not results or 'entries' not in results:
+                return None
+            
+            candidates = [self._entry_to_video(entry) for entry in results['entries'] if entry]
+            
+            if not candidates:
+                return None
+            
+            # Puntuar todos los candidatos de una vez y quedarse con el mejor
+            expected_duration = self._expected_duration(track_id)
+            candidates = self.scorer.rank(candidates, artist or query, song or '', expected_duration)
+            self._log_scores(query, candidates, expected_duration)
+            chosen = candidates[0]
+            
+            # Alternativas guardadas con la canción por si falla la descarga
+            if artist and song:
+                self.state.save_candidates(f"{artist} - {song}", candidates, track_id)
+            
+            if self.search_cache:
+                self.search_cache.put(query, chosen, candidates, track_id)
+            
+            return chosen
                 
         except Exception as e:
+            self._record_request_error(e)
             print(f"  ⚠️  Error en búsqueda: {e}")
             return None
+    
+    def _lookup_video(self, query: str, track_id: str = None) -> Optional[Dict]:
+        """
+        Resuelve el video sin consultar YouTube
+        
+        Primero el índice global (track_id ya descargado alguna vez, en
+        cualquier playlist) y después la caché de búsquedas.
+        
+        Returns:
+            Información del video o None si hay que buscar
+        """
+        entry = self.track_index.get(track_id) if track_id else None
+        if entry and entry['video_id']:
+            return {
+                'id': entry['video_id'],
+                'title': Path(entry['file_path']).stem if entry['file_path'] else query,
+                'url': f"https://www.youtube.com/watch?v={entry['video_id']}",
+                'duration': None,
+                'channel': '',
+            }
+        
+        if self.search_cache:
+            cached = self.search_cache.get(query, track_id)
+            if cached:
+                return cached['video']
         
         return None
     
+    def _note_error(self, message: str):
+        """Guarda el último error del hilo actual (yt-dlp o excepción)"""
+        self._errors.last = message
+    
+    def _clear_error(self):
+        """Olvida el último error del hilo actual antes de un nuevo intento"""
+        self._errors.last = None
+    
+    def _error_class(self, default: str = TRANSIENT) -> str:
+        """Clase del último error del hilo actual (ver retry_engine.classify_error)"""
+        return classify_error(getattr(self._errors, 'last', None), default)
+    
+    def _record_request_error(self, error: Exception):
+        """
+        Informa al controlador de una excepción en una petición a YouTube
+        
+        Sin 'ignoreerrors' yt-dlp pasa el mensaje al logger antes de lanzar la
+        excepción: si el logger ya registró el bloqueo no se cuenta otra vez.
+        """
+        self._note_error(str(error))
+        if is_throttle_error(str(error)) and not self.controller.throttle_recorded():
+            self.controller.record_throttle()
+        else:
+            self.controller.record_result(False)
+    
+    def _download_candidates(self, artist: str, song: str, video_info: Dict) -> List[Dict]:
+        """
+        Videos a intentar en orden: el elegido y las alternativas guardadas
+        
+        Se saltan los videos que ya fallaron en intentos anteriores (aunque
+        fuera otro día) y los candidatos con puntuación demasiado baja.
+        """
+        saved = self.state.get_candidates(f"{artist} - {song}") or {'candidates': [], 'failed': []}
+        failed = set(saved['failed'])
+        
+        attempts = [video_info] if video_info['id'] not in failed else []
+        for candidate in saved['candidates']:
+            if len(attempts) > MAX_FALLBACK_CANDIDATES:
+                break
+            if (candidate['id'] in failed or candidate['id'] == video_info['id']
+                    or candidate.get('score', MIN_FALLBACK_SCORE) < MIN_FALLBACK_SCORE):
+                continue
+            attempts.append(candidate)
+        
+        # Si todos fallaron alguna vez, volver a intentar el elegido
+        return attempts or [video_info]
+    
+    def _download_with_fallback(self, artist: str, song: str, track_id: Optional[str],
+                                video_info: Dict, download: Callable[[Dict], Any]) -> Tuple[Optional[Dict], Any]:
+        """
+        Descarga el video elegido y, si falla, las alternativas de la búsqueda
+        
+        No hace una búsqueda nueva: usa los candidatos guardados con la canción.
+        
+        Args:
+            artist: Nombre del artista
+            song: Título de la canción
+            track_id: ID de Spotify (opcional)
+            video_info: Video elegido
+            download: Función que descarga un video y devuelve un valor falso si falla
+            
+        Returns:
+            Tupla (video descargado o None, resultado de download)
+        """
+        key = f"{artist} - {song}"
+        
+        for n, candidate in enumerate(self._download_candidates(artist, song, video_info)):
+            if n:
+                print(f"  ↪️  Probando alternativa: {candidate['title'][:60]}...")
+            
+            self._clear_error()
+            result = download(candidate)
+            if result:
+                return candidate, result
+            
+            # Un bloqueo afecta a cualquier video: otra alternativa solo gastaría peticiones
+            if self.controller.is_cooling_down():
+                break
+            # Solo se descarta para siempre un video que no se podrá descargar nunca
+            if self._error_class() in PERMANENT_CLASSES:
+                self.state.mark_candidate_failed(key, candidate['id'], track_id)
+        
+        return None, None
+    
     def _download_audio(self, video_info: Dict, output_path: Path) -> bool:
         """
         Descarga el audio de un video de YouTube
         
+        La descarga se hace en una carpeta de trabajo propia y el archivo
+        terminado se publica de forma atómica en la biblioteca.
+        
         Args:
             video_info: Información del video
             output_path: Ruta donde guardar el archivo
@@ -340,51 +702,69 @@ class YouTubeAudioDownloader:
         Returns:
             True si la descarga fue exitosa
         """
-        temp_output = output_path.parent / "temp_download"
-        temp_output.mkdir(exist_ok=True)
-        
-        opts = self.ydl_opts.copy()
-        opts['outtmpl'] = str(temp_output / '%(title)s.%(ext)s')
+        job_dir = self.staging.claim(video_info['id'])
+        published = False
         
         try:
-            with yt_dlp.YoutubeDL(opts) as ydl:
+            ydl = self.ydl_pool.get_downloader(job_dir)
+            with self.controller.request(), self._stage('download'), self._download_phases():
                 ydl.download([f"https://www.youtube.com/watch?v={video_info['id']}"])
             
-            # Buscar el archivo descargado
-            downloaded_files = list(temp_output.glob("*.mp3"))
-            
-            if downloaded_files:
-                # Mover al destino final
-                downloaded_files[0].rename(output_path)
-                
-                # Limpiar carpeta temporal
-                for f in temp_output.iterdir():
-                    f.unlink()
-                temp_output.rmdir()
-                
-                return True
+            downloaded = self.staging.find_output(job_dir, self.output_ext)
+            self.controller.record_result(downloaded is not None)
+            if downloaded:
+                publish_file(downloaded, output_path)
+                published = True
             
         except Exception as e:
+            self._record_request_error(e)
             print(f"  ❌ Error descargando: {e}")
+        
+        finally:
+            # Si falló se conserva la descarga parcial, que se reanuda en el siguiente intento
+            self.staging.release(job_dir, keep_partial=not published)
+        
+        return published
+    
+    def _download_raw(self, video_info: Dict, output_path: Path) -> Optional[Path]:
+        """
+        Descarga el stream de audio original sin convertirlo
+        
+        La carpeta de trabajo queda reservada: quien llama debe convertir el
+        archivo y después liberarla con staging.release(ruta.parent).
+        
+        Args:
+            video_info: Información del video
+            output_path: Ruta final de la canción
             
-            # Limpiar archivos temporales
-            if temp_output.exists():
-                for f in temp_output.iterdir():
-                    try:
-                        f.unlink()
-                    except:
-                        pass
-                try:
-                    temp_output.rmdir()
-                except:
-                    pass
+        Returns:
+            Ruta del archivo descargado o None
+        """
+        job_dir = self.staging.claim(video_info['id'])
+        
+        try:
+            ydl = self.ydl_pool.get_downloader(job_dir, 'download_raw')
+            with self.controller.request(), self._stage('download'), self._download_phases():
+                ydl.download([f"https://www.youtube.com/watch?v={video_info['id']}"])
+            
+            downloaded = self.staging.find_output(job_dir)
+            self.controller.record_result(downloaded is not None)
+            if downloaded:
+                return downloaded
         
-        return False
+        except Exception as e:
+            self._record_request_error(e)
+            print(f"  ❌ Error descargando: {e}")
+        
+        self.staging.release(job_dir, keep_partial=True)
+        return None
     
     def _get_album_art(self, artist: str, song: str) -> Optional[bytes]:
         """
         Intenta obtener la carátula del álbum desde iTunes API
         
+        Usa la caché de carátulas: las canciones del mismo álbum reutilizan la imagen.
+        
         Args:
             artist: Nombre del artista
             song: Nombre de la canción
@@ -393,28 +773,14 @@ class YouTubeAudioDownloader:
             Bytes de la imagen o None
         """
         try:
-            # Buscar en iTunes API
-            query = f"{artist} {song}".replace(' ', '+')
-            url = f"https://itunes.apple.com/search?term={query}&entity=song&limit=1"
-            
-            response = requests.get(url, timeout=5)
-            data = response.json()
-            
-            if data['resultCount'] > 0:
-                artwork_url = data['results'][0]['artworkUrl100']
-                # Obtener versión de alta resolución
-                artwork_url = artwork_url.replace('100x100', '600x600')
-                
-                img_response = requests.get(artwork_url, timeout=5)
-                if img_response.status_code == 200:
-                    return img_response.content
-        
+            with self._stage('artwork'):
+                return self.artwork_cache.get_album_art(artist, song)
         except Exception:
-            pass
-        
-        return None
+            return None
     
-    def _add_metadata(self, file_path: Path, artist: str, song: str):
+    def _add_metadata(self, file_path: Path, artist: str, song: str,
+                      artwork: Optional[bytes] = None, fetch_artwork: bool = True,
+                      track_id: Optional[str] = None):
         """
         Agrega metadatos ID3 al archivo de audio
         
@@ -422,7 +788,19 @@ class YouTubeAudioDownloader:
             file_path: Ruta del archivo de audio
             artist: Nombre del artista
             song: Título de la canción
+            artwork: Carátula ya obtenida (opcional)
+            fetch_artwork: Si es True y no se pasó carátula, se busca en iTunes
+            track_id: ID de Spotify (se guarda para reconocer el archivo en el índice)
         """
+        if artwork is None and fetch_artwork:
+            artwork = self._get_album_art(artist, song)
+        
+        with self._stage('tag'):
+            self._write_tags(file_path, artist, song, artwork, track_id)
+    
+    def _write_tags(self, file_path: Path, artist: str, song: str,
+                    artwork: Optional[bytes], track_id: Optional[str]):
+        """Escribe título, artista, track_id y carátula según el formato del archivo"""
         try:
             if file_path.suffix.lower() == '.mp3':
                 # MP3 con ID3
@@ -437,9 +815,10 @@ class YouTubeAudioDownloader:
                 # Título y artista
                 audio.tags.add(TIT2(encoding=3, text=song))
                 audio.tags.add(TPE1(encoding=3, text=artist))
+                if track_id:
+                    audio.tags.add(TXXX(encoding=3, desc=TRACK_ID_TAG, text=track_id))
                 
-                # Intentar agregar carátula
-                artwork = self._get_album_art(artist, song)
+                # Agregar carátula
                 if artwork:
                     audio.tags.add(
                         APIC(
@@ -458,142 +837,429 @@ class YouTubeAudioDownloader:
                 audio = MP4(file_path)
                 audio['\xa9nam'] = song
                 audio['\xa9ART'] = artist
+                if track_id:
+                    audio[f'----:com.apple.iTunes:{TRACK_ID_TAG}'] = [MP4FreeForm(track_id.encode())]
                 
-                # Intentar agregar carátula
-                artwork = self._get_album_art(artist, song)
+                # Agregar carátula
                 if artwork:
                     audio['covr'] = [MP4Cover(artwork, imageformat=MP4Cover.FORMAT_JPEG)]
                 
                 audio.save()
+            
+            elif file_path.suffix.lower() in ('.opus', '.ogg'):
+                # Opus/Vorbis en Ogg con comentarios Vorbis
+                if file_path.suffix.lower() == '.opus':
+                    audio = OggOpus(file_path)
+                else:
+                    audio = OggVorbis(file_path)
+                
+                audio['title'] = song
+                audio['artist'] = artist
+                if track_id:
+                    audio[TRACK_ID_TAG] = track_id
+                
+                # Carátula como METADATA_BLOCK_PICTURE (bloque FLAC en base64)
+                if artwork:
+                    picture = Picture()
+                    picture.type = 3
+                    picture.mime = 'image/jpeg'
+                    picture.desc = 'Cover'
+                    picture.data = artwork
+                    audio['metadata_block_picture'] = [
+                        base64.b64encode(picture.write()).decode('ascii')
+                    ]
+                
+                audio.save()
         
         except Exception as e:
             print(f"  ⚠️  No se pudieron agregar metadatos: {e}")
     
-    def download_song(self, artist: str, song: str, track_id: str = None) -> Tuple[bool, str]:
+    def _get_output_path(self, artist: str, song: str) -> Path:
         """
-        Descarga una canción específica
+        Construye la ruta final de una canción
+        
+        La carpeta del artista se crea al descargar, no aquí, para no tocar el
+        disco con las canciones que ya existen.
         
         Args:
             artist: Nombre del artista
             song: Título de la canción
-            track_id: ID de Spotify (opcional, para tracking)
             
         Returns:
-            Tupla (éxito, mensaje)
+            Ruta del archivo de destino (extensión según el formato de salida)
         """
-        # Verificar lista negra
-        if self._is_blacklisted(artist, song):
-            return False, "En lista negra (3+ intentos fallidos)"
-        
-        # Crear carpeta del artista
         artist_normalized = self._normalize_artist(artist)
         artist_dir = self.output_dir / artist_normalized
-        artist_dir.mkdir(exist_ok=True)
         
-        # Nombre del archivo
-        filename = self._sanitize_filename(f"{artist} - {song}.mp3")
-        output_path = artist_dir / filename
+        filename = self._sanitize_filename(f"{artist} - {song}")
+        return artist_dir / f"{filename}{self.output_ext}"
+    
+    def _is_in_library(self, output_path: Path, track_id: str = None) -> bool:
+        """
+        Comprueba en el índice (en memoria) si la canción ya está descargada
         
-        # Verificar si ya existe
-        if output_path.exists():
-            return True, "Ya existe"
+        Se acepta cualquier formato soportado: una canción guardada como .opus
+        no se vuelve a descargar al cambiar la salida a MP3, ni al revés.
+        """
+        if track_id:
+            if self.library.find_by_track_id(track_id):
+                return True
+            # Puede estar guardada con otro nombre (misma canción en otra playlist)
+            entry = self.track_index.get(track_id)
+            if entry and entry['file_path'] and self.library.exists(Path(entry['file_path'])):
+                return True
+        stem = output_path.with_suffix('')
+        return any(self.library.exists(stem.with_name(stem.name + ext)) for ext in AUDIO_EXTENSIONS)
+    
+    def _build_query(self, artist: str, song: str) -> str:
+        """Construye el texto de búsqueda para YouTube"""
+        return f"{artist} - {song} audio oficial"
+    
+    def _prepare_song(self, artist: str, song: str,
+                      track_id: str = None) -> Tuple[Optional[Path], Optional[Tuple[bool, str]]]:
+        """
+        Comprobaciones previas a la búsqueda de una canción
         
-        # Buscar en YouTube
-        query = f"{artist} - {song} audio oficial"
-        print(f"  🔍 Buscando: {artist} - {song}")
+        Args:
+            artist: Nombre del artista
+            song: Título de la canción
+            track_id: ID de Spotify (opcional)
+            
+        Returns:
+            Tupla (ruta de destino, resultado si se debe omitir la canción o None)
+        """
+        if self.failures.is_blocked(artist, song, track_id):
+            return None, (False, "En lista negra (3+ intentos fallidos)")
         
-        video_info = self._search_youtube(query)
+        output_path = self._get_output_path(artist, song)
         
-        if not video_info:
-            reason = "No encontrado en YouTube"
-            self._add_to_blacklist(artist, song, reason)
-            self.download_stats['failed_songs'].append({
-                'artist': artist,
-                'song': song,
-                'reason': reason
-            })
-            return False, reason
+        if self._is_in_library(output_path, track_id):
+            return output_path, (True, "Ya existe")
         
-        print(f"  📹 Encontrado: {video_info['title'][:60]}...")
+        return output_path, None
+    
+    def begin_journal(self, playlist_id: str = None, update_mode: bool = False,
+                      batch_id: str = None) -> Optional[JobJournal]:
+        """
+        Abre el diario del lote que se va a descargar
+        
+        Args:
+            playlist_id: Playlist de Spotify del lote (para el historial al reanudar)
+            update_mode: Si el lote es una actualización de playlist
+            batch_id: Lote existente a reanudar (None para uno nuevo)
+            
+        Returns:
+            El diario abierto, o None si batch_id no existe
+        """
+        if batch_id:
+            self.journal = JobJournal.resume(self.state, batch_id)
+        else:
+            self.journal = JobJournal.start(self.state, playlist_id, update_mode)
+        return self.journal
+    
+    def end_journal(self, status: str = 'completed'):
+        """Cierra el diario del lote en curso"""
+        if self.journal:
+            self.journal.finish(status)
+            self.journal = None
+    
+    def _journal_songs(self, songs: Iterable[Tuple]) -> Iterable[Tuple]:
+        """Registra en el diario cada canción según entra en el lote"""
+        if self.journal and isinstance(songs, (list, tuple)):
+            # Listado completo conocido: todo queda registrado antes de empezar
+            self.journal.add_many(songs)
+            yield from songs
+            return
+        
+        for position, song_data in enumerate(songs, 1):
+            if self.journal:
+                self.journal.add(position, song_data)
+            yield song_data
+    
+    def _journal_mark(self, artist: str, song: str, state: str, message: str = None):
+        """Guarda el estado de una canción en el diario (si hay un lote abierto)"""
+        if self.journal:
+            self.journal.mark(artist, song, state, message)
+    
+    def download_song(self, artist: str, song: str, track_id: str = None) -> Tuple[bool, str]:
+        """
+        Descarga una canción específica
+        
+        Hace un solo intento: los fallos transitorios no cuentan para la lista
+        negra (download_batch e iter_sequential los reintentan más tarde).
+        
+        Args:
+            artist: Nombre del artista
+            song: Título de la canción
+            track_id: ID de Spotify (opcional, para tracking)
+            
+        Returns:
+            Tupla (éxito, mensaje)
+        """
+        job = SongJob(0, track_id, artist, song)
+        self._attempt_song(job)
+        self._finish_song(job)
+        return job.success, job.message
+    
+    def _attempt_song(self, job: SongJob):
+        """Un intento de descarga de la canción; el resultado queda en job"""
+        with self.tracer.bind(f"{job.artist} - {job.song}"):
+            try:
+                self._download_song_steps(job)
+            except Exception as e:
+                job.error_class = classify_error(e)
+                job.finish(False, f"Error inesperado: {e}")
+    
+    def _download_song_steps(self, job: SongJob):
+        """Etapas de download_song: comprobaciones, búsqueda, descarga y metadatos"""
+        artist, song, track_id = job.artist, job.song, job.track_id
+        
+        # Verificar lista negra y archivos existentes
+        output_path, skip = self._prepare_song(artist, song, track_id)
+        if skip:
+            job.finish(*skip)
+            return
+        
+        # Buscar en YouTube (un reintento tras fallar la descarga reutiliza el video)
+        if job.video_info is None:
+            print(f"  🔍 Buscando: {artist} - {song}")
+            self._journal_mark(artist, song, 'searching')
+            
+            query = self._build_query(artist, song)
+            self._clear_error()
+            job.video_info = self._lookup_video(query, track_id)
+            if not job.video_info:
+                job.video_info = self._search_youtube(query, track_id=track_id, use_cache=False,
+                                                      artist=artist, song=song)
+            
+            if not job.video_info:
+                self._fail_search(job)
+                return
+        
+        print(f"  📹 Encontrado: {job.video_info['title'][:60]}...")
         
         # Descargar audio
         print(f"  ⬇️  Descargando...")
-        self.download_stats['start_time'] = time.time()
-        self.download_stats['bytes_downloaded'] = 0
+        self._journal_mark(artist, song, 'downloading')
         
-        success = self._download_audio(video_info, output_path)
+        downloaded, _ = self._download_with_fallback(
+            artist, song, track_id, job.video_info,
+            lambda candidate: self._download_audio(candidate, output_path)
+        )
         
-        if not success:
-            reason = "Error en descarga (archivo corrupto o bloqueado)"
-            self._add_to_blacklist(artist, song, reason)
-            self.download_stats['failed_songs'].append({
-                'artist': artist,
-                'song': song,
-                'reason': reason
-            })
-            return False, reason
+        if not downloaded:
+            self._fail_download(job)
+            return
+        
+        job.fallback = downloaded['id'] != job.video_info['id']
+        job.video_info = downloaded
         
         # Agregar metadatos
         print(f"  🏷️  Agregando metadatos...")
-        self._add_metadata(output_path, artist, song)
+        self._add_metadata(output_path, artist, song, track_id=track_id)
+        self._record_download(artist, song, track_id, output_path, job.video_info)
+        self._journal_mark(artist, song, 'tagged')
         
-        # Espera variable para simular comportamiento humano
-        self._human_delay()
+        job.finish(True, "Descargado exitosamente (alternativa)" if job.fallback else "Descargado exitosamente")
+    
+    def _fail_search(self, job: SongJob):
+        """Marca el fallo de la búsqueda según el último error (o "no encontrado")"""
+        job.error_class = self._error_class(default=NOT_FOUND)
+        job.finish(False, "No encontrado en YouTube" if job.error_class == NOT_FOUND
+                   else f"Error en búsqueda ({job.error_class})")
+    
+    def _fail_download(self, job: SongJob):
+        """Marca el fallo de la descarga según el último error"""
+        job.error_class = self._error_class()
+        if job.error_class == NOT_FOUND:
+            job.error_class = UNAVAILABLE
+        job.finish(False, DOWNLOAD_FAILURES[job.error_class])
+    
+    def _retry_delay(self, job: SongJob) -> Optional[float]:
+        """
+        Programa el reintento de una canción fallida si el error es transitorio
         
-        return True, "Descargado exitosamente"
+        Returns:
+            Segundos hasta el reintento, o None si el fallo es definitivo
+        """
+        if job.success or not self.retry_policy.should_retry(job.error_class, job.retries):
+            return None
+        
+        job.retries += 1
+        cooldown = self.controller.get_stats()['cooling_down']
+        delay = self.retry_policy.delay(job.retries, job.error_class, min_delay=cooldown)
+        
+        self.metrics.record_retry(job.error_class)
+        self._journal_mark(job.artist, job.song, 'retrying', job.message)
+        print(f"  🔁 {job.artist} - {job.song}: {job.message} → reintento "
+              f"{job.retries}/{self.retry_policy.max_retries} en {delay:.0f}s")
+        return delay
+    
+    def _finish_song(self, job: SongJob):
+        """Registra el resultado definitivo de una canción (diario, métricas y fallos)"""
+        self._journal_mark(job.artist, job.song, 'done' if job.success else 'failed', job.message)
+        self.metrics.record_song(job.success, job.message, job.elapsed, fallback=job.fallback,
+                                 error_class=job.error_class)
+        
+        # Las canciones omitidas (p.ej. en lista negra) no tienen clase de error
+        if not job.success and job.error_class:
+            self._record_failure(job.artist, job.song, job.message, job.error_class, job.track_id)
     
-    def download_batch(self, songs: List[Tuple[str, str]], pause_every: int = 10, long_pause: Tuple[float, float] = (30, 60)) -> Dict[str, Dict]:
+    def iter_sequential(self, songs: Iterable[Tuple],
+                        on_start: Optional[Callable[[SongJob], None]] = None) -> Iterator[SongJob]:
         """
-        Descarga un lote de canciones con pausas inteligentes
+        Descarga las canciones una tras otra
+        
+        Si una canción falla por un error transitorio (red, bloqueo) se programa
+        su reintento con backoff exponencial en una cola diferida y se sigue con
+        las siguientes: los reintentos vencidos se intercalan entre canciones y,
+        al acabar la lista, solo se espera a los que queden pendientes.
         
         Args:
-            songs: Lista de tuplas (artista, canción)
-            pause_every: Cada cuántas canciones hacer una pausa larga
-            long_pause: Rango de tiempo para la pausa larga (min, max) en segundos
+            songs: Tuplas (track_id, artista, canción) o (artista, canción)
+            on_start: Función llamada antes de cada intento (p.ej. para mostrar el progreso)
+            
+        Yields:
+            Trabajos terminados (SongJob) en el orden en que terminan
+        """
+        retries = DelayedQueue()
+        pending = iter(songs)
+        index = 0
+        started = time.time()
+        counters = self._run_counters()
+        
+        try:
+            while True:
+                job = retries.get(timeout=0)
+                if job is None and pending is not None:
+                    song_data = next(pending, None)
+                    if song_data is None:
+                        pending = None
+                        continue
+                    
+                    if len(song_data) == 3:
+                        track_id, artist, song = song_data
+                    else:
+                        track_id = None
+                        artist, song = song_data
+                    
+                    index += 1
+                    job = SongJob(index, track_id, artist, song)
+                elif job is None:
+                    if not len(retries):
+                        break
+                    # No queda nada más que hacer: esperar al próximo reintento
+                    job = retries.get()
+                
+                if on_start:
+                    on_start(job)
+                
+                self._attempt_song(job)
+                
+                delay = self._retry_delay(job)
+                if delay is not None:
+                    retries.put(job, delay)
+                    continue
+                
+                self._finish_song(job)
+                yield job
+        finally:
+            self._record_run('sequential', counters, time.time() - started)
+    
+    def download_batch(self, songs: Iterable[Tuple], pause_every: int = 10,
+                       long_pause: Tuple[float, float] = (30, 60), mode: str = "sequential",
+                       pipeline_config: Optional[Dict] = None) -> Dict[str, Dict]:
+        """
+        Descarga un lote de canciones con control de tasa adaptativo
+        
+        Args:
+            songs: Tuplas (artista, canción) o (track_id, artista, canción); puede ser
+                   un generador (p.ej. SpotifyPlaylistExtractor.iter_tracks) para
+                   empezar a descargar antes de tener el listado completo
+            pause_every: Canciones sin errores necesarias antes de acelerar
+            long_pause: Enfriamiento (min, max) en segundos cuando el servidor frena
+            mode: "sequential" (una canción tras otra) o "pipeline" (etapas concurrentes)
+            pipeline_config: Argumentos para DownloadPipeline (workers, requests_per_second)
             
         Returns:
             Diccionario con resultados de cada descarga
         """
         results = {}
+        total = len(songs) if hasattr(songs, '__len__') else None
+        total_label = total if total is not None else "?"
+        
+        # Diario propio salvo que quien llama ya haya abierto uno (p.ej. al reanudar)
+        own_journal = self.journal is None
+        if own_journal:
+            self.begin_journal()
+        songs = self._journal_songs(songs)
+        
+        self.controller.apply_delay_preset(self.min_delay, self.max_delay, pause_every, long_pause)
         
         print("=" * 60)
         print("🎵 YOUTUBE AUDIO DOWNLOADER")
         print("=" * 60)
-        print(f"📊 Total de canciones: {len(songs)}")
-        print(f"⏱️  Delays variables: {self.min_delay}-{self.max_delay}s")
-        print(f"☕ Pausa larga cada {pause_every} canciones\n")
+        print(f"📊 Total de canciones: {total_label}")
         
-        for i, (artist, song) in enumerate(songs, 1):
-            print(f"[{i}/{len(songs)}] {artist} - {song}")
+        if mode == "pipeline":
+            pipeline = DownloadPipeline(self, **(pipeline_config or {}))
+            print(f"🚀 Modo pipeline: {pipeline.describe()}\n")
             
-            success, message = self.download_song(artist, song)
+            processed = 0
+            for result in pipeline.run(songs):
+                processed += 1
+                results[f"{result['artist']} - {result['song']}"] = {
+                    'success': result['success'],
+                    'message': result['message'],
+                    'artist': result['artist'],
+                    'song': result['song'],
+                    'track_id': result['track_id']
+                }
+                status = "✅" if result['success'] else "❌"
+                print(f"[{result['index']}/{total_label}] {status} {result['artist']} - {result['song']}: {result['message']}")
             
-            results[f"{artist} - {song}"] = {
-                'success': success,
-                'message': message,
-                'artist': artist,
-                'song': song
+            self._print_batch_summary(processed, results)
+            if own_journal:
+                self.end_journal()
+            return results
+        
+        print(f"🚦 Control de tasa: {self.controller.describe()}\n")
+        
+        def announce(job: SongJob):
+            retry = f" (reintento {job.retries})" if job.retries else ""
+            print(f"[{job.index}/{total_label}] {job.artist} - {job.song}{retry}")
+        
+        i = 0
+        for i, job in enumerate(self.iter_sequential(songs, on_start=announce), 1):
+            results[f"{job.artist} - {job.song}"] = {
+                'success': job.success,
+                'message': job.message,
+                'artist': job.artist,
+                'song': job.song,
+                'track_id': job.track_id
             }
             
-            status = "✅" if success else "❌"
-            print(f"  {status} {message}\n")
-            
-            # Pausa larga cada X canciones (simula descansos humanos)
-            if i % pause_every == 0 and i < len(songs):
-                pause_time = random.uniform(long_pause[0], long_pause[1])
-                print(f"☕ Pausa de descanso: {pause_time:.1f}s (cada {pause_every} canciones)")
-                time.sleep(pause_time)
-                print()
-        
-        # Resumen final
+            status = "✅" if job.success else "❌"
+            print(f"  {status} {job.message}\n")
+        
+        self._print_batch_summary(i, results)
+        if own_journal:
+            self.end_journal()
+        return results
+    
+    def _print_batch_summary(self, total: int, results: Dict[str, Dict]):
+        """Imprime el resumen final de un lote de `total` canciones"""
         successful = sum(1 for r in results.values() if r['success'])
         failed = sum(1 for r in results.values() if not r['success'] and r['message'] != "Ya existe")
         
         print("=" * 60)
         print("✨ DESCARGA COMPLETADA")
         print("=" * 60)
-        print(f"✅ Exitosas: {successful}/{len(songs)}")
-        print(f"❌ Fallidas: {len(songs) - successful}/{len(songs)}")
+        print(f"✅ Exitosas: {successful}/{total}")
+        print(f"❌ Fallidas: {total - successful}/{total}")
+        fallbacks = self.metrics.fallback_successes
+        if fallbacks:
+            print(f"↪️  Con video alternativo: {fallbacks}")
         print(f"📁 Ubicación: {self.output_dir.absolute()}")
         
         # Mostrar canciones fallidas
@@ -605,23 +1271,47 @@ class YouTubeAudioDownloader:
                 print(f"\n{i}. {failed_song['artist']} - {failed_song['song']}")
                 print(f"   Motivo: {failed_song['reason']}")
         
+        for line in self.get_cache_summary_lines():
+            print(line)
+        
         print()
+    
+    def get_cache_summary_lines(self) -> List[str]:
+        """Resumen de uso de las cachés (búsqueda y carátulas) y del control de tasa"""
+        lines = []
         
-        return results
+        if self.search_cache:
+            stats = self.search_cache.get_stats()
+            if stats['hits'] or stats['misses']:
+                lines.append(f"🗂️  Caché de búsqueda: {stats['hits']} aciertos / "
+                             f"{stats['hits'] + stats['misses']} búsquedas ({stats['hit_rate'] * 100:.0f}%)")
+        
+        stats = self.artwork_cache.get_stats()
+        if stats['hits'] or stats['misses'] or stats['negative_hits']:
+            lines.append(f"🖼️  Caché de carátulas: {stats['hit_rate'] * 100:.0f}% aciertos | "
+                         f"{stats['bytes_saved'] / 1024 / 1024:.1f} MB ahorrados | "
+                         f"{stats['requests_saved']} peticiones evitadas")
+        
+        stats = self.controller.get_stats()
+        if stats['throttles']:
+            lines.append(f"🚦 Control de tasa: {self.controller.describe()} | "
+                         f"{stats['cooldown_seconds']:.0f}s de enfriamiento")
+        
+        return lines
 
 
 def download_songs_from_list(songs: List[Tuple[str, str]], output_dir: str = "music", 
                             min_delay: float = 0.5, max_delay: float = 3.0,
                             pause_every: int = 10) -> Dict:
     """
-    Función de conveniencia para descargar canciones con comportamiento humano
+    Función de conveniencia para descargar canciones con control de tasa adaptativo
     
     Args:
         songs: Lista de tuplas (artista, canción)
         output_dir: Directorio de salida
-        min_delay: Tiempo mínimo entre descargas (segundos)
-        max_delay: Tiempo máximo entre descargas (segundos)
-        pause_every: Hacer pausa larga cada X canciones
+        min_delay: Tiempo mínimo entre descargas (segundos): fija la tasa máxima
+        max_delay: Tiempo máximo entre descargas (segundos): fija la tasa mínima
+        pause_every: Canciones sin errores necesarias antes de acelerar
         
     Returns:
         Diccionario con resultados